@@ -30,6 +30,8 @@
 #                     '/var/log/btmp'
 #                     '/var/log/user'
 #                     '/var/log/secure'
+#                     '/var/log/journal'
+#                     '/var/log/audit/audit.log'
 #                     
 #  
 #  Notes/Observations:
@@ -86,6 +88,48 @@
 #               07/20/2014   Add support to remove duplicates cause by reading in all archived versions of a log
 #               07/21/2014   Timing analysis for dmesg log family and made some minor adjustments.
 #               07/24/2014   Added support for utmp, wtmp and btmp logs
+#               10/19/2026   Made the script importable without side effects: explicit Database(path) object, lazy readers
+#                            that parse when iterated, one bulk insert per log family and lazy imports of gzip/subprocess
+#               10/19/2026   Partition LOGEVENTS by month (LOGEVENTS_YYYYMM tables behind a LOGEVENTS view) with partition pruning
+#                            for date/time window queries, fan-out/merge for string searches and a --retention policy
+#               10/19/2026   Multi-image cases: every log is tagged with a host/image ID, --rootDir appends (and can be repeated
+#                            to parse several images in parallel) and queries accept --host filters
+#               10/19/2026   Add --timeline: a single pass k-way merge of every log into one CSV/JSON lines timeline with bounded
+#                            memory (reorder buffers and sorted runs spilled to temporary files) without using the database
+#               10/19/2026   Add a native reader for the binary systemd journal (/var/log/journal) that memory-maps the files and
+#                            walks their entry arrays directly, XZ/LZ4/ZSTD data objects are decoded when the modules are installed
+#               10/19/2026   Mine message templates at ingest time (Drain-style parse tree) and store descriptions as a template ID
+#                            plus a parameter blob, add --templates and --rareTemplates
+#               10/19/2026   Evaluate saliency rules (thresholds, sequences, time of day) on every event while logs are read,
+#                            store alerts in the ALERTS table, add --rules, --alerts and --alertsFile
+#               10/19/2026   Read wtmp natively (honors --rootDir) and store login sessions as intervals in the SESSIONS table
+#                            with an R*Tree index, --query lists the sessions overlapping the window
+#               10/19/2026   Add --regex (a REGEXP SQL function with compiled pattern cache) searched in parallel id ranges, with
+#                            --logID, --since and --until filters applied before the regular expression
+#               10/19/2026   Add --direct: --query bisects the raw text logs of --rootDir by byte offset without ingesting them,
+#                            with zone maps and sparse gzip indexes kept in the FILEINDEX tables
+#               10/19/2026   Add --export (columnar Parquet/Arrow or .npy export) and --analyze (NumPy rate histogram, bursts,
+#                            gaps and cross-log co-occurrence)
+#               10/19/2026   Hold parsed events in a compact EventBuffer (arrays plus a packed description arena) instead of
+#                            tuples in a set, duplicates are removed by sorting
+#               10/19/2026   Use the write-ahead log and publish every log family in a single transaction with a generation
+#                            number, queries read one snapshot while logs are being read, add --progress (INGEST table)
+#               10/19/2026   Read log files ahead of the parser on a background thread (Prefetcher, bounded queue, posix_fadvise
+#                            hints), print the I/O wait and parse time of every log, add --prefetch
+#               10/19/2026   Add --db PATH, --memory (in-memory database loaded from and written back to --db) and snapshots
+#                            through the online backup API or VACUUM INTO (--snapshot, --snapshotEvery)
+#               10/19/2026   Add --segment (parse images into a portable gzip JSON lines segment file with a SHA-256) and
+#                            --merge (load segments into the database without parsing, SEGMENTS table skips repeats)
+#               10/19/2026   Keep hourly sketches of the program, IP address, user and failed login user of every log (SKETCHES
+#                            table: count-min, SpaceSaving heavy hitters, HyperLogLog), add --summary and --top
+#               10/19/2026   Index the entities of the events (IP addresses, users, processes, paths, dpkg packages) in posting
+#                            lists sorted by time (ENTITIES and POSTINGS tables), add --pivot and --hops
+#               10/19/2026   Read the audit log (/var/log/audit/audit.log*), its records assembled into one event per serial
+#                            by a bounded, time-evicted pending map
+#               10/19/2026   Hash every file (SHA-256, --md5) as it is read, keep its provenance in SOURCEFILES and link every
+#                            event to its source file and byte offset, add --sources
+#               10/19/2026   Add --context K to --stringMatch and --regex: the K events of the same log around every match, read
+#                            by bounded seeks on a new (fk_logid, event_datetime) index with overlapping contexts merged
 #
 #
 #
@@ -94,23 +138,392 @@
 
 
 # The following is a list of libraries this program uses
+# note: gzip, subprocess and argparse are imported where they are used so that 'import LinuxLogs' stays cheap
+# and free of side effects for other tools that embed the engine
 from __future__ import print_function
-import gc
 import os
 import re
 import sys
-from sys import stdout
 import glob
-import gzip
-import sets
 import time
-import types
+import contextlib
+import collections
 from datetime import datetime, date
 import datetime
 import sqlite3
-import logging
-import argparse
-import subprocess
+
+
+
+# -- EventBuffer classes --------------------------------------------------------------------------------------------
+class EventBuffer(object):
+    """This class holds parsed events compactly: the date/times as microseconds since 1970-01-01 and the LogIDs in
+    arrays, the descriptions packed one after the other in a single bytearray with an array of offsets. An event costs
+    about 20 bytes plus its description instead of a tuple, a datetime object and a string object (plus a set entry to
+    find duplicates), and none of it is tracked by the garbage collector. Iterating the buffer (or indexing it) hands
+    out (logID, eventDateTime, eventDescription) tuples one at a time. The source of every event (the index of the file
+    it was read from in its log family and its byte offset there, -1 when not known) is kept alongside, see source()."""
+
+    EPOCH = datetime.datetime(1970, 1, 1)
+
+    def __init__(self):
+        """Standard class constructor"""
+        import array
+        # 'q' does not exist in Python 2, 'l' is 64 bit on 64 bit Linux
+        self.micros = array.array("l")
+        self.logIDs = array.array("i")
+        self.offsets = array.array("l", [0])
+        self.descriptions = bytearray()
+        self.sourceIndexes = array.array("i")
+        self.sourceOffsets = array.array("l")
+
+
+    def __len__(self):
+        return len(self.micros)
+
+
+    def __getstate__(self):
+        # arrays are pickled as lists by default, send their bytes instead (i.e. from parser processes)
+        return (self.micros.tostring(), self.logIDs.tostring(), self.offsets.tostring(), str(self.descriptions),
+                self.sourceIndexes.tostring(), self.sourceOffsets.tostring())
+
+
+    def __setstate__(self, state):
+        self.__init__()
+        del self.offsets[:]
+        self.micros.fromstring(state[0])
+        self.logIDs.fromstring(state[1])
+        self.offsets.fromstring(state[2])
+        self.descriptions = bytearray(state[3])
+        self.sourceIndexes.fromstring(state[4])
+        self.sourceOffsets.fromstring(state[5])
+
+
+    @classmethod
+    def microseconds(cls, eventDateTime):
+        """Converts a datetime to microseconds since 1970-01-01, the date/times held by the buffer"""
+        delta = eventDateTime - cls.EPOCH
+        return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+    def append(self, logID, eventDateTime, eventDescription, source=None):
+        """Appends an event
+        @param: int - the LogID, None if not known yet
+        @param: datetime - the date and time of the event
+        @param: string - the description of the event
+        @param: tuple - (file index, byte offset) the event was read from, optional"""
+        if isinstance(eventDescription, unicode):
+            eventDescription = eventDescription.encode("utf-8")
+        self.appendMicroseconds(logID, self.microseconds(eventDateTime), eventDescription, source)
+
+
+    def appendMicroseconds(self, logID, micros, eventDescription, source=None):
+        """Appends an event whose date/time is already in microseconds since 1970-01-01 (i.e. read from a segment file)
+        @param: int - the LogID, None if not known yet
+        @param: int - the date and time of the event
+        @param: string - the description of the event
+        @param: tuple - (file index, byte offset) the event was read from, optional"""
+        self.micros.append(micros)
+        self.logIDs.append(logID or 0)
+        self.descriptions += eventDescription
+        self.offsets.append(len(self.descriptions))
+        fileIndex, offset = source or (None, None)
+        self.sourceIndexes.append(-1 if fileIndex is None else fileIndex)
+        self.sourceOffsets.append(-1 if offset is None else offset)
+
+
+    def __getitem__(self, i):
+        """Returns event i as a (logID, eventDateTime, eventDescription) tuple"""
+        return (self.logIDs[i] or None, self.EPOCH + datetime.timedelta(microseconds=self.micros[i]),
+                str(self.descriptions[self.offsets[i]:self.offsets[i + 1]]))
+
+
+    def __iter__(self):
+        for i in xrange(len(self.micros)):
+            yield self[i]
+
+
+    def source(self, i):
+        """Returns the (file index, byte offset) event i was read from, either may be None"""
+        fileIndex, offset = self.sourceIndexes[i], self.sourceOffsets[i]
+        return (None if fileIndex < 0 else fileIndex, None if offset < 0 else offset)
+
+
+    def clear(self):
+        """Removes every event"""
+        del self.micros[:]
+        del self.logIDs[:]
+        del self.offsets[1:]
+        del self.descriptions[:]
+        del self.sourceIndexes[:]
+        del self.sourceOffsets[:]
+
+
+    def dedupe(self):
+        """Sorts the events by date/time and removes the duplicates (same date/time, LogID and description, i.e. read
+        twice from archived versions of a log). The sort is stable so events of the same date/time keep their order.
+        Events read from logs are usually in order already, they are then compacted in place without any copy.
+        @return: int - the number of events left"""
+        micros = self.micros
+        if any(micros[i] > micros[i + 1] for i in xrange(len(micros) - 1)):
+            ordered = EventBuffer()
+            for i in sorted(xrange(len(micros)), key=micros.__getitem__):
+                ordered.micros.append(micros[i])
+                ordered.logIDs.append(self.logIDs[i])
+                ordered.descriptions += self.descriptions[self.offsets[i]:self.offsets[i + 1]]
+                ordered.offsets.append(len(ordered.descriptions))
+                ordered.sourceIndexes.append(self.sourceIndexes[i])
+                ordered.sourceOffsets.append(self.sourceOffsets[i])
+            self.micros, self.logIDs, self.offsets, self.descriptions = ordered.micros, ordered.logIDs, ordered.offsets, ordered.descriptions
+            self.sourceIndexes, self.sourceOffsets = ordered.sourceIndexes, ordered.sourceOffsets
+        return self.compact()
+
+
+    def compact(self):
+        """Removes the duplicates of events in date/time order, moving the events kept down in place
+        @return: int - the number of events left"""
+        micros, logIDs, offsets, descriptions = self.micros, self.logIDs, self.offsets, self.descriptions
+        sourceIndexes, sourceOffsets = self.sourceIndexes, self.sourceOffsets
+        kept = keptOffset = 0
+        group = set()
+        groupMicros = None
+        for i in xrange(len(micros)):
+            start, end = offsets[i], offsets[i + 1]
+            description = str(descriptions[start:end])
+            if micros[i] != groupMicros:
+                group = set()
+                groupMicros = micros[i]
+            key = (logIDs[i], description)
+            if key in group:
+                continue
+            group.add(key)
+            if kept != i:
+                micros[kept] = micros[i]
+                logIDs[kept] = logIDs[i]
+                descriptions[keptOffset:keptOffset + end - start] = description
+                sourceIndexes[kept] = sourceIndexes[i]
+                sourceOffsets[kept] = sourceOffsets[i]
+            kept += 1
+            keptOffset += end - start
+            offsets[kept] = keptOffset
+        del micros[kept:]
+        del logIDs[kept:]
+        del offsets[kept + 1:]
+        del sourceIndexes[kept:]
+        del sourceOffsets[kept:]
+        del descriptions[keptOffset:]
+        return kept
+
+
+
+
+
+
+
+# -- SourceFile classes --------------------------------------------------------------------------------------------
+class SourceFile(object):
+    """This class records the provenance of a file read by a log reader: its size, mtime and inode, and the digests of
+    its raw bytes (the compressed bytes of .gz files) fed to update() as the file is read, so that hashing the evidence
+    takes no second read. The digests are None unless the whole file was read (see finish()). Instances are pickled
+    from the parser processes along with the events once finished."""
+
+    # digests computed, '--md5' adds md5
+    DIGESTS = ("sha256",)
+
+    def __init__(self, path, fileObject):
+        """Standard class constructor
+        @param: string - path of the file
+        @param: file - the file, just opened"""
+        import hashlib
+        stat = os.fstat(fileObject.fileno())
+        self.path = path
+        self.mtime = stat.st_mtime
+        self.inode = stat.st_ino
+        self.size = 0
+        self.digests = None
+        self.hashes = [(name, hashlib.new(name)) for name in self.DIGESTS]
+
+
+    def __getstate__(self):
+        # hash objects cannot be pickled
+        state = self.__dict__.copy()
+        state["hashes"] = []
+        return state
+
+
+    @classmethod
+    def fromSegment(cls, values):
+        """Rebuilds the SourceFile of a file read on another node from its entry in a segment file, see writeSegment()
+        @param: dict - path, size, mtime, inode and digests"""
+        source = cls.__new__(cls)
+        source.path, source.size, source.mtime, source.inode = values["path"], values["size"], values["mtime"], values["inode"]
+        source.digests = values["digests"]
+        source.hashes = []
+        return source
+
+
+    def update(self, data):
+        """Hashes the next bytes of the file
+        @param: string - bytes as read from the file"""
+        self.size += len(data)
+        for name, digest in self.hashes:
+            digest.update(data)
+
+
+    def finish(self):
+        """Called once the last byte of the file is read"""
+        self.digests = dict((name, digest.hexdigest()) for name, digest in self.hashes)
+        self.hashes = []
+
+
+
+
+
+
+
+
+
+# -- Prefetcher classes --------------------------------------------------------------------------------------------
+class Prefetcher(object):
+    """This class reads the files of a log family ahead of the parser on a background thread, so that waiting for slow
+    storage (NAS, USB evidence drives) overlaps with parsing. Files are read in blocks (gzip files are decompressed on
+    the thread too, zlib releases the interpreter lock) into a queue of at most 'depth' blocks, which bounds memory to
+    about depth x blockSize bytes. The kernel is told the files are read sequentially and the next file is requested
+    ahead (posix_fadvise). Iterating hands out (file index, block) tuples in order, the block is None at the end of a
+    file, or the exception that stopped reading it. The raw bytes are hashed on the thread as they are read, the
+    'sourceFiles' list holds the SourceFile of every file opened (None for the others)."""
+
+    # posix_fadvise() advice values (Linux)
+    SEQUENTIAL = 2
+    WILLNEED = 3
+    libcFadvise = None
+
+    def __init__(self, paths, depth=4, blockSize=1048576):
+        """Standard class constructor, starts reading
+        @param: list - paths of the files, in the order they are parsed
+        @param: int - number of blocks read ahead, 0 reads the blocks on the parser's thread
+        @param: int - block size in bytes"""
+        import threading
+        import Queue
+        self.paths = paths
+        self.blockSize = blockSize
+        # seconds spent reading and decompressing, and seconds the parser waited for a block
+        self.readSeconds = 0.0
+        self.waitSeconds = 0.0
+        self.bytesRead = 0
+        self.sourceFiles = [None] * len(paths)
+        self.stopped = threading.Event()
+        self.thread = None
+        if depth > 0:
+            self.queue = Queue.Queue(depth)
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+
+
+    @classmethod
+    def fadvise(cls, fileObject, advice):
+        """Gives an access pattern hint for a whole file to the kernel, os.posix_fadvise() is not there in Python 2
+        @param: file - an open file
+        @param: int - SEQUENTIAL or WILLNEED"""
+        try:
+            adviseFunction = getattr(os, "posix_fadvise", None)
+            if adviseFunction is not None:
+                adviseFunction(fileObject.fileno(), 0, 0, advice)
+                return
+            if cls.libcFadvise is None:
+                import ctypes
+                cls.libcFadvise = ctypes.CDLL(None).posix_fadvise
+                cls.libcFadvise.argtypes = [ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_int]
+            cls.libcFadvise(fileObject.fileno(), 0, 0, advice)
+        except Exception as e:
+            # not Linux, or no libc to call, reading works the same without the hint
+            cls.libcFadvise = False if cls.libcFadvise is None else cls.libcFadvise
+
+
+    def blocks(self):
+        """Reads the files one block at a time
+        @return: iterator - (file index, block) tuples, see the class description"""
+        import zlib
+        for index, path in enumerate(self.paths):
+            try:
+                if index + 1 < len(self.paths):
+                    with open(self.paths[index + 1], "rb") as nextFile:
+                        self.fadvise(nextFile, self.WILLNEED)
+                with open(path, "rb") as fileObject:
+                    self.fadvise(fileObject, self.SEQUENTIAL)
+                    source = self.sourceFiles[index] = SourceFile(path, fileObject)
+                    # 16 + MAX_WBITS: gzip header and trailer
+                    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS) if path.endswith(".gz") else None
+                    while True:
+                        start = time.time()
+                        data = fileObject.read(self.blockSize)
+                        self.bytesRead += len(data)
+                        # the evidence is hashed as read, compressed bytes included
+                        source.update(data)
+                        self.readSeconds += time.time() - start
+                        if not data:
+                            source.finish()
+                            break
+                        if inflater is None:
+                            yield index, data
+                            continue
+                        while data:
+                            start = time.time()
+                            # at most one block of output at a time, the rest of the input waits in unconsumed_tail
+                            block = inflater.decompress(data, self.blockSize)
+                            data = inflater.unconsumed_tail
+                            if inflater.unused_data:
+                                # the next member of a multi-member gzip file, or the zero padding after the last one
+                                data = inflater.unused_data.lstrip("\0")
+                                inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                            self.readSeconds += time.time() - start
+                            if block:
+                                yield index, block
+            except Exception as e:
+                yield index, e
+            else:
+                yield index, None
+
+
+    def run(self):
+        """The background thread: queues the blocks until every file is read or close() is called"""
+        for item in self.blocks():
+            while not self.stopped.is_set():
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    break
+                except Exception as e:
+                    # the queue is full, the parser is behind
+                    continue
+            else:
+                return
+
+
+    def __iter__(self):
+        if self.thread is None:
+            for item in self.blocks():
+                yield item
+            self.waitSeconds = self.readSeconds
+            return
+        done = 0
+        while done < len(self.paths):
+            start = time.time()
+            index, block = self.queue.get()
+            self.waitSeconds += time.time() - start
+            if block is None or isinstance(block, Exception):
+                done += 1
+            yield index, block
+
+
+    def close(self):
+        """Stops the background thread, i.e. when the parser stops early"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+
+
 
 
 
@@ -126,53 +539,122 @@ class LogReaderStdParser:
         'Jul 11 17:54:32 SpiderMan kernel: imklog 5.8.11, log source = /proc/kmsg started.'
     """
 
+    # the events of a file are in time order and carry absolute dates, so a file can be bisected by byte offset (see directQuery)
+    BISECTABLE = True
+    # blocks read ahead of the parser (0 reads on the parser's thread) and their size, see Prefetcher
+    PREFETCH_DEPTH = 4
+    PREFETCH_BLOCK_SIZE = 1048576
+
 
     def __init__(self, logName, logLocationAbsolutePath, logDescription):
-        """Constructor for the LogReader class and all inherited classes
+        """Constructor for the LogReader class and all inherited classes. Nothing is read until the reader is iterated
+        (or saved to a database with saveEventsToDB) so constructing readers is cheap and free of side effects.
         @param: string - The name of the log
         @param: string - The absolute path to the log (i.e. '/log/var/dmesg')
         @param: string - The description of the log"""
         
-        global db
         self.logName = logName
         self.logLocationAbsolutePath = logLocationAbsolutePath
         self.logDescription = logDescription
         self.count = 0
-        self.parentRecordID = db.createParentRecord(self.logName, self.logLocationAbsolutePath, self.logDescription)
-        self.events = set()
-        self.readLogFile()
-        self.saveEventsToDB()
+        self.parentRecordID = None
+        self.events = EventBuffer()
+        # (file index, byte offset) of the entry being decoded, and the SourceFile of every file of the log family read
+        self.source = None
+        self.sourceFiles = []
+
+
+    def __iter__(self):
+        """Parses the log family lazily: the (logID, eventDateTime, eventDescription) tuples of every line are yielded as
+        soon as it is decoded, in the order of the files, and nothing is kept once they are handed out. Events are not
+        sorted and the duplicates of archived versions of a log are not removed, consumers that merge streams drop them
+        afterwards (see timelineEvents()). readEvents() materializes the whole family sorted and without duplicates"""
+        self.events = EventBuffer()
+        self.count = 0
+        for line in self.readLogFile():
+            self.decode_entry(line)
+            if len(self.events):
+                for event in self.events:
+                    self.count += 1
+                    yield event
+                self.events.clear()
+
+
+    def readEvents(self):
+        """Parses the log family into an EventBuffer, sorted by date/time and without the possible duplicates introduced
+        by processing archived versions of a log. The whole family is held in memory, as the database ingest needs it
+        @return: EventBuffer - the events"""
+        self.events = EventBuffer()
+        for line in self.readLogFile():
+            self.decode_entry(line)
+        events, self.events = self.events, EventBuffer()
+        self.count = events.dedupe()
+        return events
 
 
     def readLogFile(self):
-        """Reads the log entires form the log file (and all its dirivitives i.e. auth.log, auth.log.1, auth.log.2.gz, etc), parses it and saves it to the database"""
-
+        """Reads the log entires form the log file (and all its dirivitives i.e. auth.log, auth.log.1, auth.log.2.gz, etc)
+        and yields them one line at a time to be parsed. The files are read ahead by a Prefetcher while lines are parsed,
+        and hashed as they are read. The (file index, byte offset) of every line is left in 'source' while it is decoded,
+        offsets of .gz files are offsets in the decompressed text"""
         filenamePattern = self.logLocationAbsolutePath+"*"
 
-        for file in glob.glob(filenamePattern):
-            # we have a new files, so need to reset RTC because RTCs are relative to one file they are in
-            self.waitingForRTC = True; 
-            self.preRTC = []
-            c=0
-            try:
-                if( file.endswith('.gz')):
-                    with gzip.open(file) as file_object:
-                        for line in file_object:
-                            c+=1
-                            print("    [*] {0:>12,} log entires parsed for file: '{1}'.".format(c, file), end="\r")
-                            line = line.rstrip() # remove training whitespaces including '\n'
-                            self.decode_entry(line)
+        # oldest files first (i.e. auth.log.2.gz, auth.log.1, auth.log) so that events come out mostly in time order
+        files = sorted(glob.glob(filenamePattern), key=os.path.getmtime)
+        prefetcher = Prefetcher(files, self.PREFETCH_DEPTH, self.PREFETCH_BLOCK_SIZE)
+        self.sourceFiles = prefetcher.sourceFiles
+        started = time.time()
+        current = None
+        try:
+            for index, block in prefetcher:
+                if index != current:
+                    # we have a new files, so need to reset RTC because RTCs are relative to one file they are in
+                    self.waitingForRTC = True; 
+                    self.preRTC = []
+                    current = index
+                    rest = ""
+                    position = 0
+                    c=0
+                if isinstance(block, Exception):
+                    continue
+                if block is None:
+                    # the last line may have no '\n'
+                    lines, rest = [rest] if rest else [], ""
                 else:
-                    with open(file) as file_object:
-                        for line in file_object:
-                            c+=1
-                            print("    [*] {0:>12,} log entires parsed for file: '{1}'.".format(c, file), end="\r")
-                            line = line.rstrip() # remove training whitespaces including '\n'
-                            self.decode_entry(line)
-            except Exception, e:
-                pass
-            else:
-                print(" ")
+                    lines = (rest + block).split("\n")
+                    rest = lines.pop()
+                for line in lines:
+                    c+=1
+                    # printing costs more than parsing a line, show the progress every 1000 lines
+                    if c % 1000 == 0:
+                        print("    [*] {0:>12,} log entires parsed for file: '{1}'.".format(c, files[index]), end="\r")
+                    self.source = (index, position)
+                    position += len(line) + 1
+                    yield line.rstrip() # remove training whitespaces including '\n'
+                if block is None:
+                    print("    [*] {0:>12,} log entires parsed for file: '{1}'.".format(c, files[index]), end="\r")
+                    print(" ")
+        finally:
+            prefetcher.close()
+            self.source = None
+        self.ioWaitSeconds = prefetcher.waitSeconds
+        self.parseSeconds = time.time() - started - prefetcher.waitSeconds
+        if files:
+            print("    [*] read {0:,.1f} MB in {1:.2f}s, waited {2:.2f}s for I/O, parsed in {3:.2f}s".format(prefetcher.bytesRead / 1048576.0,
+                  prefetcher.readSeconds, self.ioWaitSeconds, self.parseSeconds))
+
+
+    def decodeLine(self, singleLogEntry):
+        """Decodes one line of text without queuing its event
+        @param: string - The log entry (event date/time and description)
+        @return: tuple - (eventDateTime, eventDescription), None if the line has no date/time"""
+        self.events.clear()
+        self.decode_entry(singleLogEntry)
+        if len(self.events) == 0:
+            return None
+        event = self.events[0][1:]
+        self.events.clear()
+        return event
 
 
     def getLogName(self):
@@ -193,29 +675,49 @@ class LogReaderStdParser:
         return count
 
 
-    def saveEventsToDB( self ):
-        """This method interfaces with db to save the events that have been gathered so far"""
-        c=0
-        
+    def saveEventsToDB( self, db, host="", events=None ):
+        """This method creates the parent LOGS record for this log, records the files read (see dbLogs.saveSourceFiles())
+        and hands the parsed events to db in one bulk insert. The whole log family is saved in a single transaction and
+        published at once, see dbLogs.publishLog()
+        @param: dbLogs - The database the events are saved to
+        @param: string - The host/image ID the log was collected from
+        @param: iterable - Events already parsed by this reader (i.e. in another process), this reader is iterated if not given"""
+        if events is None:
+            events = self.readEvents()
+        db.createPartitionsFor(events)
         try:
-            global db
-            for logID, eventDateTime, eventDescription in self.events:
-                c+=1
-                print("[*] saving {0:>8,} unique log entires for the '{1}' system log to 'LinuxLogs.db'".format(c, self.logLocationAbsolutePath), end = "\r")
-                #cvcvcvdb.saveEvent( logID, eventDateTime, eventDescription )
-        except Exception, e:
-            pass
-        print("[*] saved {0:>8,} unique log entires for the '{1}' system log to 'LinuxLogs.db'".format(c, self.logLocationAbsolutePath))
+            self.parentRecordID = db.createParentRecord(self.logName, self.logLocationAbsolutePath, self.logDescription, host, commit=False)
+            sourceFileIDs = db.saveSourceFiles( self.sourceFiles, self.parentRecordID )
+            if db.ruleEngine is not None:
+                db.ruleEngine.startStream()
+            c = db.saveEvents( events, self.parentRecordID, commit=False, sourceFileIDs=sourceFileIDs )
+            self.saveDetailsToDB( db, host )
+            db.publishLog( self.parentRecordID, c )
+        except Exception as e:
+            db.connection.rollback()
+            db.miner = None
+            print("[!] could not save the '{0}' system log: {1}".format(self.logLocationAbsolutePath, e))
+            return 0
+        print("[*] saved {0:>8,} unique log entires for the '{1}' system log to '{2}'".format(c, self.logLocationAbsolutePath, db.path))
         print(" ")
-        
+        return c
+
+
+    def saveDetailsToDB( self, db, host="" ):
+        """Called by saveEventsToDB() within the transaction of the log family, readers that store more than events
+        (i.e. the login sessions of wtmp) save it here without committing
+        @param: dbLogs - The database the events are saved to
+        @param: string - The host/image ID the log was collected from"""
+        pass
 
 
-    def saveEvent( self, logID, eventDateTime, eventDescription ):
-        """save log event to interal 'events' set. Set's unique properties are being used here to avoid possible duplicates introduced by processing archived versions of a log
+    def saveEvent( self, logID, eventDateTime, eventDescription, source=None ):
+        """save log event to the interal 'events' EventBuffer, they are handed out (without duplicates) by readEvents
         @param: datetime - The date and time at which the log event occured
-        @param: string - The description of the log event"""
+        @param: string - The description of the log event
+        @param: tuple - (file index, byte offset) of the event, the entry being decoded by default"""
         try:
-            self.events.add((logID, eventDateTime, eventDescription))
+            self.events.append(logID, eventDateTime, eventDescription, source or self.source)
         except Exception, e:
             pass
 
@@ -334,6 +836,9 @@ class LogReaderOffsetParserDMESG(LogReaderStdParser):
         '[    0.178426] RTC time: 22:01:31, date: 07/10/14           <-- notice RTC time comes in eventually!'
     """
 
+    # times are relative to the last RTC event
+    BISECTABLE = False
+
 
     def __init__(self, logName, logLocationAbsolutePath, logDescription):
         """Constructor for the class that knows how to parse the /var/log/dmesg log, this is a child class of LogReaderOffsetParserDMESG
@@ -384,7 +889,7 @@ class LogReaderOffsetParserDMESG(LogReaderStdParser):
                     # adjust/normalize from offset to local time
                     for item in self.preRTC:
                         eventTime = self.RTC + datetime.timedelta(0, item[0])
-                        self.saveEvent( self.parentRecordID, eventTime, item[1])
+                        self.saveEvent( self.parentRecordID, eventTime, item[1], item[2])
                     # empty the preRTC because all items have been saved and reset it for the next possible log file within this log family
                     self.preRTC = []
                 except Exception, e:
@@ -397,7 +902,7 @@ class LogReaderOffsetParserDMESG(LogReaderStdParser):
                 
                 # note: Rounding is more precise if we want to query on a plus or minus windows in seconds
                 offsetSecondsSincePowerOn = self.extractTimeFromLogEntry( singleLogEntry )
-                self.preRTC.append( [offsetSecondsSincePowerOn, eventDescription])
+                self.preRTC.append( [offsetSecondsSincePowerOn, eventDescription, self.source])
         else:
             #if already have clock, then use it to calculate time of log entry
             eventDescription = singleLogEntry[singleLogEntry.find("]")+2:]
@@ -412,14 +917,782 @@ class LogReaderOffsetParserDMESG(LogReaderStdParser):
 
 
 
+# -- TemplateMiner classes --------------------------------------------------------------------------------------------
+class TemplateMiner(object):
+    """This class extracts message templates from event descriptions while they are ingested, with a fixed depth parse
+    tree in the style of Drain (He et al., "Drain: An Online Log Parsing Approach with Fixed Depth Tree", ICWS 2017).
+    Descriptions are split on spaces, the tree is keyed by the number of tokens and the first tokens (tokens with
+    digits are treated as parameters), and every leaf holds clusters of descriptions whose tokens are similar enough.
+    Tokens that differ within a cluster become the wildcard '<*>'.
+
+    For example:
+
+        'CRON[5040]: (root) CMD (   cd / && run-parts --report /etc/cron.hourly)'
+        'CRON[5041]: (root) CMD (   cd / && run-parts --report /etc/cron.daily)'
+
+    share the template 'CRON[<*>]: (root) CMD (   cd / && run-parts --report <*>' with the parameters
+    ['5040', '/etc/cron.hourly)'] and ['5041', '/etc/cron.daily)'] respectively.
+
+    A template never changes once it has an ID: when a cluster's template gets more wildcards a new template ID is
+    allocated for it, so events stored with the previous ID can always be rebuilt exactly."""
+
+    WILDCARD = "<*>"
+
+
+    def __init__(self, depth=2, similarityThreshold=0.5, maxChildren=100):
+        """Standard class constructor
+        @param: int - number of leading tokens used to key the parse tree
+        @param: float - minimum ratio of equal tokens for a description to join a cluster
+        @param: int - maximum number of children of an inner node, other tokens go to the wildcard child"""
+        self.depth = depth
+        self.similarityThreshold = similarityThreshold
+        self.maxChildren = maxChildren
+        self.tree = {}
+        self.nextTemplateID = 1
+        # (template ID, cluster ID, template) of templates not stored yet
+        self.newTemplates = []
+
+
+    def loadTemplates(self, rows):
+        """Rebuilds the parse tree from stored templates, only the newest template of every cluster is kept in the tree
+        @param: iterable - (template ID, cluster ID, template) tuples ordered by template ID"""
+        clusters = {}
+        for templateID, clusterID, template in rows:
+            clusters[clusterID] = (templateID, template)
+            self.nextTemplateID = max(self.nextTemplateID, templateID + 1)
+        for clusterID, (templateID, template) in clusters.items():
+            tokens = template.split(" ")
+            self.leaf(tokens).append([clusterID, templateID, tokens])
+
+
+    def leaf(self, tokens):
+        """Returns the list of clusters of the parse tree leaf the tokens belong to"""
+        node = self.tree.setdefault(len(tokens), {})
+        for token in tokens[:self.depth]:
+            if token == self.WILDCARD or any(character.isdigit() for character in token):
+                token = self.WILDCARD
+            if token not in node and len(node) >= self.maxChildren:
+                token = self.WILDCARD
+            node = node.setdefault(token, {})
+        return node.setdefault(None, [])
+
+
+    def addMessage(self, description):
+        """Finds (or creates) the template of a description, updating the template when needed
+        @param: string - the event description
+        @return: tuple - (template ID, list of parameters)"""
+        tokens = description.split(" ")
+        clusters = self.leaf(tokens)
+
+        best = None
+        bestSimilarity = -1.0
+        bestWildcards = -1
+        for cluster in clusters:
+            equal = 0
+            wildcards = 0
+            for templateToken, token in zip(cluster[2], tokens):
+                if templateToken == self.WILDCARD:
+                    wildcards += 1
+                elif templateToken == token:
+                    equal += 1
+            similarity = float(equal) / len(tokens)
+            if similarity > bestSimilarity or (similarity == bestSimilarity and wildcards > bestWildcards):
+                best, bestSimilarity, bestWildcards = cluster, similarity, wildcards
+
+        if best is None or bestSimilarity < self.similarityThreshold:
+            best = [self.nextTemplateID, self.nextTemplateID, tokens]
+            clusters.append(best)
+            self.newTemplates.append((self.nextTemplateID, self.nextTemplateID, description))
+            self.nextTemplateID += 1
+        else:
+            template = [templateToken if templateToken == token else self.WILDCARD for templateToken, token in zip(best[2], tokens)]
+            if template != best[2]:
+                best[1] = self.nextTemplateID
+                best[2] = template
+                self.newTemplates.append((self.nextTemplateID, best[0], " ".join(template)))
+                self.nextTemplateID += 1
+
+        return best[1], [token for templateToken, token in zip(best[2], tokens) if templateToken == self.WILDCARD]
+
+
+    @staticmethod
+    def render(template, params):
+        """Rebuilds a description from its template and parameters
+        @param: string - the template
+        @param: list - the parameters, one per wildcard
+        @return: string - the event description"""
+        params = iter(params)
+        return " ".join([next(params) if token == TemplateMiner.WILDCARD else token for token in template.split(" ")])
+
+
+
+
+
+
+
+# -- SaliencyEngine classes --------------------------------------------------------------------------------------------
+class SaliencyEngine(object):
+    """This class evaluates declarative saliency rules while events are ingested and raises alerts, instead of
+    searching the database after the fact. Rules are dictionaries (i.e. loaded from a JSON file) of three types:
+
+        threshold:  at least 'count' matching events with the same key within 'window' seconds
+                    {"name": "ssh brute force", "type": "threshold", "log": "auth log", "program": "sshd",
+                     "match": "Failed password", "key": "from (\\S+)", "count": 10, "window": 60}
+
+        sequence:   an event matching 'first' followed by an event matching 'then' with the same key within 'window' seconds
+                    {"name": "sudo after auth failure", "type": "sequence", "window": 300,
+                     "first": {"log": "auth log", "match": "Failed password|authentication failure", "key": "(?:for|user=)(?: invalid user)? (\\S+)"},
+                     "then":  {"log": "auth log", "program": "sudo", "match": "COMMAND=", "key": "^sudo: +(\\S+) :"}}
+
+        timeOfDay:  a matching event outside business hours ('hours' is [first hour, last hour), weekends are outside too)
+                    {"name": "dpkg install outside business hours", "type": "timeOfDay", "log": "dpkg log",
+                     "match": "^install ", "hours": [8, 18]}
+
+    'log' is the log name (see --logs), 'program' the syslog program of the description (i.e. 'sshd' for 'sshd[2090]: ...'),
+    'match' a regular expression searched in the description and 'key' a regular expression whose first group is the
+    key (host, user, ...) counters are kept for. Every part is optional.
+
+    Events are dispatched to the rules by (log, program) so only the rules that can match an event look at it, windows
+    are per-key sorted lists of at most 'count' event times and per-key state expires after 'window' seconds, so the
+    cost per event does not depend on how many rules there are nor on how many events were seen before. Every log
+    family is a new stream of events, see startStream()."""
+
+    BUILTIN_RULES = [
+        {"name": "failed logins from one host", "type": "threshold", "log": "btmp log", "match": "^Faild login",
+         "key": "^Faild login: \\S+\\s+\\S+\\s+(\\S+)", "count": 10, "window": 60},
+        {"name": "ssh password guessing from one host", "type": "threshold", "log": "auth log", "program": "sshd",
+         "match": "Failed password", "key": "from (\\S+)", "count": 10, "window": 60},
+        {"name": "sudo command after an authentication failure", "type": "sequence", "window": 300,
+         "first": {"log": "auth log", "match": "Failed password|authentication failure",
+                   "key": "(?:Failed password for|user=)(?: invalid user)? (\\S+)"},
+         "then": {"log": "auth log", "program": "sudo", "match": "COMMAND=", "key": "^sudo: +(\\S+) :"}},
+        {"name": "dpkg install outside business hours", "type": "timeOfDay", "log": "dpkg log", "match": "^install ", "hours": [8, 18]},
+    ]
+
+
+    def __init__(self, rules=None):
+        """Standard class constructor
+        @param: list - rule dictionaries, the built-in rules by default"""
+        import collections
+        self.rules = []
+        # (log name, program) -> list of (rule, part) to evaluate
+        self.dispatch = collections.defaultdict(list)
+        self.pendingAlerts = []
+        self.sinks = []
+        for rule in (self.BUILTIN_RULES if rules is None else rules):
+            self.addRule(rule)
+
+
+    @staticmethod
+    def loadRules(path):
+        """Reads a list of rule dictionaries from a JSON file"""
+        import json
+        with open(path) as file_object:
+            return json.load(file_object)
+
+
+    def addRule(self, rule):
+        """Compiles a rule and registers it in the dispatch table, raises ValueError for a rule that cannot be evaluated"""
+        import copy
+        import collections
+        rule = copy.deepcopy(rule)
+        rule["state"] = collections.OrderedDict()
+        rule["clock"] = None
+        parts = ["first", "then"] if rule.get("type") == "sequence" else [None]
+        for part in parts:
+            matcher = rule[part] if part else rule
+            matcher["matchRE"] = re.compile(matcher["match"]) if matcher.get("match") else None
+            matcher["keyRE"] = re.compile(matcher["key"]) if matcher.get("key") else None
+            if matcher["keyRE"] is not None and matcher["keyRE"].groups < 1:
+                raise ValueError("the key of rule '{0}' has no group: {1}".format(rule.get("name", rule.get("type")), matcher["key"]))
+            self.dispatch[(matcher.get("log"), matcher.get("program"))].append((rule, part))
+        self.rules.append(rule)
+
+
+    def startStream(self):
+        """Starts a new stream of events (i.e. another log family), the clocks and per-key state of every rule are
+        dropped since the events of the new stream may start anywhere in time"""
+        for rule in self.rules:
+            rule["clock"] = None
+            rule["state"].clear()
+
+
+    def observe(self, host, logName, eventTime, eventDescription):
+        """Evaluates the rules an event can match, alerts are queued in pendingAlerts and handed to every sink
+        @param: string - host/image ID
+        @param: string - log name
+        @param: datetime - date and time of the event
+        @param: string - description of the event"""
+        program = descriptionProgram(eventDescription)
+        candidates = self.dispatch.get((logName, program), []) + self.dispatch.get((logName, None), []) +\
+                     self.dispatch.get((None, program), []) + self.dispatch.get((None, None), [])
+        if not candidates:
+            return
+        seconds = (eventTime - datetime.datetime(1970, 1, 1)).total_seconds()
+        for rule, part in candidates:
+            matcher = rule[part] if part else rule
+            if matcher["matchRE"] is not None and not matcher["matchRE"].search(eventDescription):
+                continue
+            key = ""
+            if matcher["keyRE"] is not None:
+                found = matcher["keyRE"].search(eventDescription)
+                if found is None:
+                    continue
+                key = found.group(1)
+            key = (host, key)
+            self.advanceClock(rule, seconds)
+            if rule["type"] == "threshold":
+                self.observeThreshold(rule, key, seconds, host, logName, eventTime, eventDescription)
+            elif rule["type"] == "sequence":
+                self.observeSequence(rule, part, key, seconds, host, logName, eventTime, eventDescription)
+            elif rule["type"] == "timeOfDay":
+                first, last = rule.get("hours", [8, 18])
+                if eventTime.weekday() >= 5 or not (first <= eventTime.hour < last):
+                    self.alert(rule, key, host, logName, eventTime, eventDescription)
+
+
+    def advanceClock(self, rule, seconds):
+        """Moves the clock of a rule forward and evicts the per-key state that expired (TTL of 'window' seconds).
+        Late events do not move the clock back, they only update the state of their own key."""
+        window = rule.get("window", 60)
+        if rule["clock"] is None or seconds > rule["clock"]:
+            rule["clock"] = seconds
+        state = rule["state"]
+        # keys are kept in the order they were last updated, the expired ones are at the front
+        while state:
+            key, (lastSeen, value) = next(iter(state.items()))
+            if lastSeen >= rule["clock"] - window:
+                break
+            del state[key]
+
+
+    def touch(self, rule, key, seconds, value):
+        """Stores the state of a key, moving it to the back of the eviction order"""
+        state = rule["state"]
+        if key in state:
+            del state[key]
+        state[key] = (seconds, value)
+
+
+    def observeThreshold(self, rule, key, seconds, host, logName, eventTime, eventDescription):
+        """Sliding window counter: alerts when 'count' events of the same key fall within 'window' seconds. The times
+        of a key are kept sorted, out of order events are inserted in place, and there are never more than 'count' of
+        them since they are dropped when the rule alerts."""
+        import bisect
+        window = rule.get("window", 60)
+        times = rule["state"][key][1] if key in rule["state"] else []
+        bisect.insort(times, seconds)
+        newest = times[-1]
+        del times[:bisect.bisect_left(times, newest - window)]
+        if len(times) >= rule.get("count", 10):
+            self.alert(rule, key, host, logName, eventTime, eventDescription, "{0} events within {1} seconds".format(len(times), window))
+            del times[:]
+        self.touch(rule, key, newest, times)
+
+
+    def observeSequence(self, rule, part, key, seconds, host, logName, eventTime, eventDescription):
+        """Alerts when an event matching 'then' follows an event matching 'first' of the same key within 'window' seconds"""
+        if part == "first":
+            self.touch(rule, key, seconds, eventDescription)
+        elif key in rule["state"]:
+            firstSeen, firstDescription = rule["state"].pop(key)
+            if 0 <= seconds - firstSeen <= rule.get("window", 300):
+                self.alert(rule, key, host, logName, eventTime, eventDescription, "after: " + firstDescription)
+
+
+    def alert(self, rule, key, host, logName, eventTime, eventDescription, details=""):
+        """Queues an alert and hands it to every sink"""
+        alert = {"rule": rule.get("name", rule["type"]), "host": host, "key": key[1], "log_name": logName,
+                 "event_datetime": str(eventTime)[:19], "event_description": eventDescription, "details": details}
+        self.pendingAlerts.append(alert)
+        for sink in self.sinks:
+            sink(alert)
+
+
+    @staticmethod
+    def printAlert(alert):
+        """Sink that prints alerts to the standard output"""
+        print("\n[!] ALERT '{0}' host '{1}' key '{2}' at {3}: {4} {5}".format(alert["rule"], alert["host"], alert["key"],
+              alert["event_datetime"], alert["event_description"], alert["details"]))
+
+
+    @staticmethod
+    def jsonLinesSink(path):
+        """Returns a sink that appends alerts to a JSON lines file"""
+        import json
+        def sink(alert):
+            with open(path, "a") as file_object:
+                file_object.write(json.dumps(dict((name, value.decode("utf-8", "replace") if isinstance(value, str) else value)
+                                                  for name, value in alert.items())) + "\n")
+        return sink
+
+
+
+
+
+
+
+# -- NpyWriter classes --------------------------------------------------------------------------------------------
+class NpyWriter(object):
+    """This class writes a one dimensional NumPy .npy file (format version 1.0) one value at a time without NumPy, so
+    exports do not need NumPy installed and never hold a whole column in memory. The header is written with room for
+    any length and rewritten with the final shape when the file is closed. Load with numpy.load(path, mmap_mode='r')."""
+
+    # array module typecode of 64 bit integers ('q' does not exist in Python 2, 'l' is 64 bit on 64 bit Linux)
+    INT64 = "l"
+    HEADER_SIZE = 128
+
+    def __init__(self, path, typecode):
+        """Standard class constructor
+        @param: string - path of the .npy file
+        @param: string - array module typecode of the values: INT64, 'i' (int32) or 'B' (uint8)"""
+        import array
+        self.file_object = open(path, "wb")
+        self.typecode = typecode
+        self.values = array.array(typecode)
+        self.count = 0
+        self.writeHeader()
+
+
+    def writeHeader(self):
+        """Writes the magic string, the version and the header dictionary padded to HEADER_SIZE bytes"""
+        import struct
+        descr = "|u1" if self.typecode == "B" else "<i{0}".format(self.values.itemsize)
+        header = "{{'descr': '{0}', 'fortran_order': False, 'shape': ({1},), }}".format(descr, self.count)
+        header = header.ljust(self.HEADER_SIZE - 10 - 1) + "\n"
+        self.file_object.write("\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header)
+
+
+    def append(self, value):
+        """Appends one value"""
+        self.values.append(value)
+        if len(self.values) >= 65536:
+            self.flush()
+
+
+    def write(self, data):
+        """Appends the bytes of a string, for 'B' (uint8) files"""
+        self.flush()
+        self.file_object.write(data)
+        self.count += len(data)
+
+
+    def flush(self):
+        """Writes the buffered values"""
+        if sys.byteorder != "little":
+            self.values.byteswap()
+        self.file_object.write(self.values.tostring())
+        self.count += len(self.values)
+        del self.values[:]
+
+
+    def close(self):
+        """Writes the buffered values, the final shape and closes the file"""
+        self.flush()
+        self.file_object.seek(0)
+        self.writeHeader()
+        self.file_object.close()
+
+
+
+
+
+
+
+# -- CountMinSketch classes --------------------------------------------------------------------------------------------
+class CountMinSketch(object):
+    """Count-min sketch: 'depth' rows of 'width' counters, a value adds its count to one counter of every row and its
+    estimate is the smallest of them. Estimates never fall short of the true count and exceed it by at most
+    e / width x (all counts added) with probability 1 - e^-depth. Sketches of the same size merge by adding counters."""
+
+    def __init__(self, width=512, depth=4):
+        """Standard class constructor
+        @param: int - counters per row
+        @param: int - number of rows, at most 4"""
+        import array
+        self.width = width
+        self.depth = depth
+        self.counts = array.array("i", [0]) * (width * depth)
+
+
+    def cells(self, value):
+        """Returns the index of the counter of every row for a value, from one MD5 digest (four 32 bit hashes)"""
+        import hashlib
+        import struct
+        return [row * self.width + h % self.width for row, h in enumerate(struct.unpack("<4I", hashlib.md5(value).digest())[:self.depth])]
+
+
+    def add(self, value, count=1):
+        for cell in self.cells(value):
+            self.counts[cell] += count
+
+
+    def estimate(self, value):
+        return min(self.counts[cell] for cell in self.cells(value))
+
+
+    def merge(self, other):
+        """Adds the counters of a sketch of the same size"""
+        import array
+        import operator
+        self.counts = array.array("i", map(operator.add, self.counts, other.counts))
+
+
+    def errorBound(self, total):
+        """Returns how much an estimate may exceed the true count (with probability 1 - e^-depth)
+        @param: int - the sum of all counts added to the sketch"""
+        import math
+        return int(math.ceil(math.e / self.width * total))
+
+
+    def serialize(self):
+        import zlib
+        return zlib.compress(self.counts.tostring())
+
+
+    @classmethod
+    def deserialize(cls, blob, width=512, depth=4):
+        import zlib
+        sketch = cls(width, depth)
+        sketch.counts = sketch.counts.__class__("i", zlib.decompress(str(blob)))
+        return sketch
+
+
+
+
+
+
+
+# -- SpaceSaving classes --------------------------------------------------------------------------------------------
+class SpaceSaving(object):
+    """Heavy hitters summary of at most 'capacity' values, each with a lower and an upper bound of its count, plus the
+    'floor': the most any value left out may have been counted. Summaries merge (counts add, a value missing from one
+    side gets that side's floor added to its upper bound) and are truncated back to their capacity, so a value
+    counted more than the floor is never missed."""
+
+    def __init__(self, capacity=32):
+        """Standard class constructor
+        @param: int - number of values kept"""
+        self.capacity = capacity
+        self.counters = {}
+        self.floor = 0
+
+
+    @classmethod
+    def fromCounts(cls, counts, capacity=32):
+        """Builds an exact summary from the true count of every value (i.e. of one hour of one log)
+        @param: dict - value: count"""
+        summary = cls(capacity)
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        summary.counters = dict((value, [count, count]) for value, count in ranked[:capacity])
+        if len(ranked) > capacity:
+            summary.floor = ranked[capacity][1]
+        return summary
+
+
+    def merge(self, other):
+        counters = {}
+        for value in set(self.counters) | set(other.counters):
+            low, high = self.counters.get(value, (0, self.floor))
+            otherLow, otherHigh = other.counters.get(value, (0, other.floor))
+            counters[value] = [low + otherLow, high + otherHigh]
+        self.counters = counters
+        self.floor += other.floor
+        self.truncate()
+
+
+    def truncate(self):
+        """Keeps the values with the highest upper bounds, those dropped raise the floor"""
+        ranked = sorted(self.counters.items(), key=lambda item: (-item[1][1], item[0]))
+        for value, (low, high) in ranked[self.capacity:]:
+            self.floor = max(self.floor, high)
+            del self.counters[value]
+
+
+    def top(self, n):
+        """Returns the n values with the highest counts as (value, lower bound, upper bound) tuples"""
+        ranked = sorted(self.counters.items(), key=lambda item: (-item[1][1], item[0]))
+        return [(value, low, high) for value, (low, high) in ranked[:n]]
+
+
+    def serialize(self):
+        import json
+        return json.dumps({"floor": self.floor, "counters": [[value.decode("latin-1"), low, high] for value, (low, high) in self.counters.items()]})
+
+
+    @classmethod
+    def deserialize(cls, text, capacity=32):
+        import json
+        summary = cls(capacity)
+        state = json.loads(text)
+        summary.floor = state["floor"]
+        summary.counters = dict((value.encode("latin-1"), [low, high]) for value, low, high in state["counters"])
+        return summary
+
+
+
+
+
+
+
+# -- HyperLogLog classes --------------------------------------------------------------------------------------------
+class HyperLogLog(object):
+    """HyperLogLog distinct counter: 2^p one byte registers (2 KB for p=11) hold the longest run of leading zeros seen
+    among the hashes of the values routed to them. The relative standard error of the estimate is 1.04 / sqrt(2^p).
+    Counters merge by keeping the highest of every register."""
+
+    def __init__(self, p=11):
+        """Standard class constructor
+        @param: int - number of index bits, 2^p registers"""
+        self.p = p
+        self.registers = bytearray(1 << p)
+
+
+    def add(self, value):
+        import hashlib
+        import struct
+        x = struct.unpack("<Q", hashlib.md5(value).digest()[8:])[0]
+        index = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+
+    def estimate(self):
+        import math
+        m = len(self.registers)
+        raw = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count("\0")
+        if raw <= 2.5 * m and zeros:
+            # small cardinalities: linear counting
+            return m * math.log(float(m) / zeros)
+        return raw
+
+
+    def standardError(self):
+        return 1.04 / len(self.registers) ** 0.5
+
+
+    def serialize(self):
+        import zlib
+        return zlib.compress(str(self.registers))
+
+
+    @classmethod
+    def deserialize(cls, blob, p=11):
+        import zlib
+        counter = cls(p)
+        counter.registers = bytearray(zlib.decompress(str(blob)))
+        return counter
+
+
+
+
+
+
+
+# -- FieldSketch classes --------------------------------------------------------------------------------------------
+class FieldSketch(object):
+    """The sketches of one field (program, IP address, user...) of the events of one log in one hour: a count-min
+    sketch and a SpaceSaving summary for the heavy hitters, a HyperLogLog for the distinct values. A few kilobytes
+    answer top-K and distinct count questions over any number of hours and hosts once merged, see dbLogs.summary()"""
+
+    # fields extracted from event descriptions
+    IP = re.compile(r"\b(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\b")
+    # anchored on the forms that name a user (sshd, pam, sudo, audit records), not on prose such as 'waiting for beacon',
+    # shared with EntityExtractor so that the sketches and the entity index agree on what a user is
+    USER = re.compile(r"(?: for (?:invalid |illegal )?user | (?:Accepted|Failed) \S+ for (?:invalid user )?|(?<!\w)(?:USER|user|ruser|logname|acct|[A-Z]*UID)=\"?|"
+                      r"sudo:\s+(?=\S+ : )| by (?=[A-Za-z_][\w.@$-]*\(uid=)|: Invalid user |FAILED LOGIN \(\d+\) on \S+ FOR )([A-Za-z_][\w.@$-]*)(?![\w.@$-])")
+    # substrings of failed logins ('Failed password', 'authentication failure', 'Invalid user', 'FAILED LOGIN'...)
+    FAILED = ("ailed", "FAILED", "nvalid user", "authentication failure")
+    FIELDS = ("program", "ip", "user", "failed_user")
+
+    def __init__(self):
+        """Standard class constructor"""
+        self.events = 0
+        self.countMin = CountMinSketch()
+        self.heavyHitters = SpaceSaving()
+        self.distinct = HyperLogLog()
+
+
+    @classmethod
+    def fields(cls, eventDescription):
+        """Extracts the fields of an event description
+        @return: list - (field, value) tuples"""
+        found = []
+        program = descriptionProgram(eventDescription)
+        if program:
+            found.append(("program", program))
+        ip = cls.IP.search(eventDescription)
+        if ip:
+            found.append(("ip", ip.group(1)))
+        user = cls.USER.search(eventDescription)
+        if user:
+            found.append(("user", user.group(1)))
+            if any(failed in eventDescription for failed in cls.FAILED):
+                found.append(("failed_user", user.group(1)))
+        return found
+
+
+    @classmethod
+    def fromCounts(cls, counts):
+        """Builds the sketches of one hour from the exact count of every value
+        @param: dict - value: count"""
+        sketch = cls()
+        for value, count in counts.iteritems():
+            sketch.countMin.add(value, count)
+            sketch.distinct.add(value)
+            sketch.events += count
+        sketch.heavyHitters = SpaceSaving.fromCounts(counts)
+        return sketch
+
+
+    def merge(self, other):
+        self.events += other.events
+        self.countMin.merge(other.countMin)
+        self.heavyHitters.merge(other.heavyHitters)
+        self.distinct.merge(other.distinct)
+
+
+    def row(self):
+        """Returns the (events, count-min, heavy hitters, distinct) columns of a SKETCHES record"""
+        return (self.events, sqlite3.Binary(self.countMin.serialize()), self.heavyHitters.serialize(), sqlite3.Binary(self.distinct.serialize()))
+
+
+    @classmethod
+    def fromRow(cls, events, countMin, heavyHitters, distinct):
+        sketch = cls()
+        sketch.events = events
+        sketch.countMin = CountMinSketch.deserialize(countMin)
+        sketch.heavyHitters = SpaceSaving.deserialize(heavyHitters)
+        sketch.distinct = HyperLogLog.deserialize(distinct)
+        return sketch
+
+
+    def bounds(self, value):
+        """Returns the (lower bound, upper bound) of the count of a value: the heavy hitters summary bounds, or 0 and its
+        floor for a value left out, the upper bound tightened by the count-min estimate"""
+        low, high = self.heavyHitters.counters.get(value, (0, self.heavyHitters.floor))
+        return low, min(high, self.countMin.estimate(value))
+
+
+
+
+
+
+
+# -- EntityExtractor classes --------------------------------------------------------------------------------------------
+class EntityExtractor(object):
+    """Extracts typed entities from event descriptions: IPv4 and IPv6 addresses, user names (sshd, sudo, pam...),
+    processes ('program[pid]'), absolute file paths and the packages of dpkg. Every entity has a posting list of the
+    events it appears in, sorted by time (ENTITIES and POSTINGS tables), see dbLogs.pivot()"""
+
+    KINDS = ("ip", "user", "pid", "path", "package")
+    IPV4 = FieldSketch.IP
+    # candidates only, validated by socket.inet_pton()
+    IPV6 = re.compile(r"(?<![\w:.])([0-9A-Fa-f]{0,4}(?::[0-9A-Fa-f]{0,4}){2,7}(?:\.\d{1,3}){0,3})(?![\w:])")
+    USER = FieldSketch.USER
+    PID = re.compile(r"^(?:\S+ )?([A-Za-z0-9_./-]+\[\d+\]):")
+    # quoted paths may hold spaces (i.e. name="/tmp/my dir" in audit records)
+    PATH = re.compile(r"=\"(/[^\"]+)\"|(?:^|(?<=[\s=:\"'(]))(/[A-Za-z0-9_.+@-]+(?:/[A-Za-z0-9_.+@-]+)*)")
+    # dpkg.log: 'install simplescreenrecorder:i386 <none> 0.3.0-4~ppa1~saucy1', 'status installed libc6:amd64 2.19...'
+    PACKAGE = re.compile(r"^(?:install|upgrade|remove|purge|configure|trigproc|status \S+) ([a-z0-9][a-z0-9+.-]+)(?::[a-z0-9]+)? ")
+
+    @classmethod
+    def entities(cls, eventDescription):
+        """Extracts the entities of an event description, each one once
+        @return: list - (kind, value) tuples"""
+        found = []
+        for match in cls.IPV4.finditer(eventDescription):
+            # not a part of a version number (1.2.3.4.5)
+            if eventDescription[match.end():match.end() + 1] != "." and eventDescription[match.start() - 1:match.start()] != "." and \
+               all(int(octet) < 256 for octet in match.group(1).split(".")):
+                found.append(("ip", match.group(1)))
+        if "::" in eventDescription or eventDescription.count(":") >= 7:
+            for ip in cls.IPV6.findall(eventDescription):
+                if ip != "::" and cls.isIPv6(ip):
+                    found.append(("ip", ip.lower()))
+        for user in cls.USER.findall(eventDescription):
+            found.append(("user", user))
+        pid = cls.PID.match(eventDescription)
+        if pid:
+            found.append(("pid", pid.group(1).rsplit("/", 1)[-1]))
+        if "/" in eventDescription:
+            for quoted, path in cls.PATH.findall(eventDescription):
+                found.append(("path", quoted or path))
+        package = cls.PACKAGE.match(eventDescription)
+        if package:
+            found.append(("package", package.group(1)))
+        if len(found) > 1:
+            found = list(set(found))
+        return found
+
+
+    @staticmethod
+    def isIPv6(value):
+        import socket
+        try:
+            socket.inet_pton(socket.AF_INET6, value)
+            return True
+        except Exception as e:
+            return False
+
+
+
+
+
+
+
 # -- dbLogs classes --------------------------------------------------------------------------------------------
 class dbLogs(object):
     """Class encapsulates all direcect interface to the database"""
 
-    def __init__(self, **kwargs):
-        """Standard class constructor"""
-        self.connection = sqlite3.connect('LinuxLogs.db')
+    def __init__(self, path='LinuxLogs.db'):
+        """Standard class constructor
+        @param: string - The path of the SQLite database file, 'LinuxLogs.db' in the current directory by default, or ':memory:'"""
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.text_factory = str
+        try:
+            # write-ahead log: readers keep querying the last published log families while logs are being read
+            self.connection.execute("PRAGMA journal_mode=WAL;")
+        except Exception as e:
+            pass
         self.cursor = self.connection.cursor()
+        # the INGEST record of the ingestion in progress, see beginIngest()
+        self.ingestID = None
+        # depth of nested snapshot() blocks
+        self.snapshotDepth = 0
+        # snapshot file written every snapshotSeconds while logs are read, see saveSnapshot()
+        self.snapshotPath = None
+        self.snapshotSeconds = None
+        self.lastSnapshot = time.time()
+        self.knownPartitions = None
+        self.miner = None
+        self.templates = {}
+        # optional SaliencyEngine evaluating rules on every event saved
+        self.ruleEngine = None
+        self.logInfo = {}
+        # whether createDBitems() ran on this connection, ingestion creates the tables of a new database itself
+        self.itemsCreated = False
+        # whether SESSIONS is indexed by an R*Tree (or by the max end augmentation), see sessionIndex()
+        self.sessionRTree = None
+        # descriptions stored as a template ID plus parameters are rebuilt by this SQL function,
+        # i.e. 'SELECT DESCRIPTION(template_id, params, event_description) FROM LOGEVENTS_201407'
+        self.connection.create_function("DESCRIPTION", 3, self.description)
+        # 'X REGEXP Y' calls REGEXP(Y, X), patterns are compiled once per connection
+        self.patterns = {}
+        self.connection.create_function("REGEXP", 2, self.regexp)
+
+
+    def close(self):
+        """Closes the connection to the database"""
+        self.connection.close()
 
 
     def createDBitems(self):
@@ -430,55 +1703,822 @@ class dbLogs(object):
                     id                   INTEGER PRIMARY KEY,
                     log_file             varchar(60)  NOT NULL,
                     log_name             varchar(30)  NOT NULL,
-                    log_description      varchar(400) NOT NULL);
+                    log_description      varchar(400) NOT NULL,
+                    host                 varchar(60)  NOT NULL DEFAULT '');
                     """)
         except Exception as e:
             pass
 
         try:
+            # databases created before multi-image cases have no host column
+            self.cursor.execute("ALTER TABLE LOGS ADD COLUMN host varchar(60) NOT NULL DEFAULT '';")
+        except Exception as e:
+            pass
+
+        try:
+            self.cursor.execute("CREATE INDEX idx_LOGS_host ON LOGS ( host );")
+        except Exception as e:
+            pass
+
+        try:
+            # log families are published one at a time, each with the next generation number, see publishLog()
+            self.cursor.execute("ALTER TABLE LOGS ADD COLUMN generation integer;")
+        except Exception as e:
+            pass
+
+        try:
+            # one record per ingestion (--rootDir, --resetDB), updated as every log family is published
+            self.cursor.execute("""
+                CREATE TABLE INGEST ( 
+                    id                   INTEGER PRIMARY KEY,
+                    hosts                varchar(400) NOT NULL,
+                    started              datetime     NOT NULL,
+                    finished             datetime,
+                    families_total       integer      NOT NULL,
+                    families_done        integer      NOT NULL DEFAULT 0,
+                    events               integer      NOT NULL DEFAULT 0,
+                    generation           integer,
+                    last_log             varchar(60),
+                    status               varchar(20)  NOT NULL);
+            """)
+        except Exception as e:
+            pass
+
+        try:
+            # segment files merged into the database (one record per host of a segment), see mergeSegment()
             self.cursor.execute("""
-                CREATE TABLE LOGEVENTS ( 
-                    id                   integer PRIMARY KEY AUTOINCREMENT,
-                    fk_logid             integer NOT NULL ,
-                    event_datetime       datetime NOT NULL,
+                CREATE TABLE SEGMENTS ( 
+                    id                   INTEGER PRIMARY KEY,
+                    sha256               varchar(64)  NOT NULL,
+                    host                 varchar(60)  NOT NULL,
+                    path                 varchar(400) NOT NULL,
+                    created              datetime,
+                    min_datetime         datetime,
+                    max_datetime         datetime,
+                    events               integer      NOT NULL,
+                    merged               datetime     NOT NULL,
+                    UNIQUE ( sha256, host ) );
+            """)
+        except Exception as e:
+            pass
+
+        try:
+            # sketches of the fields of the events of every log and hour ('YYYY-MM-DD HH'), see FieldSketch
+            self.cursor.execute("""
+                CREATE TABLE SKETCHES ( 
+                    fk_logid             integer      NOT NULL,
+                    bucket               varchar(13)  NOT NULL,
+                    field                varchar(20)  NOT NULL,
+                    events               integer      NOT NULL,
+                    count_min            blob         NOT NULL,
+                    heavy_hitters        text         NOT NULL,
+                    distinct_values      blob         NOT NULL,
+                    PRIMARY KEY ( field, bucket, fk_logid ),
+                    FOREIGN KEY ( fk_logid ) REFERENCES LOGS( id ) );
+            """)
+        except Exception as e:
+            pass
+
+        try:
+            # entities of the events (IP addresses, users, processes, paths, packages) and their posting lists sorted by
+            # time (seconds since the epoch), see EntityExtractor. The index on event_id finds the entities of given
+            # events (related entities)
+            self.cursor.execute("""
+                CREATE TABLE ENTITIES ( 
+                    id                   INTEGER PRIMARY KEY,
+                    kind                 varchar(10)  NOT NULL,
+                    value                varchar(256) NOT NULL,
+                    UNIQUE ( value, kind ) );
+            """)
+            self.cursor.execute("""
+                CREATE TABLE POSTINGS ( 
+                    fk_entityid          integer      NOT NULL,
+                    event_time           integer      NOT NULL,
+                    event_id             integer      NOT NULL,
+                    fk_logid             integer      NOT NULL,
+                    PRIMARY KEY ( fk_entityid, event_time, event_id ),
+                    FOREIGN KEY ( fk_entityid ) REFERENCES ENTITIES( id ),
+                    FOREIGN KEY ( fk_logid ) REFERENCES LOGS( id ) ) WITHOUT ROWID;
+            """)
+            self.cursor.execute("CREATE INDEX idx_POSTINGS_event ON POSTINGS ( event_id );")
+        except Exception as e:
+            pass
+
+        try:
+            # catalog of the monthly LOGEVENTS_YYYYMM partitions along with the min/max event date/time stored in each one,
+            # queries use it to prune partitions that cannot contain events of interest
+            self.cursor.execute("""
+                CREATE TABLE PARTITIONS ( 
+                    name                 varchar(30)  PRIMARY KEY,
+                    month                varchar(7)   NOT NULL,
+                    min_datetime         datetime,
+                    max_datetime         datetime);
+            """)
+        except Exception as e:
+            pass
+
+        try:
+            # message templates mined from event descriptions at ingest time, see TemplateMiner
+            self.cursor.execute("""
+                CREATE TABLE TEMPLATES ( 
+                    id                   INTEGER PRIMARY KEY,
+                    cluster_id           integer      NOT NULL,
+                    template             varchar(400) NOT NULL,
+                    count                integer      NOT NULL DEFAULT 0);
+            """)
+        except Exception as e:
+            pass
+
+        try:
+            # alerts raised by the SaliencyEngine at ingest time
+            self.cursor.execute("""
+                CREATE TABLE ALERTS ( 
+                    id                   INTEGER PRIMARY KEY,
+                    rule                 varchar(100) NOT NULL,
+                    host                 varchar(60)  NOT NULL,
+                    alert_key            varchar(100),
+                    log_name             varchar(30),
+                    event_datetime       datetime     NOT NULL,
                     event_description    varchar(400),
-                    FOREIGN KEY ( fk_logid ) REFERENCES LOGS( id ) ON DELETE CASCADE ON UPDATE CASCADE);
+                    details              varchar(400));
             """)
         except Exception as e:
             pass
 
         try:
+            # login sessions (wtmp), end_datetime is NULL for users still logged in
             self.cursor.execute("""
-                    CREATE INDEX idx_LOGEVENTS ON LOGEVENTS ( fk_logid );
+                CREATE TABLE SESSIONS ( 
+                    id                   INTEGER PRIMARY KEY,
+                    fk_logid             INTEGER      NOT NULL,
+                    host                 varchar(60)  NOT NULL,
+                    user                 varchar(32),
+                    tty                  varchar(32),
+                    remote_host          varchar(256),
+                    start_datetime       datetime     NOT NULL,
+                    end_datetime         datetime,
+                    status               varchar(20),
+                    boot_datetime        datetime,
+                    max_end              datetime,
+                    FOREIGN KEY ( fk_logid ) REFERENCES LOGS( id ) );
             """)
+            self.cursor.execute("CREATE INDEX idx_SESSIONS_start ON SESSIONS ( start_datetime );")
+            self.cursor.execute("CREATE INDEX idx_SESSIONS_max_end ON SESSIONS ( max_end, start_datetime );")
         except Exception as e:
             pass
-        finally:
+
+        try:
+            # zone maps (min/max date/time) and sparse offset indexes of raw log files, see directQuery()
+            self.cursor.execute("""
+                CREATE TABLE FILEINDEX ( 
+                    id                   INTEGER PRIMARY KEY,
+                    path                 varchar(400) NOT NULL UNIQUE,
+                    size                 INTEGER      NOT NULL,
+                    mtime                REAL         NOT NULL,
+                    min_datetime         datetime,
+                    max_datetime         datetime );
+            """)
+            self.cursor.execute("""
+                CREATE TABLE FILEINDEX_POINTS ( 
+                    fk_fileid            INTEGER      NOT NULL,
+                    offset               INTEGER      NOT NULL,
+                    event_datetime       datetime     NOT NULL,
+                    FOREIGN KEY ( fk_fileid ) REFERENCES FILEINDEX( id ) );
+            """)
+            self.cursor.execute("CREATE INDEX idx_FILEINDEX_POINTS ON FILEINDEX_POINTS ( fk_fileid, event_datetime );")
+        except Exception as e:
+            pass
+
+        try:
+            # provenance of every file read: size, mtime, inode and digests of its raw bytes, see SourceFile
+            self.cursor.execute("""
+                CREATE TABLE SOURCEFILES ( 
+                    id                   INTEGER PRIMARY KEY,
+                    fk_logid             INTEGER      NOT NULL,
+                    path                 varchar(400) NOT NULL,
+                    size                 INTEGER      NOT NULL,
+                    mtime                REAL         NOT NULL,
+                    inode                INTEGER,
+                    sha256               char(64),
+                    md5                  char(32),
+                    FOREIGN KEY ( fk_logid ) REFERENCES LOGS( id ) );
+            """)
+            self.cursor.execute("CREATE INDEX idx_SOURCEFILES_log ON SOURCEFILES ( fk_logid );")
+            self.cursor.execute("CREATE INDEX idx_SOURCEFILES_sha256 ON SOURCEFILES ( sha256 );")
+        except Exception as e:
+            pass
+
+        try:
+            # interval index of the sessions, in seconds since the epoch
+            self.cursor.execute("CREATE VIRTUAL TABLE SESSIONS_RTREE USING rtree( id, start_time, end_time );")
+        except Exception as e:
+            # no R*Tree module, the max_end column is maintained instead
             pass
+        self.sessionRTree = None
+
+        kind = self.connection.execute("SELECT type FROM sqlite_master WHERE name='LOGEVENTS';").fetchone()
+        if kind == None:
+            self.rebuildEventsView()
+        elif kind[0] == 'table':
+            self.migrateLegacyEvents()
+
+        # partitions created before descriptions were stored as templates have no template columns, and databases
+        # created before the LOGEVENTS_RAW view have not got it
+        upgraded = self.connection.execute("SELECT name FROM sqlite_master WHERE name='LOGEVENTS_RAW';").fetchone() is None
+        indices = set(name for name, in self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'index';"))
+        for name in self.partitions():
+            columns = [column[1] for column in self.connection.execute("PRAGMA table_info({0});".format(name))]
+            if "template_id" not in columns:
+                self.cursor.execute("ALTER TABLE {0} ADD COLUMN template_id integer;".format(name))
+                self.cursor.execute("ALTER TABLE {0} ADD COLUMN params blob;".format(name))
+                self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_{0}_template ON {0} ( template_id );".format(name))
+                upgraded = True
+            # nor the source file and byte offset of their events
+            if "fk_sourcefileid" not in columns:
+                self.cursor.execute("ALTER TABLE {0} ADD COLUMN fk_sourcefileid integer;".format(name))
+                self.cursor.execute("ALTER TABLE {0} ADD COLUMN source_offset integer;".format(name))
+                upgraded = True
+            # nor the (log, date/time) index of the context seeks, which replaces the log index
+            if "idx_{0}_log".format(name) not in indices:
+                print("[*] indexing the events of '{0}' by log and date/time".format(name))
+                self.cursor.execute("CREATE INDEX idx_{0}_log ON {0} ( fk_logid, event_datetime );".format(name))
+                self.cursor.execute("DROP INDEX IF EXISTS idx_{0};".format(name))
+                self.connection.commit()
+        if upgraded:
+            self.rebuildEventsView()
+        self.itemsCreated = True
+
+
+    def migrateLegacyEvents(self):
+        """Moves the events of a database created before events were partitioned by month into partitions"""
+        print("[*] moving the events of '{0}' into monthly partitions".format(self.path))
+        self.cursor.execute("ALTER TABLE LOGEVENTS RENAME TO LOGEVENTS_legacy;")
+        self.connection.commit()
+        self.rebuildEventsView()
+        self.saveEvents( self.connection.execute("SELECT fk_logid, event_datetime, event_description FROM LOGEVENTS_legacy ORDER BY id;").fetchall() )
+        self.cursor.execute("DROP TABLE LOGEVENTS_legacy;")
+        self.connection.commit()
 
 
     def dropDBitems(self):
         """Method to delete tables and indices from database"""
+        self.itemsCreated = False
+        for name in self.partitions():
+            self.dropPartition(name, rebuildView=False)
+
+        try:
+            self.cursor.execute("DROP VIEW LOGEVENTS;")
+        except Exception as e:
+            pass
+
         try:
-            self.cursor.execute("DROP INDEX idx_LOGEVENTS;")
+            self.cursor.execute("DROP VIEW LOGEVENTS_RAW;")
         except Exception as e:
             pass
 
         try:
+            # databases created before events were partitioned by month
             self.cursor.execute("DROP TABLE LOGEVENTS;")
         except Exception as e:
             pass
 
+        try:
+            self.cursor.execute("DROP TABLE PARTITIONS;")
+        except Exception as e:
+            pass
+
+        try:
+            self.cursor.execute("DROP TABLE TEMPLATES;")
+        except Exception as e:
+            pass
+
+        try:
+            self.cursor.execute("DROP TABLE ALERTS;")
+        except Exception as e:
+            pass
+
+        try:
+            self.cursor.execute("DROP TABLE SESSIONS;")
+        except Exception as e:
+            pass
+
+        try:
+            self.cursor.execute("DROP TABLE SESSIONS_RTREE;")
+        except Exception as e:
+            pass
+
+        try:
+            self.cursor.execute("DROP TABLE FILEINDEX_POINTS;")
+            self.cursor.execute("DROP TABLE FILEINDEX;")
+        except Exception as e:
+            pass
+
+        try:
+            self.cursor.execute("DROP TABLE INGEST;")
+        except Exception as e:
+            pass
+
+        try:
+            self.cursor.execute("DROP TABLE SEGMENTS;")
+        except Exception as e:
+            pass
+
+        try:
+            self.cursor.execute("DROP TABLE SKETCHES;")
+        except Exception as e:
+            pass
+
+        try:
+            self.cursor.execute("DROP TABLE POSTINGS;")
+            self.cursor.execute("DROP TABLE ENTITIES;")
+        except Exception as e:
+            pass
+
+        try:
+            self.cursor.execute("DROP TABLE SOURCEFILES;")
+        except Exception as e:
+            pass
+        self.sessionRTree = None
+        self.miner = None
+        self.templates = {}
+
         try:
             self.cursor.execute("DROP TABLE LOGS;")
         except Exception as e:
             pass
 
 
-    def createParentRecord(self, logName, logLocationAbsolutePath, logDescription):
+    def partitionName(self, eventDateTime):
+        """Returns the name of the monthly partition that holds events of a given date/time
+        @param: string - event date/time of the form 'YYYY-MM-DD HH:MM:SS'
+        @return: string - partition name of the form 'LOGEVENTS_YYYYMM'"""
+        return "LOGEVENTS_" + eventDateTime[:4] + eventDateTime[5:7]
+
+
+    def partitions(self, startDateTime=None, endDateTime=None):
+        """Returns the names of the partitions, oldest first, that may hold events within the given start and end dates
+        (inclusive). All partitions are returned when no window is given.
+        @param: datetime - Start date/time of the window, optional
+        @param: datetime - End date/time of the window, optional
+        @return: list - partition names"""
+        queryStr = "SELECT name FROM PARTITIONS WHERE 1 "
+        params = []
+        if startDateTime != None:
+            queryStr += "AND max_datetime >= ? "
+            params.append(str(startDateTime))
+        if endDateTime != None:
+            queryStr += "AND min_datetime <= ? "
+            params.append(str(endDateTime))
+        try:
+            cursor = self.connection.execute(queryStr + "ORDER BY month;", params)
+            return [name for name, in cursor]
+        except sqlite3.OperationalError as e:
+            # the database has not been created yet
+            return []
+
+
+    def createPartition(self, name):
+        """Creates a monthly partition table and its indices. The AUTOINCREMENT sequence of every partition starts at
+        YYYYMM << 32 so that event ids stay unique across partitions and tell which partition holds them.
+        @param: string - partition name of the form 'LOGEVENTS_YYYYMM'"""
+        month = name[10:14] + "-" + name[14:16]
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS {0} ( 
+                id                   integer PRIMARY KEY AUTOINCREMENT,
+                fk_logid             integer NOT NULL ,
+                event_datetime       datetime NOT NULL,
+                event_description    varchar(400),
+                template_id          integer,
+                params               blob,
+                fk_sourcefileid      integer,
+                source_offset        integer,
+                FOREIGN KEY ( fk_logid ) REFERENCES LOGS( id ) ON DELETE CASCADE ON UPDATE CASCADE);
+        """.format(name))
+        # ordered by (fk_logid, event_datetime, id), the rowid ends every index: the events of a log and their neighbours
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_{0}_log ON {0} ( fk_logid, event_datetime );".format(name))
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_{0}_datetime ON {0} ( event_datetime );".format(name))
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_{0}_template ON {0} ( template_id );".format(name))
+        self.cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ( ?, ? );", (name, int(name[10:]) << 32))
+        self.cursor.execute("INSERT INTO PARTITIONS (name, month) VALUES ( ?, ? );", (name, month))
+        self.rebuildEventsView()
+
+
+    def dropPartition(self, name, rebuildView=True):
+        """Drops a whole monthly partition. No row is deleted one by one, the table and its indices are simply dropped
+        @param: string - partition name of the form 'LOGEVENTS_YYYYMM'"""
+        try:
+            self.cursor.execute("DROP TABLE {0};".format(name))
+            self.cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?;", (name,))
+            self.cursor.execute("DELETE FROM PARTITIONS WHERE name = ?;", (name,))
+            self.connection.commit()
+        except Exception as e:
+            pass
+        if rebuildView:
+            self.rebuildEventsView()
+
+
+    def rebuildEventsView(self):
+        """(Re)creates the LOGEVENTS view as the union of all partitions, so that queries written against the single
+        LOGEVENTS table of previous versions keep working. Descriptions stored as templates are rebuilt on the fly by the
+        DESCRIPTION() function this class registers, which other SQLite tools do not have: they can read the
+        LOGEVENTS_RAW view instead, where event_description is NULL for the descriptions stored as a template and
+        params (the parameters separated by NUL characters, one per '<*>' of the template) sits next to the template"""
+        names = self.partitions()
+        selects = ["SELECT id, fk_logid, event_datetime, DESCRIPTION(template_id, params, event_description) AS event_description, " +\
+                   "template_id, fk_sourcefileid, source_offset FROM {0}".format(name) for name in names]
+        if not selects:
+            selects = ["SELECT NULL AS id, NULL AS fk_logid, NULL AS event_datetime, NULL AS event_description, NULL AS template_id, " +\
+                       "NULL AS fk_sourcefileid, NULL AS source_offset WHERE 0"]
+        rawSelects = ["SELECT E.id, E.fk_logid, E.event_datetime, E.event_description, E.template_id, T.template, E.params, " +\
+                      "E.fk_sourcefileid, E.source_offset FROM {0} E LEFT JOIN TEMPLATES T ON T.id = E.template_id".format(name) for name in names]
+        if not rawSelects:
+            rawSelects = ["SELECT NULL AS id, NULL AS fk_logid, NULL AS event_datetime, NULL AS event_description, NULL AS template_id, " +\
+                          "NULL AS template, NULL AS params, NULL AS fk_sourcefileid, NULL AS source_offset WHERE 0"]
+        try:
+            self.cursor.execute("DROP VIEW IF EXISTS LOGEVENTS_RAW;")
+            self.cursor.execute("CREATE VIEW LOGEVENTS_RAW AS " + " UNION ALL ".join(rawSelects) + ";")
+            self.connection.commit()
+        except Exception as e:
+            pass
+        try:
+            self.cursor.execute("DROP VIEW IF EXISTS LOGEVENTS;")
+            self.cursor.execute("CREATE VIEW LOGEVENTS AS " + " UNION ALL ".join(selects) + ";")
+            self.connection.commit()
+        except Exception as e:
+            # the LOGEVENTS table of a database created before events were partitioned by month is left alone
+            pass
+
+
+    def applyRetention(self, months):
+        """Retention policy: keeps only the newest N months of events by dropping whole partitions older than that
+        @param: int - number of months to keep, counting back from the newest partition
+        @return: list - names of the partitions that were dropped"""
+        names = self.partitions()
+        dropped = names[:max(0, len(names) - months)] if months > 0 else names
+        for name in dropped:
+            print("[*] retention policy: dropping partition '{0}'".format(name))
+            self.dropPartition(name, rebuildView=False)
+        if dropped:
+            self.rebuildEventsView()
+            self.refreshTemplateCounts()
+            # the sketches of the months dropped go too
+            kept = names[len(dropped):]
+            if kept:
+                self.cursor.execute("DELETE FROM SKETCHES WHERE bucket < ?;", (kept[0][10:14] + "-" + kept[0][14:16],))
+                # event ids start at YYYYMM << 32 in every partition
+                self.cursor.execute("DELETE FROM POSTINGS WHERE event_id < ?;", (int(kept[0][10:]) << 32,))
+            else:
+                self.cursor.execute("DELETE FROM SKETCHES;")
+                self.cursor.execute("DELETE FROM POSTINGS;")
+            self.deleteOrphanEntities()
+            self.connection.commit()
+        return dropped
+
+
+    def fanOut(self, partitions, selectStr, params=()):
+        """Runs the same query against every given partition and merges the results in time order. The query must
+        select event_datetime first and id second, and be ordered by them, i.e. 'SELECT E.event_datetime, E.id, ...
+        FROM {0} E ... ORDER BY E.event_datetime, E.id'
+        @param: list - partition names
+        @param: string - the query, '{0}' is replaced by the partition name
+        @param: tuple - query parameters
+        @return: iterator - rows of all partitions merged in time order"""
+        import heapq
+        with self.snapshot():
+            cursors = [self.connection.execute(selectStr.format(name), params) for name in partitions]
+            for row in heapq.merge(*cursors):
+                yield row
+
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        """Holds one read transaction for the duration of a with block, so that every query of the block (i.e. the
+        cursors of all partitions in fanOut()) sees the same published log families. With the write-ahead log a
+        snapshot never waits for the ingestion in progress, nor does the ingestion wait for it. Blocks can be nested."""
+        if self.snapshotDepth == 0:
+            self.connection.execute("BEGIN;")
+        self.snapshotDepth += 1
+        try:
+            yield self
+        finally:
+            self.snapshotDepth -= 1
+            if self.snapshotDepth == 0:
+                self.connection.commit()
+
+
+    def publishedGeneration(self):
+        """Returns the generation number of the newest log family published, see publishLog()"""
+        try:
+            return self.connection.execute("SELECT COALESCE(MAX(generation), 0) FROM LOGS;").fetchone()[0]
+        except sqlite3.OperationalError as e:
+            return 0
+
+
+    def beginIngest(self, hosts, familiesTotal):
+        """Adds an INGEST record for an ingestion about to start, log families published from now on are counted in it
+        @param: list - host/image IDs being read
+        @param: int - number of log families to read
+        @return: int - the id of the INGEST record"""
+        if not self.itemsCreated:
+            # a new database, or one created by an older version, i.e. 'readLogs(root, Database(path))'
+            self.createDBitems()
+        self.cursor.execute("INSERT INTO INGEST (hosts, started, families_total, generation, status) VALUES ( ?, ?, ?, ?, 'running' );",
+                            (", ".join(hosts), str(datetime.datetime.now())[:19], familiesTotal, self.publishedGeneration()))
+        self.connection.commit()
+        self.ingestID = self.cursor.lastrowid
+        return self.ingestID
+
+
+    def finishIngest(self, status="done"):
+        """Marks the INGEST record of the ingestion in progress as finished
+        @param: string - 'done', or 'failed'"""
+        if self.ingestID is None:
+            return
+        self.cursor.execute("UPDATE INGEST SET finished = ?, status = ? WHERE id = ?;", (str(datetime.datetime.now())[:19], status, self.ingestID))
+        self.connection.commit()
+        self.ingestID = None
+
+
+    def publishLog(self, logID, count):
+        """Publishes a log family saved without commit: stamps its LOGS record with the next generation number, counts it
+        in the INGEST record of the ingestion in progress and commits all of it at once. Readers see all of a log family
+        (parent record, events, templates, alerts, sessions) or nothing of it.
+        @param: int - the id of the parent record in LOGS
+        @param: int - the number of events saved
+        @return: int - the generation number"""
+        generation = self.publishedGeneration() + 1
+        self.cursor.execute("UPDATE LOGS SET generation = ? WHERE id = ?;", (generation, logID))
+        if self.ingestID is not None:
+            self.cursor.execute("UPDATE INGEST SET families_done = families_done + 1, events = events + ?, generation = ?, " +\
+                                "last_log = (SELECT log_file FROM LOGS WHERE id = ?) WHERE id = ?;", (count, generation, logID, self.ingestID))
+        self.connection.commit()
+        if self.snapshotPath is not None and time.time() - self.lastSnapshot >= self.snapshotSeconds:
+            self.saveSnapshot(self.snapshotPath)
+        return generation
+
+
+    def saveSnapshot(self, path):
+        """Writes a consistent copy of the database (i.e. an in-memory one) to a file through the SQLite online backup
+        API, or VACUUM INTO where Python has no Connection.backup() (Python 2). The copy is written to a temporary file
+        renamed over the previous snapshot, which is never left half written.
+        @param: string - path of the snapshot file
+        @return: bool - True if the snapshot was written"""
+        if os.path.abspath(path) == os.path.abspath(self.path):
+            print("[!] the snapshot would overwrite the database itself: '{0}'".format(path))
+            return False
+        temporary = path + ".tmp"
+        started = time.time()
+        try:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            backup = getattr(self.connection, "backup", None)
+            if backup is not None:
+                target = sqlite3.connect(temporary)
+                try:
+                    backup(target)
+                finally:
+                    target.close()
+            else:
+                self.connection.commit()
+                self.connection.execute("VACUUM INTO ?;", (temporary,))
+            # the write-ahead log of the previous snapshot does not belong to the new one
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            os.rename(temporary, path)
+        except Exception as e:
+            print("[!] could not write the snapshot '{0}': {1}".format(path, e))
+            return False
+        self.lastSnapshot = time.time()
+        print("[*] snapshot of the database written to '{0}' in {1:.2f}s".format(path, self.lastSnapshot - started))
+        return True
+
+
+    def loadSnapshot(self, path):
+        """Loads a database file (a snapshot, or any database of this script) into this empty database, i.e. into RAM
+        for query-heavy sessions. Uses the online backup API, or copies every table of the attached file in one read
+        transaction where Python has no Connection.backup() (Python 2).
+        @param: string - path of the database file"""
+        started = time.time()
+        source = sqlite3.connect(path)
+        try:
+            backup = getattr(source, "backup", None)
+            if backup is not None:
+                backup(self.connection)
+        finally:
+            source.close()
+        if backup is None:
+            self.connection.execute("ATTACH DATABASE ? AS snapshot;", (path,))
+            try:
+                objects = self.connection.execute("SELECT type, name, sql FROM snapshot.sqlite_master WHERE sql IS NOT NULL;").fetchall()
+                # the tables of an R*Tree (i.e. SESSIONS_RTREE_node) are created along with it
+                virtualTables = [name for kind, name, sql in objects if sql.upper().startswith("CREATE VIRTUAL TABLE")]
+                tables = [(name, sql) for kind, name, sql in objects if kind == "table" and name != "sqlite_sequence" and
+                          not any(name.startswith(virtualTable + "_") for virtualTable in virtualTables)]
+                for name, sql in tables:
+                    self.connection.execute(sql)
+                # rows are copied within one transaction so they all come from the same version of the file
+                self.connection.execute("BEGIN;")
+                for name, sql in tables:
+                    self.connection.execute("INSERT INTO main.{0} SELECT * FROM snapshot.{0};".format(name))
+                if any(name == "sqlite_sequence" for kind, name, sql in objects):
+                    self.connection.execute("DELETE FROM main.sqlite_sequence;")
+                    self.connection.execute("INSERT INTO main.sqlite_sequence SELECT * FROM snapshot.sqlite_sequence;")
+                self.connection.commit()
+                # indices are built once the rows are in
+                for kind, name, sql in objects:
+                    if kind in ("index", "view", "trigger"):
+                        self.connection.execute(sql)
+                self.connection.commit()
+            finally:
+                self.connection.execute("DETACH DATABASE snapshot;")
+        self.knownPartitions = None
+        self.sessionRTree = None
+        print("[*] loaded '{0}' in {1:.2f}s".format(path, time.time() - started))
+
+
+    def mergeSegment(self, path, batchSize=65536):
+        """Loads a segment file written by writeSegment() on another node: its log families are saved and published one
+        at a time, as if they had been read here, without parsing anything again. The segment is read twice, so it is
+        never held in memory: the first pass checks its SHA-256 (a segment merged before is skipped) and finds the
+        partitions its events go to, the second streams the events of one family at a time into saveEvents(), batchSize
+        events at a time. Events already stored for the same host and log (i.e. by an earlier collection of the host)
+        are skipped, without looking them up when the file they were read from was stored before (same SHA-256).
+        @param: string - path of the segment file
+        @param: int - the number of events saved at a time
+        @return: int - the number of events merged"""
+        import gzip
+        import hashlib
+        import json
+        digest = hashlib.sha256()
+        header = end = None
+        families = []
+        names = set()
+        try:
+            with gzip.open(path, "rb") as segment:
+                monthStart = monthEnd = 0
+                for line in segment:
+                    if line.startswith("["):
+                        # events are in time order, the date/time is decoded once a month
+                        micros = int(line[1:line.index(",")])
+                        if not monthStart <= micros < monthEnd:
+                            eventDateTime = EventBuffer.EPOCH + datetime.timedelta(microseconds=micros)
+                            names.add(self.partitionName(str(eventDateTime)))
+                            first = datetime.datetime(eventDateTime.year, eventDateTime.month, 1)
+                            monthStart = EventBuffer.microseconds(first)
+                            monthEnd = EventBuffer.microseconds(datetime.datetime(first.year + first.month // 12, first.month % 12 + 1, 1))
+                    elif header is None:
+                        header = json.loads(line)["segment"]
+                    elif line.startswith('{"log"'):
+                        families.append(json.loads(line)["log"])
+                        monthStart = monthEnd = 0
+                    else:
+                        end = json.loads(line)["end"]
+                        break
+                    digest.update(line)
+        except Exception as e:
+            print("[!] could not read the segment '{0}': {1}".format(path, e))
+            return 0
+        if end is None or end["sha256"] != digest.hexdigest():
+            print("[!] the segment '{0}' is incomplete or damaged (SHA-256 mismatch), it was not merged".format(path))
+            return 0
+
+        hosts = sorted(set(log["host"] for log in families))
+        merged = [host for host, in self.connection.execute("SELECT host FROM SEGMENTS WHERE sha256 = ?;", (end["sha256"],))]
+        if hosts and set(hosts) <= set(merged):
+            print("[*] the segment '{0}' was merged before, skipped".format(path))
+            return 0
+
+        # creating a table commits, the partitions are created before the families are saved
+        if self.knownPartitions is None:
+            self.knownPartitions = set(self.partitions())
+        for name in sorted(names - self.knownPartitions):
+            self.createPartition(name)
+            self.knownPartitions.add(name)
+        self.beginIngest( hosts, len(families) )
+        c = skipped = 0
+        try:
+            with gzip.open(path, "rb") as segment:
+                segment.readline()
+                for log in families:
+                    segment.readline()
+                    # the logs stored before for the same host and log, and the digests of their files
+                    priorIDs = [logID for logID, in self.connection.execute("SELECT id FROM LOGS WHERE host = ? AND log_name = ?;",
+                                                                          (log["host"], log["log_name"]))]
+                    marks = ", ".join("?" * len(priorIDs))
+                    priorDigests = set(sha256 for sha256, in self.connection.execute(
+                                       "SELECT sha256 FROM SOURCEFILES WHERE fk_logid IN ({0});".format(marks), priorIDs)) if priorIDs else set()
+                    files = log.get("files", [])
+                    knownFiles = set(index for index, source in enumerate(files) if source is not None and
+                                     (source.get("digests") or {}).get("sha256") in priorDigests)
+
+                    parentID = self.createParentRecord( log["log_name"], log["log_file"], log["log_description"], log["host"], commit=False )
+                    sourceFileIDs = self.saveSourceFiles( [None if source is None else SourceFile.fromSegment(source) for source in files], parentID )
+                    if self.ruleEngine is not None:
+                        self.ruleEngine.startStream()
+                    saved = 0
+                    events = EventBuffer()
+                    for i in xrange(log["events"]):
+                        event = json.loads(segment.readline())
+                        description = event[1].encode("latin-1")
+                        # segments written before provenance was recorded have no file index and offset
+                        source = event[2:4] or None
+                        if priorIDs:
+                            if source is not None and source[0] in knownFiles:
+                                skipped += 1
+                                continue
+                            eventDateTime = str(EventBuffer.EPOCH + datetime.timedelta(microseconds=event[0]))[:19]
+                            if self.connection.execute("SELECT 1 FROM {0} WHERE fk_logid IN ({1}) AND event_datetime = ? ".format(self.partitionName(eventDateTime), marks) +\
+                                                       "AND DESCRIPTION(template_id, params, event_description) = ? LIMIT 1;",
+                                                       priorIDs + [eventDateTime, description]).fetchone() is not None:
+                                skipped += 1
+                                continue
+                        events.appendMicroseconds(None, event[0], description, source)
+                        if len(events) >= batchSize:
+                            saved += self.saveEvents( events, parentID, commit=False, sourceFileIDs=sourceFileIDs )
+                            events.clear()
+                    saved += self.saveEvents( events, parentID, commit=False, sourceFileIDs=sourceFileIDs )
+                    if log.get("sessions") is not None:
+                        sessions = self.newSessions( log["host"], [tuple(session) for session in log["sessions"]] )
+                        self.saveSessions( sessions, parentID, log["host"], commit=False )
+                    self.publishLog( parentID, saved )
+                    c += saved
+            self.cursor.executemany("INSERT INTO SEGMENTS (sha256, host, path, created, min_datetime, max_datetime, events, merged) " +\
+                                    "VALUES ( ?, ?, ?, ?, ?, ?, ?, ? );", [(end["sha256"], host, os.path.abspath(path), header["created"],
+                                    end["min_datetime"], end["max_datetime"], end["events"], str(datetime.datetime.now())[:19]) for host in hosts])
+            self.connection.commit()
+        except Exception as e:
+            self.connection.rollback()
+            self.miner = None
+            self.finishIngest( "failed" )
+            print("[!] could not merge the segment '{0}': {1}".format(path, e))
+            return c
+        self.finishIngest()
+        print("[*] merged {0:,} events of {1} logs of '{2}' from '{3}', skipped {4:,} events stored before".format(c, len(families),
+              ", ".join(hosts), path, skipped))
+        return c
+
+
+    def newSessions(self, host, sessions):
+        """Drops the login sessions of a host that are stored already (i.e. by an earlier collection of the host), a
+        stored session of a user still logged in is replaced by the same session once it ended, without committing
+        @param: string - the host/image ID
+        @param: list - (user, tty, remote host, start, end, status, boot) tuples
+        @return: list - the sessions to save"""
+        kept = []
+        for session in sessions:
+            user, tty, remoteHost, start, end = session[:5]
+            row = self.connection.execute("SELECT id, end_datetime FROM SESSIONS WHERE host = ? AND user IS ? AND tty IS ? AND start_datetime = ?;",
+                                          (host, user, tty, None if start is None else str(start)[:19])).fetchone()
+            if row is not None and row[1] is None and end is not None:
+                if self.sessionIndex():
+                    self.cursor.execute("DELETE FROM SESSIONS_RTREE WHERE id = ?;", (row[0],))
+                self.cursor.execute("DELETE FROM SESSIONS WHERE id = ?;", (row[0],))
+                row = None
+            if row is None:
+                kept.append(session)
+        return kept
+
+
+    def queryIngest(self):
+        """This method displays the progress of the ingestions, newest first"""
+        print("{0:>3}  {1:<20}  {2:<19}  {3:<19}  {4:>8}  {5:>12}  {6:>10}  {7}".format("ID", "Hosts", "Started", "Finished", "Families",
+                                                                                        "Events", "Generation", "Status"))
+        for ingestID, hosts, started, finished, total, done, events, generation, lastLog, status in \
+                self.connection.execute("SELECT id, hosts, started, finished, families_total, families_done, events, generation, last_log, status " +\
+                                        "FROM INGEST ORDER BY id DESC;"):
+            print("{0:>3}  {1:<20}  {2:<19}  {3:<19}  {4:>8}  {5:>12,}  {6:>10}  {7}".format(ingestID, hosts, started, finished or "-",
+                                                                                           "{0}/{1}".format(done, total), events, generation, status))
+            if status == "running" and lastLog:
+                print("     last published: '{0}'".format(lastLog))
+
+
+    def querySourceFiles(self, hosts=None):
+        """This method displays the files the logs were read from with their size, mtime, inode and digests, to be
+        checked against the evidence. Events link to their file (fk_sourcefileid) and its byte offset (source_offset)
+        @param: list - host/image IDs, optional"""
+        hostStr, params = self.hostFilter(hosts)
+        print("{0:>5}  {1:<15}  {2:>14}  {3:<19}  {4:>10}  {5}".format("LogID", "Host", "Size", "Modified", "Inode", "File"))
+        with self.snapshot():
+            rows = self.connection.execute("SELECT LOGS.id, LOGS.host, path, size, mtime, inode, sha256, md5 FROM SOURCEFILES " +\
+                                           "JOIN LOGS ON LOGS.id = SOURCEFILES.fk_logid WHERE 1 " + hostStr +\
+                                           "ORDER BY LOGS.id, SOURCEFILES.id;", params).fetchall()
+        for logID, host, path, size, mtime, inode, sha256, md5 in rows:
+            print("{0:>5}  {1:<15}  {2:>14,}  {3:<19}  {4:>10}  {5}".format(logID, host, size, str(datetime.datetime.fromtimestamp(int(mtime))),
+                                                                           inode, path))
+            # a file not read to the end (read error, or the parser stopped) has no digest
+            print("       sha256: {0}".format(sha256 or "- (not read to the end)"))
+            if md5:
+                print("       md5:    {0}".format(md5))
+
+
+    def createParentRecord(self, logName, logLocationAbsolutePath, logDescription, host="", commit=True):
         """This method adds a record to the LOGS table
+        @param: string - name of the log
         @param: string - absolute path including name of the log
-        @param: string - description of the log"""
+        @param: string - description of the log
+        @param: string - host/image ID the log was collected from
+        @param: bool - False to leave the record uncommitted until the log family is published, see publishLog()"""
         
         parentID = 0
         #find new key value for a new parent record
@@ -491,11 +2531,10 @@ class dbLogs(object):
         print("[*] new parent ID={0} for log: '{1}'".format(parentID, logLocationAbsolutePath))
         try:
             # add parent record
-            logDescription = logDescription.replace("'", "")
-            sql_statement = "INSERT INTO LOGS (id, log_name, log_file, log_description) VALUES ( {0}, '{1}', '{2}', '{3}');" \
-                            .format(parentID, logName, logLocationAbsolutePath, logDescription)
-            self.cursor.execute( sql_statement )
-            self.connection.commit()
+            self.cursor.execute( "INSERT INTO LOGS (id, log_name, log_file, log_description, host) VALUES ( ?, ?, ?, ?, ?);",
+                                 (parentID, logName, logLocationAbsolutePath, logDescription, host) )
+            if commit:
+                self.connection.commit()
         except Exception as e:
             pass
         finally:
@@ -505,69 +2544,1003 @@ class dbLogs(object):
 
 
     def saveEvent( self, parentID, eventTime, eventDescription ):
-        """This method adds add a record to the LOGS table
-        @param: string - absolute path including name of the log
-        @param: string - description of the log"""
+        """This method adds add a record to the LOGEVENTS table
+        @param: int - the id of the parent record in LOGS
+        @param: datetime - the date and time at which the log event occured
+        @param: string - description of the log event"""
+        self.saveEvents( [(parentID, eventTime, eventDescription)] )
+
+
+    def saveEvents( self, events, parentID=None, commit=True, sourceFileIDs=None ):
+        """This method adds every event of an iterable of (logID, eventDateTime, eventDescription) tuples to the LOGEVENTS
+        table in a single transaction. Events without a logID (i.e. coming from a reader that is being iterated) are
+        assigned to the given parent record, or the reader's parent record. The events of an EventBuffer are linked to
+        the source file and byte offset they were read from.
+        @param: iterable - the events to save, usually a LogReaderStdParser object
+        @param: int - the id of the parent record in LOGS for events without one, optional
+        @param: bool - False to leave the events uncommitted until the log family is published, see publishLog()
+        @param: dict - file index: SOURCEFILES id, as returned by saveSourceFiles(), optional
+        @return: int - the number of events saved"""
+        if parentID is None:
+            parentID = getattr(events, 'parentRecordID', None)
+        counter = [0]
+        sources = events.source if isinstance(events, EventBuffer) and sourceFileIDs else None
+
+        miner = self.templateMiner()
+        templateCounts = {}
+        ruleEngine = self.ruleEngine
+        # exact counts of the field values of every (log, hour), turned into sketches once all rows are in
+        fieldCounts = {}
+        # IDs of the entities seen, their postings are saved along with every batch of rows
+        entityIDs = {}
+
+        # (count, first error) of the events the saliency rules failed on
+        ruleErrors = [0, None]
+
+        def rows():
+            for i, (logID, eventDateTime, eventDescription) in enumerate(events):
+                try:
+                    sourceFileID = offset = None
+                    if sources is not None:
+                        fileIndex, offset = sources(i)
+                        sourceFileID = sourceFileIDs.get(fileIndex)
+                    # note: eventTime needs to be a string of this format: yyyy-MM-dd HH:mm:ss
+                    eventTime = str(eventDateTime)[:19]
+                    fields = FieldSketch.fields(eventDescription)
+                    entities = EntityExtractor.entities(eventDescription)
+                    # descriptions are stored as a template ID plus their parameters, the parse tree is changed last
+                    # so that it only learns from the rows that are kept
+                    templateID, params = miner.addMessage(eventDescription)
+                except Exception as e:
+                    continue
+                if any("\0" in param for param in params):
+                    # parameters containing NUL characters cannot be packed, keep the description as is
+                    row = (logID if logID is not None else parentID, eventTime, eventDescription, None, None, sourceFileID, offset)
+                else:
+                    row = (logID if logID is not None else parentID, eventTime, None, templateID, sqlite3.Binary("\0".join(params)),
+                           sourceFileID, offset)
+                    templateCounts[templateID] = templateCounts.get(templateID, 0) + 1
+                if fields:
+                    bucket = fieldCounts.setdefault((row[0], eventTime[:13]), {})
+                    for field, value in fields:
+                        counts = bucket.setdefault(field, {})
+                        counts[value] = counts.get(value, 0) + 1
+                if ruleEngine is not None and isinstance(eventDateTime, datetime.datetime):
+                    # a broken rule must not lose the event, it is reported once all rows are in
+                    try:
+                        host, logName = self.logHostAndName(row[0])
+                        ruleEngine.observe(host, logName, eventDateTime, eventDescription)
+                    except Exception as e:
+                        ruleErrors[0] += 1
+                        ruleErrors[1] = ruleErrors[1] or e
+                counter[0] += 1
+                yield row, entities
+
+        pending = {}
         try:
-            # add child record
-            # note: eventTime needs to be a string of this format: yyyy-MM-dd HH:mm:ss
-            # format string obtained from https://docs.python.org/2/library/datetime.html#strftime-and-strptime-behavior
-            eventDescription = eventDescription.replace("'", "")
-            sql_statement = "INSERT INTO LOGEVENTS (fk_logid, event_datetime, event_description) VALUES ( {0}, '{1}', '{2}');" \
-                            .format(parentID, eventTime.strftime("%Y-%m-%d %H:%M:%S"), eventDescription)
-            self.cursor.execute( sql_statement )
-            self.connection.commit()
+            # rows are routed to their monthly partition in batches, along with (position in the batch, entities)
+            for row, entities in rows():
+                name = self.partitionName(row[1])
+                if name not in pending:
+                    pending[name] = ([], [])
+                batch, batchEntities = pending[name]
+                if entities:
+                    batchEntities.append((len(batch), entities))
+                batch.append(row)
+                if len(batch) >= 10000:
+                    self.saveEntities(self.insertIntoPartition(name, batch), batch, batchEntities, entityIDs)
+                    del batch[:]
+                    del batchEntities[:]
+            for name, (batch, batchEntities) in pending.items():
+                self.saveEntities(self.insertIntoPartition(name, batch), batch, batchEntities, entityIDs)
+                # keep the partition catalog min/max date/time current, both are cheap lookups on the datetime index
+                self.cursor.execute("UPDATE PARTITIONS SET min_datetime = (SELECT MIN(event_datetime) FROM {0}), "
+                                    "max_datetime = (SELECT MAX(event_datetime) FROM {0}) WHERE name = ?;".format(name), (name,))
+            self.cursor.executemany("INSERT INTO TEMPLATES (id, cluster_id, template) VALUES ( ?, ?, ? );", miner.newTemplates)
+            del miner.newTemplates[:]
+            self.cursor.executemany("UPDATE TEMPLATES SET count = count + ? WHERE id = ?;",
+                                    [(count, templateID) for templateID, count in templateCounts.items()])
+            self.saveSketches(fieldCounts)
+            if ruleErrors[0]:
+                print("[!] the saliency rules failed on {0:,} events, which were saved without them: {1}".format(ruleErrors[0], ruleErrors[1]))
+            if ruleEngine is not None:
+                self.cursor.executemany("INSERT INTO ALERTS (rule, host, alert_key, log_name, event_datetime, event_description, details) " +\
+                                        "VALUES ( :rule, :host, :key, :log_name, :event_datetime, :event_description, :details );", ruleEngine.pendingAlerts)
+                del ruleEngine.pendingAlerts[:]
+            if commit:
+                self.connection.commit()
         except Exception as e:
+            self.connection.rollback()
+            # the parse tree may hold templates that were not stored, rebuild it from the database next time
+            self.miner = None
+            if not commit:
+                raise
+        return counter[0]
+
+
+    def saveSourceFiles( self, sourceFiles, parentID ):
+        """This method records the provenance of the files a log family was read from, without committing
+        @param: list - SourceFile objects by file index, None for the files that could not be opened
+        @param: int - the id of the parent record in LOGS
+        @return: dict - file index: SOURCEFILES id"""
+        sourceFileIDs = {}
+        for index, source in enumerate(sourceFiles or []):
+            if source is None:
+                continue
+            digests = source.digests or {}
+            self.cursor.execute("INSERT INTO SOURCEFILES (fk_logid, path, size, mtime, inode, sha256, md5) VALUES ( ?, ?, ?, ?, ?, ?, ? );",
+                                (parentID, source.path, source.size, source.mtime, source.inode, digests.get("sha256"), digests.get("md5")))
+            sourceFileIDs[index] = self.cursor.lastrowid
+        return sourceFileIDs
+
+
+    def saveEntities( self, firstID, batch, batchEntities, entityIDs ):
+        """This method adds the events of a batch just inserted into a partition to the posting lists of their entities,
+        creating the entities not seen before, without committing
+        @param: int - the id of the first event of the batch
+        @param: list - the (fk_logid, event_datetime, ...) rows of the batch
+        @param: list - (position in the batch, [(kind, value), ...]) of the events with entities
+        @param: dict - (kind, value): entity ID, filled as entities are looked up"""
+        postings = []
+        for position, entities in batchEntities:
+            logID, eventDateTime = batch[position][:2]
+            eventTime = self.epochSeconds(eventDateTime)
+            for key in entities:
+                entityID = entityIDs.get(key)
+                if entityID is None:
+                    found = self.connection.execute("SELECT id FROM ENTITIES WHERE value = ? AND kind = ?;", (key[1], key[0])).fetchone()
+                    if found is None:
+                        self.cursor.execute("INSERT INTO ENTITIES (kind, value) VALUES ( ?, ? );", key)
+                        entityID = self.cursor.lastrowid
+                    else:
+                        entityID = found[0]
+                    entityIDs[key] = entityID
+                postings.append((entityID, eventTime, firstID + position, logID))
+        # in key order, the B-tree pages of every posting list are written once per batch
+        postings.sort()
+        self.cursor.executemany("INSERT INTO POSTINGS (fk_entityid, event_time, event_id, fk_logid) VALUES ( ?, ?, ?, ? );", postings)
+
+
+    def deleteOrphanEntities( self ):
+        """This method deletes the entities left without postings once events are deleted, without committing"""
+        self.cursor.execute("DELETE FROM ENTITIES WHERE NOT EXISTS (SELECT 1 FROM POSTINGS WHERE fk_entityid = ENTITIES.id);")
+
+
+    def saveSketches( self, fieldCounts ):
+        """This method turns the exact counts of the field values of every log and hour into sketches and merges
+        them into the SKETCHES table, without committing
+        @param: dict - (LogID, 'YYYY-MM-DD HH'): {field: {value: count}}"""
+        for (logID, bucket), fields in fieldCounts.iteritems():
+            for field, counts in fields.iteritems():
+                sketch = FieldSketch.fromCounts(counts)
+                row = self.connection.execute("SELECT events, count_min, heavy_hitters, distinct_values FROM SKETCHES " +\
+                                              "WHERE field = ? AND bucket = ? AND fk_logid = ?;", (field, bucket, logID)).fetchone()
+                if row is not None:
+                    sketch.merge(FieldSketch.fromRow(*row))
+                self.cursor.execute("INSERT OR REPLACE INTO SKETCHES (fk_logid, bucket, field, events, count_min, heavy_hitters, distinct_values) " +\
+                                    "VALUES ( ?, ?, ?, ?, ?, ?, ? );", (logID, bucket, field) + sketch.row())
+
+
+    def summary( self, field, hosts=None, logIDs=None, startDateTime=None, endDateTime=None, top=20 ):
+        """This method displays the top values and the number of distinct values of a field (program, ip, user or
+        failed_user) by merging the hourly sketches of the logs selected, with the error bounds of the estimates.
+        Times are rounded to the hour.
+        @param: string - the field, see FieldSketch.FIELDS
+        @param: list - host/image IDs, optional
+        @param: list - LogIDs, optional
+        @param: datetime - Start date/time, optional
+        @param: datetime - End date/time, optional
+        @param: int - number of top values"""
+        hostStr, params = self.hostFilter(hosts)
+        queryStr = "SELECT S.events, S.count_min, S.heavy_hitters, S.distinct_values FROM SKETCHES S, LOGS " +\
+                   "WHERE LOGS.id = S.fk_logid AND S.field = ? " + hostStr
+        params = [field] + params
+        if logIDs:
+            queryStr += "AND S.fk_logid IN ({0}) ".format(", ".join("?" * len(logIDs)))
+            params += list(logIDs)
+        if startDateTime is not None:
+            queryStr += "AND S.bucket >= ? "
+            params.append(str(startDateTime)[:13])
+        if endDateTime is not None:
+            queryStr += "AND S.bucket <= ? "
+            params.append(str(endDateTime)[:13])
+        mergeQueryStr = queryStr.replace("S.events, S.count_min, S.heavy_hitters, S.distinct_values", "S.events, S.heavy_hitters, S.distinct_values")
+        with self.snapshot():
+            # first pass: merge the heavy hitters summaries, wider than an hour's, and the distinct counters
+            events = buckets = 0
+            heavyHitters = SpaceSaving(max(32, 4 * top))
+            distinct = HyperLogLog()
+            for bucketEvents, bucketHeavyHitters, bucketDistinct in self.connection.execute(mergeQueryStr + ";", params):
+                events += bucketEvents
+                buckets += 1
+                heavyHitters.merge(SpaceSaving.deserialize(bucketHeavyHitters))
+                distinct.merge(HyperLogLog.deserialize(bucketDistinct))
+            if not buckets:
+                print("[*] no events with a '{0}' field".format(field))
+                return
+            # second pass: bound the count of every candidate hour by hour, exact in the hours that listed it
+            candidates = dict((value, [0, 0]) for value, low, high in heavyHitters.top(4 * top))
+            size = 0
+            for row in self.connection.execute(queryStr + ";", params):
+                sketch = FieldSketch.fromRow(*row)
+                size += len(row[1]) + len(row[2]) + len(row[3])
+                for value, bounds in candidates.iteritems():
+                    low, high = sketch.bounds(value)
+                    bounds[0] += low
+                    bounds[1] += high
+        ranked = sorted(candidates.items(), key=lambda item: (-item[1][1], -item[1][0], item[0]))[:top]
+        print("[*] '{0}' of {1:,} events, merged from {2:,} hourly sketches ({3:,} KB)".format(field, events, buckets, size // 1024))
+        print("    distinct values: ~{0:,.0f} (+/- {1:.1%} at 95% confidence)".format(distinct.estimate(), 2 * distinct.standardError()))
+        print("    {0:>12}  {1:>25}  {2}".format("count", "bounds", field))
+        for value, (low, high) in ranked:
+            print("    {0:>12,}  {1:>25}  {2}".format(high, "[{0:,} .. {1:,}]".format(low, high), value))
+        print("    true counts lie within the bounds: exact in the hours where a value was among the 32 most frequent, " +\
+              "else at most the count-min estimate (at most e/512 of the hour's events above)")
+        print("    a value counted more than {0:,} times is never missed".format(heavyHitters.floor))
+
+
+    def createPartitionsFor( self, events ):
+        """Creates the partitions a batch of events is routed to before the batch is saved: creating a table commits the
+        pending transaction, which must not happen halfway through the transaction a log family is saved in
+        @param: EventBuffer - the events, sorted (see EventBuffer.dedupe()), or a list of (logID, eventDateTime, eventDescription) tuples"""
+        import bisect
+        names = []
+        if isinstance(events, EventBuffer):
+            # jump from month to month with a binary search of the first event of the next month
+            i = 0
+            while i < len(events):
+                eventDateTime = events[i][1]
+                names.append(self.partitionName(str(eventDateTime)))
+                nextMonth = datetime.datetime(eventDateTime.year + eventDateTime.month // 12, eventDateTime.month % 12 + 1, 1)
+                i = bisect.bisect_left(events.micros, EventBuffer.microseconds(nextMonth), i + 1)
+        elif isinstance(events, list):
+            names = set(self.partitionName(str(event[1])) for event in events)
+        if self.knownPartitions is None:
+            self.knownPartitions = set(self.partitions())
+        for name in names:
+            if name not in self.knownPartitions:
+                self.createPartition(name)
+                self.knownPartitions.add(name)
+
+
+    def insertIntoPartition( self, name, rows ):
+        """This method inserts (fk_logid, event_datetime, event_description, template_id, params, fk_sourcefileid, source_offset)
+        rows into a partition, creating it if needed
+        @param: string - partition name of the form 'LOGEVENTS_YYYYMM'
+        @param: list - the rows to insert
+        @return: int - the id of the first row, the others follow in order (AUTOINCREMENT, one writer)"""
+        if self.knownPartitions is None:
+            self.knownPartitions = set(self.partitions())
+        if name not in self.knownPartitions:
+            self.createPartition(name)
+            self.knownPartitions.add(name)
+        firstID = self.connection.execute("SELECT seq FROM sqlite_sequence WHERE name = ?;", (name,)).fetchone()[0] + 1
+        self.cursor.executemany( ("INSERT INTO {0} (fk_logid, event_datetime, event_description, template_id, params, fk_sourcefileid, source_offset) " +\
+                                  "VALUES ( ?, ?, ?, ?, ?, ?, ?);").format(name), rows )
+        return firstID
+
+
+    def logHostAndName( self, logID ):
+        """Returns the host/image ID and the name of a log, cached
+        @param: int - the LogID
+        @return: tuple - (host, log name)"""
+        if logID not in self.logInfo:
+            self.logInfo[logID] = self.connection.execute("SELECT host, log_name FROM LOGS WHERE id = ?;", (logID,)).fetchone() or ("", "")
+        return self.logInfo[logID]
+
+
+    def queryAlerts( self, hosts=None ):
+        """This method displays the alerts raised by the saliency rules at ingest time, in time order
+        @param: list - host/image IDs, optional"""
+        queryStr = "SELECT rule, host, alert_key, log_name, event_datetime, event_description, details FROM ALERTS "
+        params = []
+        if hosts:
+            queryStr += "WHERE host IN ({0}) ".format(", ".join("?" * len(hosts)))
+            params = list(hosts)
+        for rule, host, key, logName, eventDateTime, eventDescription, details in self.connection.execute(queryStr + "ORDER BY event_datetime, id;", params):
+            print("{0}  {1:<15}  {2:<40}  {3:<15}  {4:<20}  {5}  {6}".format(eventDateTime, host, rule, key, logName, eventDescription, details))
+
+
+    def templateMiner( self ):
+        """Returns the template miner used at ingest time, its parse tree is rebuilt from the TEMPLATES table the first time"""
+        if self.miner is None:
+            self.miner = TemplateMiner()
+            self.miner.loadTemplates( self.connection.execute("SELECT id, cluster_id, template FROM TEMPLATES ORDER BY id;") )
+        return self.miner
+
+
+    def description( self, templateID, params, eventDescription ):
+        """Implementation of the DESCRIPTION() SQL function: returns the description of an event, rebuilding it from its
+        template and parameters when it was stored that way
+        @param: int - the template ID, None for descriptions stored as is
+        @param: buffer - the parameters separated by NUL characters
+        @param: string - the description stored as is
+        @return: string - the event description"""
+        if templateID is None:
+            return eventDescription
+        template = self.templates.get(templateID)
+        if template is None:
+            row = self.connection.execute("SELECT template FROM TEMPLATES WHERE id = ?;", (templateID,)).fetchone()
+            if row is None:
+                return eventDescription
+            template = self.templates[templateID] = row[0]
+        return TemplateMiner.render(template, str(params).split("\0"))
+
+
+    def regexp( self, pattern, value ):
+        """Implementation of the REGEXP SQL function: True when the regular expression is found in the value
+        @param: string - the regular expression
+        @param: string - the value, i.e. an event description
+        @return: bool"""
+        compiled = self.patterns.get(pattern)
+        if compiled is None:
+            compiled = self.patterns[pattern] = re.compile(pattern)
+        return value is not None and compiled.search(value) is not None
+
+
+    def refreshTemplateCounts( self ):
+        """Recounts the events of every template after events were removed"""
+        counts = {}
+        for name in self.partitions():
+            for templateID, count in self.connection.execute("SELECT template_id, COUNT(*) FROM {0} WHERE template_id IS NOT NULL GROUP BY template_id;".format(name)):
+                counts[templateID] = counts.get(templateID, 0) + count
+        self.cursor.execute("UPDATE TEMPLATES SET count = 0;")
+        self.cursor.executemany("UPDATE TEMPLATES SET count = ? WHERE id = ?;", [(count, templateID) for templateID, count in counts.items()])
+        self.connection.commit()
+
+
+    def templateCounts( self, hosts=None ):
+        """Groups events by template: returns the number of events of every template cluster along with its newest template.
+        Without host filter the counts maintained at ingest time are used, otherwise events are grouped by their integer
+        template ID in every partition.
+        @param: list - host/image IDs, optional
+        @return: list - (count, cluster ID, template) tuples, most frequent first"""
+        if not hosts:
+            counts = self.connection.execute("SELECT id, count FROM TEMPLATES;").fetchall()
+        else:
+            hostStr, hostParams = self.hostFilter(hosts)
+            counts = []
+            for name in self.partitions():
+                counts += self.connection.execute("SELECT E.template_id, COUNT(*) FROM {0} E, LOGS WHERE LOGS.id = E.fk_logid ".format(name) +\
+                                                  "AND E.template_id IS NOT NULL " + hostStr + "GROUP BY E.template_id;", hostParams).fetchall()
+        clusters = {}
+        newest = {}
+        for templateID, clusterID, template in self.connection.execute("SELECT id, cluster_id, template FROM TEMPLATES ORDER BY id;"):
+            newest[clusterID] = template
+            clusters[templateID] = clusterID
+        totals = {}
+        for templateID, count in counts:
+            clusterID = clusters[templateID]
+            totals[clusterID] = totals.get(clusterID, 0) + count
+        return sorted([(count, clusterID, newest[clusterID]) for clusterID, count in totals.items() if count > 0], reverse=True)
+
+
+    def queryTemplates( self, hosts=None, limit=50 ):
+        """This method displays the most frequent message templates and how many events each one has
+        @param: list - host/image IDs, optional
+        @param: int - maximum number of templates to display"""
+        for count, clusterID, template in self.templateCounts(hosts)[:limit]:
+            print("{0:>10,}  {1:>6}  {2}".format(count, clusterID, template))
+
+
+    def queryRareTemplates( self, maxCount, hosts=None ):
+        """This method displays the rare message templates, seen at most maxCount times, along with all their events.
+        Rare templates are a quick way to spot anomalies among thousands of routine messages.
+        @param: int - maximum number of events of a template for it to be displayed
+        @param: list - host/image IDs, optional"""
+        rare = [(clusterID, template) for count, clusterID, template in self.templateCounts(hosts) if count <= maxCount]
+        rare.reverse()
+        hostStr, hostParams = self.hostFilter(hosts)
+        for clusterID, template in rare:
+            templateIDs = [templateID for templateID, in self.connection.execute("SELECT id FROM TEMPLATES WHERE cluster_id = ?;", (clusterID,))]
+            marks = ", ".join("?" * len(templateIDs))
+            print("[*] template {0}: {1}".format(clusterID, template))
+            queryStr = "SELECT E.event_datetime, E.id, LOGS.id, LOGS.host, LOGS.log_name, DESCRIPTION(E.template_id, E.params, E.event_description) " +\
+                       "FROM LOGS, {0} E WHERE LOGS.id = E.fk_logid AND " +\
+                       "E.template_id IN (" + marks + ") " + hostStr + "ORDER BY E.event_datetime, E.id;"
+            rows = self.fanOut( self.partitions(), queryStr, templateIDs + hostParams )
+            for eventDateTime, eventID, logID, host, logName, eventDescription in rows:
+                print("{0:>3}  {1:<15}  {2:<20}  {3}    {4}".format(logID, host, logName, eventDateTime, eventDescription))
+
+
+    def hostFilter( self, hosts ):
+        """Returns the SQL condition (and its parameters) that restricts a query joined with LOGS to the given hosts
+        @param: list - host/image IDs, None or empty for all hosts
+        @return: tuple - (string, list)"""
+        if not hosts:
+            return "", []
+        return "AND LOGS.host IN ({0}) ".format(", ".join("?" * len(hosts))), list(hosts)
+
+
+    def deleteHost( self, host ):
+        """This method removes every log and event previously ingested for one host/image so that it can be re-read
+        @param: string - the host/image ID"""
+        logIDs = [logID for logID, in self.connection.execute("SELECT id FROM LOGS WHERE host = ?;", (host,))]
+        if not logIDs:
+            return
+        print("[*] removing {0} previously ingested logs of host '{1}'".format(len(logIDs), host))
+        marks = ", ".join("?" * len(logIDs))
+        for name in self.partitions():
+            self.cursor.execute("DELETE FROM {0} WHERE fk_logid IN ({1});".format(name, marks), logIDs)
+        self.cursor.execute("DELETE FROM LOGS WHERE host = ?;", (host,))
+        self.cursor.execute("DELETE FROM ALERTS WHERE host = ?;", (host,))
+        if self.sessionIndex():
+            self.cursor.execute("DELETE FROM SESSIONS_RTREE WHERE id IN (SELECT id FROM SESSIONS WHERE host = ?);", (host,))
+        self.cursor.execute("DELETE FROM SESSIONS WHERE host = ?;", (host,))
+        self.cursor.execute("DELETE FROM SKETCHES WHERE fk_logid IN ({0});".format(marks), logIDs)
+        self.cursor.execute("DELETE FROM POSTINGS WHERE fk_logid IN ({0});".format(marks), logIDs)
+        self.deleteOrphanEntities()
+        self.cursor.execute("DELETE FROM SOURCEFILES WHERE fk_logid IN ({0});".format(marks), logIDs)
+        try:
+            # a segment of the host can be merged again
+            self.cursor.execute("DELETE FROM SEGMENTS WHERE host = ?;", (host,))
+        except sqlite3.OperationalError as e:
             pass
+        self.connection.commit()
+        self.logInfo = {}
+        self.refreshTemplateCounts()
+
+
+    # end of the sessions of users still logged in
+    STILL_LOGGED_IN = "9999-12-31 23:59:59"
+
+    def sessionIndex( self ):
+        """Returns True when the sessions are indexed by the SESSIONS_RTREE R*Tree, False when the R*Tree module is not
+        available and the max_end augmentation of the start_datetime index is used instead"""
+        if self.sessionRTree is None:
+            self.sessionRTree = self.connection.execute("SELECT 1 FROM sqlite_master WHERE name='SESSIONS_RTREE';").fetchone() is not None
+        return self.sessionRTree
+
+
+    # seconds since the epoch of the days converted by epochSeconds()
+    epochDays = {}
+
+    @staticmethod
+    def epochSeconds( dateTimeStr ):
+        """Converts a 'YYYY-MM-DD hh:mm:ss' string to seconds since 1970-01-01 00:00:00, the R*Tree and postings
+        coordinates. The day is converted once"""
+        import calendar
+        dateTimeStr = str(dateTimeStr)
+        day = dbLogs.epochDays.get(dateTimeStr[:10])
+        if day is None:
+            day = dbLogs.epochDays[dateTimeStr[:10]] = calendar.timegm(time.strptime(dateTimeStr[:10], "%Y-%m-%d"))
+        return day + int(dateTimeStr[11:13]) * 3600 + int(dateTimeStr[14:16]) * 60 + int(dateTimeStr[17:19])
+
+
+    def saveSessions( self, sessions, parentID, host="", commit=True ):
+        """This method adds login sessions to the SESSIONS table and its interval index in a single transaction
+        @param: list - (user, tty, remote host, start, end, status, boot) tuples, end is None for users still logged in
+        @param: int - the id of the parent record in LOGS
+        @param: string - the host/image ID
+        @param: bool - False to leave the sessions uncommitted until the log family is published, see publishLog()
+        @return: int - the number of sessions saved"""
+        def dt(value):
+            return None if value is None else str(value)[:19]
+        c = 0
+        try:
+            for user, tty, remoteHost, start, end, status, boot in sessions:
+                self.cursor.execute("INSERT INTO SESSIONS (fk_logid, host, user, tty, remote_host, start_datetime, end_datetime, status, boot_datetime) " +\
+                                    "VALUES ( ?, ?, ?, ?, ?, ?, ?, ?, ? );", (parentID, host, user, tty, remoteHost, dt(start), dt(end), status, dt(boot)))
+                if self.sessionIndex():
+                    # float coordinates are rounded outwards by the R*Tree, querySessions() refines the candidates
+                    self.cursor.execute("INSERT INTO SESSIONS_RTREE VALUES ( ?, ?, ? );",
+                                        (self.cursor.lastrowid, self.epochSeconds(start), self.epochSeconds(dt(end) or self.STILL_LOGGED_IN)))
+                c += 1
+            if not self.sessionIndex():
+                self.updateSessionsMaxEnd()
+            if commit:
+                self.connection.commit()
+        except Exception as e:
+            self.connection.rollback()
+            print("[!] could not save the login sessions: {0}".format(e))
+            if not commit:
+                raise
+            c = 0
+        return c
+
+
+    def updateSessionsMaxEnd( self ):
+        """Recomputes the max_end column (the latest end of all sessions starting before or with a session). It grows
+        with start_datetime, so the sessions overlapping a window start between the first one whose max_end reaches the
+        window and the end of the window. Only used when the R*Tree module is not available."""
+        maxEnd = ""
+        updates = []
+        for sessionID, end, currentMaxEnd in self.connection.execute("SELECT id, COALESCE(end_datetime, ?), max_end FROM SESSIONS " +\
+                                                                     "ORDER BY start_datetime, id;", (self.STILL_LOGGED_IN,)):
+            maxEnd = max(maxEnd, end)
+            if currentMaxEnd != maxEnd:
+                updates.append((maxEnd, sessionID))
+        self.cursor.executemany("UPDATE SESSIONS SET max_end = ? WHERE id = ?;", updates)
+
+
+    def querySessions( self, startDateTime, endDateTime, hosts=None ):
+        """This method displays the login sessions that overlap the given window (a stabbing query when start and end are
+        the same date/time), that is the users logged in at some point of the window
+        @param: datetime - Start date/time of the window
+        @param: datetime - End date/time of the window
+        @param: list - host/image IDs, optional"""
+        start, end = str(startDateTime)[:19], str(endDateTime)[:19]
+        queryStr = "SELECT S.host, S.user, S.tty, S.remote_host, S.start_datetime, S.end_datetime, S.status FROM SESSIONS S "
+        if self.sessionIndex():
+            queryStr += "WHERE S.id IN (SELECT id FROM SESSIONS_RTREE WHERE start_time <= ? AND end_time >= ?) "
+            params = [self.epochSeconds(end), self.epochSeconds(start)]
+        else:
+            lowest = self.connection.execute("SELECT start_datetime FROM SESSIONS WHERE max_end >= ? ORDER BY max_end, start_datetime LIMIT 1;",
+                                             (start,)).fetchone()
+            if lowest is None:
+                return
+            queryStr += "WHERE S.start_datetime >= ? "
+            params = [lowest[0]]
+        queryStr += "AND S.start_datetime <= ? AND COALESCE(S.end_datetime, ?) >= ? "
+        params += [end, self.STILL_LOGGED_IN, start]
+        if hosts:
+            queryStr += "AND S.host IN ({0}) ".format(", ".join("?" * len(hosts)))
+            params += list(hosts)
+        rows = self.connection.execute(queryStr + "ORDER BY S.start_datetime, S.id;", params).fetchall()
+        if rows:
+            print("[*] {0} login sessions overlap the window".format(len(rows)))
+        for host, user, tty, remoteHost, sessionStart, sessionEnd, status in rows:
+            print("     {0:<15}  {1:<8} {2:<12} {3:<16} {4} - {5}  ({6})".format(host, user, tty, remoteHost, sessionStart, sessionEnd or "", status))
+
+
+    def fileIndex( self, path ):
+        """Returns the zone map of a raw log file if it was indexed and did not change since
+        @param: string - path of the file
+        @return: tuple - (id, min date/time, max date/time), None if there is no up to date index"""
+        stat = os.stat(path)
+        row = self.connection.execute("SELECT id, size, mtime, min_datetime, max_datetime FROM FILEINDEX WHERE path = ?;", (path,)).fetchone()
+        if row is None or row[1] != stat.st_size or row[2] != stat.st_mtime:
+            return None
+        return row[0], row[3], row[4]
+
+
+    def saveFileIndex( self, path, minDateTime, maxDateTime, points=() ):
+        """Saves the zone map and the sparse index of a raw log file, replacing the previous ones
+        @param: string - path of the file
+        @param: datetime - the earliest event of the file
+        @param: datetime - the latest event of the file
+        @param: list - (offset, datetime) tuples, the offset of a line and its date/time"""
+        stat = os.stat(path)
+        try:
+            row = self.connection.execute("SELECT id FROM FILEINDEX WHERE path = ?;", (path,)).fetchone()
+            if row is not None:
+                self.cursor.execute("DELETE FROM FILEINDEX_POINTS WHERE fk_fileid = ?;", row)
+                self.cursor.execute("DELETE FROM FILEINDEX WHERE id = ?;", row)
+            self.cursor.execute("INSERT INTO FILEINDEX (path, size, mtime, min_datetime, max_datetime) VALUES ( ?, ?, ?, ?, ? );",
+                                (path, stat.st_size, stat.st_mtime, None if minDateTime is None else str(minDateTime)[:19],
+                                 None if maxDateTime is None else str(maxDateTime)[:19]))
+            fileID = self.cursor.lastrowid
+            self.cursor.executemany("INSERT INTO FILEINDEX_POINTS (fk_fileid, offset, event_datetime) VALUES ( ?, ?, ? );",
+                                    [(fileID, offset, str(eventDateTime)[:19]) for offset, eventDateTime in points])
+            self.connection.commit()
+        except Exception as e:
+            self.connection.rollback()
+
+
+    def fileIndexOffset( self, fileID, startDateTime ):
+        """Returns the offset of the last indexed line of a raw log file that is before the given date/time, 0 if none"""
+        row = self.connection.execute("SELECT MAX(offset) FROM FILEINDEX_POINTS WHERE fk_fileid = ? AND event_datetime < ?;",
+                                      (fileID, str(startDateTime)[:19])).fetchone()
+        return row[0] or 0
+
+
+    def exportColumns( self, directory, hosts=None, batchSize=65536 ):
+        """This method exports the events (of all hosts, or the given ones) in time order as columns: event_time (seconds
+        since 1970-01-01 of the event date/time, int64), log_id, host_id and program_id (int32) and the description.
+        Host and program IDs index the lists saved in hosts.json and programs.json, logs.json describes the logs.
+        The columns are written to events.parquet when pyarrow is installed (events.arrow, Arrow IPC, if it has no
+        Parquet support), otherwise to one .npy file per column, the descriptions as description_data.npy (the bytes
+        of all descriptions) and description_offsets.npy (where every description starts, plus the end).
+        @param: string - the output directory, created if needed
+        @param: list - host/image IDs, optional
+        @param: int - rows per Parquet/Arrow record batch
+        @return: int - the number of events exported"""
+        import json
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        hostStr, hostParams = self.hostFilter(hosts)
+        logs = self.connection.execute("SELECT id, host, log_name, log_file FROM LOGS WHERE 1 = 1 " + hostStr + "ORDER BY id;", hostParams).fetchall()
+        hostIDs = {}
+        for logID, host, logName, logFile in logs:
+            hostIDs.setdefault(host, len(hostIDs))
+        logHostIDs = dict((logID, hostIDs[host]) for logID, host, logName, logFile in logs)
+        programIDs = {}
+
+        queryStr = "SELECT E.event_datetime, E.id, E.fk_logid, DESCRIPTION(E.template_id, E.params, E.event_description) " +\
+                   "FROM LOGS, {0} E WHERE LOGS.id = E.fk_logid " + hostStr + "ORDER BY E.event_datetime, E.id;"
+        rows = self.fanOut( self.partitions(), queryStr, hostParams )
+
+        def columns():
+            for eventDateTime, eventID, logID, eventDescription in rows:
+                program = descriptionProgram(eventDescription) or ""
+                yield (self.epochSeconds(eventDateTime), logID, logHostIDs[logID], programIDs.setdefault(program, len(programIDs)),
+                       eventDescription)
+
+        try:
+            import pyarrow
+            c = self.exportArrow(directory, columns(), batchSize)
+        except ImportError:
+            c = self.exportNpy(directory, columns())
+
+        with open(os.path.join(directory, "logs.json"), "w") as file_object:
+            json.dump([{"id": logID, "host": host, "log_name": logName, "log_file": logFile} for logID, host, logName, logFile in logs], file_object, indent=1)
+        for name, ids in (("hosts.json", hostIDs), ("programs.json", programIDs)):
+            with open(os.path.join(directory, name), "w") as file_object:
+                json.dump(sorted(ids, key=ids.get), file_object, indent=1)
+        return c
+
+
+    def exportArrow( self, directory, rows, batchSize ):
+        """Writes the columns of exportColumns() to events.parquet, or events.arrow when pyarrow has no Parquet support"""
+        import pyarrow
+        schema = pyarrow.schema([("event_time", pyarrow.int64()), ("log_id", pyarrow.int32()), ("host_id", pyarrow.int32()),
+                                 ("program_id", pyarrow.int32()), ("description", pyarrow.binary())])
+        try:
+            import pyarrow.parquet
+            writer = pyarrow.parquet.ParquetWriter(os.path.join(directory, "events.parquet"), schema)
+            writeBatch = lambda batch: writer.write_table(pyarrow.Table.from_batches([batch]))
+        except ImportError:
+            writer = pyarrow.RecordBatchFileWriter(os.path.join(directory, "events.arrow"), schema)
+            writeBatch = writer.write_batch
+        c = 0
+        try:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == batchSize:
+                    writeBatch(pyarrow.RecordBatch.from_arrays([pyarrow.array(column, type=field.type) for column, field in zip(zip(*batch), schema)], schema.names))
+                    c += len(batch)
+                    batch = []
+            if batch:
+                writeBatch(pyarrow.RecordBatch.from_arrays([pyarrow.array(column, type=field.type) for column, field in zip(zip(*batch), schema)], schema.names))
+                c += len(batch)
         finally:
-            pass
+            writer.close()
+        return c
 
 
-    def displayLogContents( self, logID):
+    def exportNpy( self, directory, rows ):
+        """Writes the columns of exportColumns() to one .npy file per column"""
+        writers = [NpyWriter(os.path.join(directory, name + ".npy"), typecode) for name, typecode in
+                   (("event_time", NpyWriter.INT64), ("log_id", "i"), ("host_id", "i"), ("program_id", "i"),
+                    ("description_offsets", NpyWriter.INT64), ("description_data", "B"))]
+        eventTimes, logIDs, hostIDs, programIDs, offsets, data = writers
+        c = offset = 0
+        try:
+            for eventTime, logID, hostID, programID, eventDescription in rows:
+                eventTimes.append(eventTime)
+                logIDs.append(logID)
+                hostIDs.append(hostID)
+                programIDs.append(programID)
+                offsets.append(offset)
+                data.write(eventDescription)
+                offset += len(eventDescription)
+                c += 1
+            offsets.append(offset)
+        finally:
+            for writer in writers:
+                writer.close()
+        return c
+
+
+    def displayLogContents( self, logID, hosts=None):
         """This method displays every record in LOGEVENTS associated with a log file 
-        @param: string - THe LogID associated with all the events you want to see"""
-        self.cursor.execute("SELECT id, event_datetime, event_description FROM LOGEVENTS WHERE fk_logid=={0} ORDER BY event_datetime;".format(logID))
-        rows = self.cursor.fetchall()
-        for eventID, eventDateTime, eventDescription in rows:
+        @param: string - THe LogID associated with all the events you want to see
+        @param: list - host/image IDs the log must belong to, optional"""
+        hostStr, hostParams = self.hostFilter(hosts)
+        rows = self.fanOut( self.partitions(),
+                            "SELECT E.event_datetime, E.id, DESCRIPTION(E.template_id, E.params, E.event_description) FROM {0} E, LOGS WHERE LOGS.id = E.fk_logid AND " +\
+                            "E.fk_logid = ? " + hostStr + "ORDER BY E.event_datetime, E.id;", [logID] + hostParams)
+        for eventDateTime, eventID, eventDescription in rows:
             print(eventID, eventDateTime, eventDescription)
         
 
 
     def listLogIDs( self ):
-        """This method displays all LogIDs only and associated names stored in the 'LinuxLogs.py'"""
-        self.cursor.execute("SELECT id, log_file FROM LOGS ORDER BY id;")
+        """This method displays all LogIDs only and associated names (and hosts) stored in the 'LinuxLogs.py'"""
+        self.cursor.execute("SELECT id, log_file, host FROM LOGS ORDER BY id;")
         rows = self.cursor.fetchall()
-        for logID, logName in rows:
-            print(logID, logName)        
+        for logID, logName, host in rows:
+            print(logID, logName, host)        
 
 
-    def queryEventsDateTimeWindow( self, startDateTime, endDateTime):
-        """This method displays every event accross all Logs that are within the given start and end dates (inclusive)
-        @param: datetime - Start date/time of the window you wish events be displayed
-        @param: datetime - End date/time of the window you wish events be displayed"""
-        queryStr = "SELECT LOGS.id, LOGS.log_name, LOGEVENTS.event_datetime, LOGEVENTS.event_description " +\
-                   "FROM LOGS, LOGEVENTS WHERE LOGS.id = LOGEVENTS.fk_logid AND " 
-        queryStr = queryStr + "LOGEVENTS.event_datetime >= Datetime('{0}') AND LOGEVENTS.event_datetime <= Datetime('{1}') ".format(startDateTime, endDateTime)
-        queryStr = queryStr + "ORDER BY LOGEVENTS.event_datetime;"
-        self.cursor.execute( queryStr )
-        rows = self.cursor.fetchall()
-        for logID, logName, eventDateTime, eventDescription in rows:
-            print("{0:>3}  {1:<20}  {2}    {3}".format(logID, logName, eventDateTime, eventDescription))
+    def listHosts( self ):
+        """This method returns the host/image IDs stored in the database
+        @return: list - host/image IDs"""
+        return [host for host, in self.connection.execute("SELECT DISTINCT host FROM LOGS ORDER BY host;")]
 
 
-    def queryEventsSalientStr( self, stringMatch ):
+    def queryEventsDateTimeWindow( self, startDateTime, endDateTime, hosts=None):
+        """This method displays every event accross all Logs (of all hosts, or the given ones) that are within the given start
+        and end dates (inclusive) merged in time order. Only the partitions whose min/max date/time overlap the window are searched.
+        @param: datetime - Start date/time of the window you wish events be displayed
+        @param: datetime - End date/time of the window you wish events be displayed
+        @param: list - host/image IDs, optional"""
+        hostStr, hostParams = self.hostFilter(hosts)
+        queryStr = "SELECT E.event_datetime, E.id, LOGS.id, LOGS.host, LOGS.log_name, DESCRIPTION(E.template_id, E.params, E.event_description) " +\
+                   "FROM LOGS, {0} E WHERE LOGS.id = E.fk_logid AND " 
+        queryStr = queryStr + "E.event_datetime >= ? AND E.event_datetime <= ? " + hostStr
+        queryStr = queryStr + "ORDER BY E.event_datetime, E.id;"
+        # the events and the sessions are read from the same snapshot
+        with self.snapshot():
+            rows = self.fanOut( self.partitions(startDateTime, endDateTime), queryStr, [str(startDateTime), str(endDateTime)] + hostParams )
+            for eventDateTime, eventID, logID, host, logName, eventDescription in rows:
+                print("{0:>3}  {1:<15}  {2:<20}  {3}    {4}".format(logID, host, logName, eventDateTime, eventDescription))
+            self.querySessions( startDateTime, endDateTime, hosts )
+
+
+    def regexScanTasks( self, pattern, hosts=None, logIDs=None, startDateTime=None, endDateTime=None, chunkSize=250000 ):
+        """Splits a regular expression search into id ranges of at most chunkSize events of the partitions that may hold
+        events of the given time window, see scanEventRange(). Every range is bound to the log families published when the
+        search started, so processes reading while logs are being ingested all search the same snapshot
+        @return: list - (database path, partition, first id, last id, pattern, hosts, logIDs, start, end, generation) tuples"""
+        tasks = []
+        start = None if startDateTime is None else str(startDateTime)[:19]
+        end = None if endDateTime is None else str(endDateTime)[:19]
+        with self.snapshot():
+            generation = self.publishedGeneration()
+            for name in self.partitions(startDateTime, endDateTime):
+                lowID, highID = self.connection.execute("SELECT MIN(id), MAX(id) FROM {0};".format(name)).fetchone()
+                if lowID is None:
+                    continue
+                for first in xrange(lowID, highID + 1, chunkSize):
+                    tasks.append((self.path, name, first, min(first + chunkSize - 1, highID), pattern, hosts, logIDs, start, end, generation))
+        return tasks
+
+
+    def queryEventsRegex( self, pattern, hosts=None, logIDs=None, startDateTime=None, endDateTime=None, processes=None, context=0 ):
+        """Searches the database for all events whose description matches a regular expression. The host, log and time
+        filters are applied before the regular expression, the scan is split into id ranges searched in parallel by a
+        pool of processes (each with its own read connection) and the matches are merged in time order.
+        @param: string - a regular expression (Python syntax), i.e. 'Accepted (password|publickey) for \w+ from 10\.'
+        @param: list - host/image IDs, optional
+        @param: list - LogIDs, optional
+        @param: datetime - Start date/time, optional
+        @param: datetime - End date/time, optional
+        @param: int - number of processes, the number of CPUs by default
+        @param: int - number of events of the same log printed before and after every match, see printContext()"""
+        import heapq
+        import multiprocessing
+        try:
+            re.compile(pattern)
+        except Exception, e:
+            print("Opps! The regular expression '{0}' is not valid: {1}".format(pattern, e))
+            return
+        tasks = self.regexScanTasks(pattern, hosts, logIDs, startDateTime, endDateTime)
+        if len(tasks) <= 1 or self.path == ":memory:":
+            # an in-memory database cannot be opened by other processes
+            results = [scanEventRange(task, self) for task in tasks]
+        else:
+            pool = multiprocessing.Pool( processes )
+            try:
+                results = pool.map( scanEventRange, tasks )
+            finally:
+                pool.close()
+                pool.join()
+        if context > 0:
+            # the matches belong to published log families, their neighbours too
+            self.printContext(heapq.merge(*results), context)
+            return
+        for eventDateTime, eventID, logID, host, logName, eventDescription in heapq.merge(*results):
+            print("{0:>3}  {1:<15}  {2:<20}  {3}    {4}".format(logID, host, logName, eventDateTime, eventDescription))
+
+
+    def queryEventsSalientStr( self, stringMatch, hosts=None, context=0 ):
         """Searches the 'LinuxLogs.db' database for all events that contain a string within their description.
         Use 'root' if, for example, you want to search for all events that contain 'root' anywhere within their event description field.
-        @param: string - a keyword representing an item from a 'hit list' or 'black list'"""
-        queryStr = "SELECT LOGS.id, LOGS.log_name, LOGEVENTS.event_datetime, LOGEVENTS.event_description " +\
-                   "FROM LOGS, LOGEVENTS WHERE LOGS.id = LOGEVENTS.fk_logid AND " 
-        queryStr = queryStr + "LOGEVENTS.event_description LIKE '%{0}%' ".format(stringMatch)
-        queryStr = queryStr + "ORDER BY LOGEVENTS.event_datetime;"
-        self.cursor.execute( queryStr )
-        rows = self.cursor.fetchall()
-        for logID, logName, eventDateTime, eventDescription in rows:
-            print("{0:>3}  {1:<20}  {2}    {3}".format(logID, logName, eventDateTime, eventDescription))
-
+        @param: string - a keyword representing an item from a 'hit list' or 'black list'
+        @param: list - host/image IDs, optional
+        @param: int - number of events of the same log printed before and after every match, see printContext()"""
+        hostStr, hostParams = self.hostFilter(hosts)
+        queryStr = "SELECT E.event_datetime, E.id, LOGS.id, LOGS.host, LOGS.log_name, DESCRIPTION(E.template_id, E.params, E.event_description) " +\
+                   "FROM LOGS, {0} E WHERE LOGS.id = E.fk_logid AND " 
+        queryStr = queryStr + "DESCRIPTION(E.template_id, E.params, E.event_description) LIKE ? " + hostStr
+        queryStr = queryStr + "ORDER BY E.event_datetime, E.id;"
+        # the matches and their neighbours are read from the same snapshot
+        with self.snapshot():
+            rows = self.fanOut( self.partitions(), queryStr, ["%" + stringMatch + "%"] + hostParams )
+            if context > 0:
+                self.printContext(rows, context)
+                return
+            for eventDateTime, eventID, logID, host, logName, eventDescription in rows:
+                print("{0:>3}  {1:<15}  {2:<20}  {3}    {4}".format(logID, host, logName, eventDateTime, eventDescription))
+
+
+    def neighbours( self, logID, eventDateTime, eventID, direction, limit, boundDateTime=None, boundID=None ):
+        """This method seeks the events of a log just before or just after an event, in (event_datetime, id) order, on the
+        (fk_logid, event_datetime) index of the partitions: every seek reads at most 'limit' index entries per partition,
+        and the partitions of the following (or preceding) months are only read if the log has too few events left
+        @param: int - the LogID
+        @param: string - date/time of the event
+        @param: int - id of the event
+        @param: int - -1 for the events before, 1 for the events after
+        @param: int - maximum number of events
+        @param: string - date/time of an event of the log the seek stops at (excluded), optional
+        @param: int - id of that event, optional
+        @return: list - (event_datetime, id, event_description) tuples, nearest first"""
+        names = self.partitions()
+        first = self.partitionName(eventDateTime)
+        last = None if boundDateTime is None else self.partitionName(boundDateTime)
+        if direction < 0:
+            names = [name for name in reversed(names) if name <= first and (last is None or name >= last)]
+            # the row value (event_datetime, id) < (?, ?) spelled out for SQLite versions without row values
+            queryStr = "AND E.event_datetime <= ? AND (E.event_datetime < ? OR E.id < ?) "
+            boundStr = "AND E.event_datetime >= ? AND (E.event_datetime > ? OR E.id > ?) "
+            order = "DESC"
+        else:
+            names = [name for name in names if name >= first and (last is None or name <= last)]
+            queryStr = "AND E.event_datetime >= ? AND (E.event_datetime > ? OR E.id > ?) "
+            boundStr = "AND E.event_datetime <= ? AND (E.event_datetime < ? OR E.id < ?) "
+            order = "ASC"
+        params = [logID, eventDateTime, eventDateTime, eventID]
+        if boundDateTime is not None:
+            queryStr += boundStr
+            params += [boundDateTime, boundDateTime, boundID]
+        queryStr = "SELECT E.event_datetime, E.id, DESCRIPTION(E.template_id, E.params, E.event_description) FROM {0} E " +\
+                   "WHERE E.fk_logid = ? " + queryStr + "ORDER BY E.event_datetime " + order + ", E.id " + order + " LIMIT ?;"
+        rows = []
+        for name in names:
+            rows += self.connection.execute(queryStr.format(name), params + [limit - len(rows)]).fetchall()
+            if len(rows) >= limit:
+                break
+        return rows
+
+
+    def contextBlocks( self, hits, context ):
+        """This method expands search hits into blocks of consecutive events of their log, like 'grep -C': the 'context'
+        events before and after every hit. Contexts that overlap or touch are merged into one block as the hits of a log
+        are walked in order, the seeks before a hit stop at the end of the block of the previous hit so that no event is
+        read twice, and a hit already inside a block only seeks the events after it that the block is missing
+        @param: iterable - (event_datetime, id, LogID, host, log name, event_description) tuples of the hits
+        @param: int - number of events before and after every hit
+        @return: list - blocks, lists of [event_datetime, id, LogID, host, log name, event_description, hit] lists, in time order"""
+        byLog = {}
+        for hit in hits:
+            byLog.setdefault(hit[2], []).append(hit)
+        blocks = []
+        for logID, logHits in byLog.items():
+            logHits.sort(key=lambda hit: (hit[0], hit[1]))
+            block = None
+            for eventDateTime, eventID, logID, host, logName, eventDescription in logHits:
+                event = lambda row, isHit=False: [row[0], row[1], logID, host, logName, row[2], isHit]
+                if block is not None and (eventDateTime, eventID) <= (block[-1][0], block[-1][1]):
+                    # within the context of the previous hit, the event is in the block already
+                    position = len(block) - 1
+                    while block[position][1] != eventID:
+                        position -= 1
+                    block[position][6] = True
+                else:
+                    boundDateTime, boundID = (None, None) if block is None else block[-1][:2]
+                    # one more event than needed tells whether the context touches the previous block
+                    before = self.neighbours(logID, eventDateTime, eventID, -1, context + 1, boundDateTime, boundID)
+                    if block is not None and len(before) <= context:
+                        block += [event(row) for row in reversed(before)]
+                    else:
+                        if block is not None:
+                            blocks.append(block)
+                        block = [event(row) for row in reversed(before[:context])]
+                    block.append(event((eventDateTime, eventID, eventDescription), True))
+                    position = len(block) - 1
+                missing = context - (len(block) - 1 - position)
+                if missing > 0:
+                    block += [event(row) for row in self.neighbours(logID, block[-1][0], block[-1][1], 1, missing)]
+            if block is not None:
+                blocks.append(block)
+        blocks.sort(key=lambda block: (block[0][0], block[0][1]))
+        return blocks
+
+
+    def printContext( self, hits, context ):
+        """This method displays search hits along with the events of their log around them, see contextBlocks(). Hits are
+        marked with '*', blocks are separated by '--'
+        @param: iterable - (event_datetime, id, LogID, host, log name, event_description) tuples of the hits
+        @param: int - number of events before and after every hit"""
+        for i, block in enumerate(self.contextBlocks(hits, context)):
+            if i > 0:
+                print("--")
+            for eventDateTime, eventID, logID, host, logName, eventDescription, isHit in block:
+                print("{0}{1:>3}  {2:<15}  {3:<20}  {4}    {5}".format("*" if isHit else " ", logID, host, logName, eventDateTime, eventDescription))
+
+
+
+    def findEntities( self, indicator ):
+        """Returns the entities of a value, i.e. '10.0.0.5' or 'sshd[2090]', of any kind or of one kind ('user=carlos')
+        @param: string - the value, or kind=value
+        @return: list - (entity ID, kind, value) tuples"""
+        kind, sep, value = indicator.partition("=")
+        if sep and kind in EntityExtractor.KINDS:
+            return self.connection.execute("SELECT id, kind, value FROM ENTITIES WHERE value = ? AND kind = ?;", (value, kind)).fetchall()
+        if EntityExtractor.isIPv6(indicator):
+            indicator = indicator.lower()
+        return self.connection.execute("SELECT id, kind, value FROM ENTITIES WHERE value = ?;", (indicator,)).fetchall()
+
+
+    def pivot( self, indicator, hosts=None, startDateTime=None, endDateTime=None, hops=1, top=20 ):
+        """This method displays every event that involves an entity (an IP address, a user, a process, a path or a
+        package) in time order, read through its posting list instead of scanning descriptions, then the entities
+        related to it, see relatedEntities()
+        @param: string - the value, or kind=value, i.e. '10.0.0.5', 'user=carlos', 'sshd[2090]', 'path=/etc/shadow'
+        @param: list - host/image IDs, optional
+        @param: datetime - Start date/time, optional
+        @param: datetime - End date/time, optional
+        @param: int - number of expansion steps of the related entities, 0 for none
+        @param: int - number of related entities displayed (and expanded) per step"""
+        hostStr, hostParams = self.hostFilter(hosts)
+        with self.snapshot():
+            entities = self.findEntities(indicator)
+            if not entities:
+                print("[*] no entity '{0}' in the database".format(indicator))
+                return
+            entityIDs = [entityID for entityID, kind, value in entities]
+            timeStr, timeParams = self.postingsWindow("P", startDateTime, endDateTime)
+            queryStr = "SELECT P.event_id, LOGS.id, LOGS.host, LOGS.log_name FROM POSTINGS P, LOGS " +\
+                       "WHERE P.fk_entityid IN ({0}) AND LOGS.id = P.fk_logid ".format(", ".join("?" * len(entityIDs))) +\
+                       timeStr + hostStr + "ORDER BY P.event_time, P.event_id;"
+            postings = self.connection.execute(queryStr, entityIDs + timeParams + hostParams).fetchall()
+            # descriptions are fetched by id from the partition that holds them (event ids start at YYYYMM << 32)
+            descriptions = {}
+            eventIDs = sorted(set(posting[0] for posting in postings))
+            for i in xrange(0, len(eventIDs), 500):
+                chunk = eventIDs[i:i + 500]
+                for month in sorted(set(eventID >> 32 for eventID in chunk)):
+                    ids = [eventID for eventID in chunk if eventID >> 32 == month]
+                    queryStr = "SELECT id, event_datetime, DESCRIPTION(template_id, params, event_description) FROM LOGEVENTS_{0} WHERE id IN ({1});"
+                    for eventID, eventDateTime, eventDescription in self.connection.execute(queryStr.format(month, ", ".join("?" * len(ids))), ids):
+                        descriptions[eventID] = (eventDateTime, eventDescription)
+            for eventID, logID, host, logName in postings:
+                if eventID in descriptions:
+                    eventDateTime, eventDescription = descriptions.pop(eventID)
+                    print("{0:>3}  {1:<15}  {2:<20}  {3}    {4}".format(logID, host, logName, eventDateTime, eventDescription))
+            print("[*] {0:,} events of {1}".format(len(eventIDs), ", ".join("{0} '{1}'".format(kind, value) for entityID, kind, value in entities)))
+            if hops > 0:
+                print("    {0:>4}  {1:>10}  {2:<8}  {3}".format("step", "events", "kind", "related entity"))
+                for step, entityID, kind, value, count in self.relatedEntities(entityIDs, hosts, startDateTime, endDateTime, hops, top):
+                    print("    {0:>4}  {1:>10,}  {2:<8}  {3}".format(step, count, kind, value))
+
+
+    def postingsWindow( self, alias, startDateTime=None, endDateTime=None ):
+        """Returns the SQL condition (and its parameters) that restricts postings to a time window"""
+        queryStr, params = "", []
+        if startDateTime is not None:
+            queryStr += "AND {0}.event_time >= ? ".format(alias)
+            params.append(self.epochSeconds(startDateTime))
+        if endDateTime is not None:
+            queryStr += "AND {0}.event_time <= ? ".format(alias)
+            params.append(self.epochSeconds(endDateTime))
+        return queryStr, params
+
+
+    def relatedEntities( self, entityIDs, hosts=None, startDateTime=None, endDateTime=None, hops=1, top=20 ):
+        """Expands entities step by step (i.e. an IP address, then the users that logged in from it, then the other IP
+        addresses of those users): every step finds the entities that appear in the same events as those of the previous
+        step, through the event_id index of the postings, and keeps the top ones by number of shared events
+        @param: list - entity IDs
+        @param: list - host/image IDs, optional
+        @param: datetime - Start date/time, optional
+        @param: datetime - End date/time, optional
+        @param: int - number of steps
+        @param: int - number of entities kept per step
+        @return: list - (step, entity ID, kind, value, shared events) tuples"""
+        hostStr, hostParams = self.hostFilter(hosts)
+        timeStr, timeParams = self.postingsWindow("P", startDateTime, endDateTime)
+        seen = set(entityIDs)
+        frontier = list(entityIDs)
+        related = []
+        with self.snapshot():
+            for step in xrange(1, hops + 1):
+                queryStr = "SELECT Q.fk_entityid, COUNT(DISTINCT Q.event_id) FROM POSTINGS P, POSTINGS Q, LOGS " +\
+                           "WHERE P.fk_entityid IN ({0}) AND Q.event_id = P.event_id AND LOGS.id = P.fk_logid ".format(", ".join("?" * len(frontier))) +\
+                           timeStr + hostStr + "GROUP BY Q.fk_entityid;"
+                counts = [(count, entityID) for entityID, count in self.connection.execute(queryStr, frontier + timeParams + hostParams) if entityID not in seen]
+                counts.sort(key=lambda item: (-item[0], item[1]))
+                frontier = [entityID for count, entityID in counts[:top]]
+                if not frontier:
+                    break
+                seen.update(frontier)
+                for count, entityID in counts[:top]:
+                    kind, value = self.connection.execute("SELECT kind, value FROM ENTITIES WHERE id = ?;", (entityID,)).fetchone()
+                    related.append((step, entityID, kind, value, count))
+        return related
 
 
 # -- LogReaderOffsetParserXORG classes --------------------------------------------------------------------------------------------
@@ -584,6 +3557,9 @@ class LogReaderOffsetParserXORG(LogReaderStdParser):
         [     4.124] (==) Log file: "/var/log/Xorg.0.log", Time: Mon Jul 14 20:48:05 2014   <-- notice RTC time comes in eventually!
     """
 
+    # times are relative to the last RTC event
+    BISECTABLE = False
+
 
     def __init__(self, logName, logLocationAbsolutePath, logDescription):
         """Constructor for the class that knows how to parse the /var/log/dmesg log, this is a child class of LogReaderOffsetParserDMESG
@@ -634,7 +3610,7 @@ class LogReaderOffsetParserXORG(LogReaderStdParser):
                         # adjust/normalize from offset to local time
                         for item in self.preRTC:
                             eventTime = self.RTC + datetime.timedelta(0, item[0])
-                            self.saveEvent( self.parentRecordID, eventTime, item[1])
+                            self.saveEvent( self.parentRecordID, eventTime, item[1], item[2])
                     except Exception, e:
                         pass
             else:
@@ -646,7 +3622,7 @@ class LogReaderOffsetParserXORG(LogReaderStdParser):
                     if( eventDescription!="" ): 
                         # note: Rounding is more precise if we want to query on a plus or minus windows in seconds
                         offsetSecondsSincePowerOn = self.extractTimeFromLogEntry( singleLogEntry )
-                        self.preRTC.append( [offsetSecondsSincePowerOn, eventDescription])
+                        self.preRTC.append( [offsetSecondsSincePowerOn, eventDescription, self.source])
         else:
             #if already have clock, then use it to calculate time of log entry
             eventDescription = singleLogEntry[singleLogEntry.find("]")+2:]
@@ -679,39 +3655,136 @@ class LogReader_UTMP_WTMP_Parser (LogReaderStdParser):
     carlos   pts/3        :0               Tue Jul 22 16:48 - 18:52  (02:03)    
     carlos   pts/3        :0               Mon Jul 21 15:21 - 21:05  (05:44)
 
-    wtmp begins Wed Jul  2 23:30:12 2014 """
+    wtmp begins Wed Jul  2 23:30:12 2014 
+
+    The binary records are read natively (so the '--rootDir' option is honored) and paired the way 'last' does into
+    sessions: a USER_PROCESS record opens a session on a tty, the DEAD_PROCESS record of that tty closes it and a
+    reboot or shutdown closes every open one. Sessions are kept in the 'sessions' list as (user, tty, remote host,
+    start, end, status, boot) tuples, end is None for users still logged in, boot the start of the boot the session
+    belongs to. The log-in and log-off events are saved too."""
+
+    # binary log
+    BISECTABLE = False
+
+    # struct utmp of glibc on Linux (i386 and x86_64): type, pid, line, id, user, host, exit status, session, tv_sec, tv_usec, addr_v6, unused
+    RECORD = "<h2xi32s4s32s256shhiii16s20s"
+    RECORD_SIZE = 384
+
+    # ut_type values
+    RUN_LVL = 1
+    BOOT_TIME = 2
+    USER_PROCESS = 7
+    DEAD_PROCESS = 8
+
+
+    def __init__(self, logName, path, desc):
+        """Standard class constructor, see LogReaderStdParser"""
+        LogReaderStdParser.__init__(self, logName, path, desc)
+        self.sessions = []
+        self.openSessions = {}
+        self.boot = None
 
 
     def readLogFile(self):
-        """This method reads every line of text of every log files associated with this class"""
-        try:
-            subprocess_output = subprocess.check_output(["last"]) # note: last -f /var/log/wtmp ====  last
+        """This method yields one (type, line, user, host, datetime) tuple for every record of every wtmp file of this
+        log (i.e. wtmp.1 then wtmp) and None once all the files are read, the records are hashed as they are read"""
+        self.sessions = []
+        self.openSessions = {}
+        self.boot = None
+        for record in self.readRecords(self):
+            yield record
+        yield None
+
+
+    @staticmethod
+    def readRecords(reader):
+        """Yields one (type, line, user, host, datetime) tuple for every record of every file of a log in the utmp format
+        (i.e. wtmp.1 then wtmp, or btmp), hashing the records as they are read and leaving the byte offset of every
+        record in the reader's 'source'
+        @param: LogReaderStdParser - the reader of the log, its 'sourceFiles' are set"""
+        import struct
+        reader.sourceFiles = []
+        filenamePattern = reader.logLocationAbsolutePath+"*"
+        for index, file in enumerate(sorted(glob.glob(filenamePattern), key=os.path.getmtime)):
             c=0
-            for line in subprocess_output.splitlines():
-                c += 1
-                print("    [*] {0:>12,} log entires parsed for file: '{1}'.".format(c, file), end="\r")
-                self.decode_entry( line )
-        except Exception as e:
-            pass
+            reader.sourceFiles.append(None)
+            try:
+                with open(file, "rb") as file_object:
+                    source = reader.sourceFiles[index] = SourceFile(file, file_object)
+                    while True:
+                        record = file_object.read(LogReader_UTMP_WTMP_Parser.RECORD_SIZE)
+                        reader.source = (index, source.size)
+                        source.update(record)
+                        if len(record) < LogReader_UTMP_WTMP_Parser.RECORD_SIZE:
+                            # the end of the file, a truncated last record included
+                            source.finish()
+                            break
+                        fields = struct.unpack(LogReader_UTMP_WTMP_Parser.RECORD, record)
+                        c += 1
+                        print("    [*] {0:>12,} log entires parsed for file: '{1}'.".format(c, file), end="\r")
+                        yield (fields[0], fields[2].split("\0")[0], fields[4].split("\0")[0], fields[5].split("\0")[0],
+                               datetime.datetime.fromtimestamp(fields[9]))
+            except Exception, e:
+                pass
+            else:
+                print(" ")
+        reader.source = None
+
+
+    def closeSessions(self, eventTime, status, lines=None):
+        """Closes the open sessions (all of them, or the ones on the given ttys)
+        @param: datetime - the end of the sessions
+        @param: string - how the sessions ended i.e. 'logout', 'crash', 'down'
+        @param: list - ttys, optional"""
+        for line in (self.openSessions.keys() if lines is None else lines):
+            user, tty, host, start, boot = self.openSessions.pop(line)
+            self.sessions.append((user, tty, host, start, eventTime, status, boot))
+            if eventTime is not None:
+                self.saveEvent( self.parentRecordID, eventTime, "Log-off: {0:<8} {1:<12} {2:<16} ({3})".format(user, tty, host, status))
 
 
     def decode_entry(self, singleLogEntry):
-        """This method decodes log entries for the /var/log/wtmp log file"
-        @param: string - The a single line in the log containing the date, time and description of the event"""
+        """This method decodes a wtmp record into log-in/log-off events and sessions
+        @param: tuple - a record as yielded by readLogFile, None to close the sessions still open"""
         try:
-            #extract one event only: log-in
-            #format string obtained from https://docs.python.org/2/library/datetime.html#strftime-and-strptime-behavior
-            eventTime =  datetime.datetime.strptime(singleLogEntry[39:55]+":00 "+str(date.today().year) , "%a %b %d %H:%M:%S %Y") # of the form 'Tue Jul 22 20:03:00 2014'
-            self.saveEvent( self.parentRecordID, eventTime, "Log-in: "+singleLogEntry)
-    
-            if( singleLogEntry.find("still logged in") == -1 ):
-                #extract extra event: log-out
-                #                                                   'Tue Jul 22'  '20:18'
-                eventTime =  datetime.datetime.strptime(singleLogEntry[39:49]+" "+singleLogEntry[58:63]+ ":00 "+str(date.today().year) , "%a %b %d %H:%M:%S %Y") # of the form 'Tue Jul 22 20:03:00 2014'
-                self.saveEvent( self.parentRecordID, eventTime, "Log-off: "+singleLogEntry)
+            if singleLogEntry is None:
+                self.closeSessions(None, "still logged in")
+                if self.boot is not None:
+                    self.sessions.append(self.boot[:4] + (None, "still running", self.boot[3]))
+                    self.boot = None
+                return
+            recordType, line, user, host, eventTime = singleLogEntry
+            if recordType == self.USER_PROCESS:
+                if line in self.openSessions:
+                    self.closeSessions(eventTime, "gone - no logout", [line])
+                self.openSessions[line] = (user, line, host, eventTime, self.boot[3] if self.boot else None)
+                self.saveEvent( self.parentRecordID, eventTime, "Log-in: {0:<8} {1:<12} {2}".format(user, line, host))
+            elif recordType == self.DEAD_PROCESS:
+                if line in self.openSessions:
+                    self.closeSessions(eventTime, "logout", [line])
+            elif recordType == self.BOOT_TIME or (recordType == self.RUN_LVL and user == "shutdown"):
+                status = "crash" if recordType == self.BOOT_TIME else "down"
+                self.closeSessions(eventTime, status)
+                if self.boot is not None:
+                    self.sessions.append(self.boot[:4] + (eventTime, status, self.boot[3]))
+                    self.boot = None
+                if recordType == self.BOOT_TIME:
+                    # host is the kernel version for reboot records
+                    self.boot = ("reboot", "system boot", host, eventTime)
+                    self.saveEvent( self.parentRecordID, eventTime, "System boot: {0}".format(host))
+                else:
+                    self.saveEvent( self.parentRecordID, eventTime, "System shutdown")
         except Exception as e:
             pass
-        pass
+
+
+    def saveDetailsToDB(self, db, host=""):
+        """Saves the sessions into the SESSIONS table along with the events. When the events were parsed in another
+        process the 'sessions' attribute must be set too
+        @param: dbLogs - The database the events are saved to
+        @param: string - The host/image ID the log was collected from"""
+        s = db.saveSessions(self.sessions, self.parentRecordID, host, commit=False)
+        print("[*] saved {0:>8,} login sessions for the '{1}' system log to '{2}'".format(s, self.logLocationAbsolutePath, db.path))
 
 
 
@@ -727,42 +3800,240 @@ class LogReader_BTMP_Parser(LogReaderStdParser):
     
     Example 'last -f /var/log/btmp' command output:
 
-    carlos   ssh:notty    localhost        Tue Jul 22 20:04    gone - no logout"""
+    carlos   ssh:notty    localhost        Tue Jul 22 20:04    gone - no logout
+
+    The records have the layout of wtmp records and are read natively the same way (see LogReader_UTMP_WTMP_Parser),
+    hashed as they are read, into events of the form:
+
+    Faild login: carlos   ssh:notty    localhost"""
+
+    # binary log
+    BISECTABLE = False
 
     def readLogFile(self):
-        """This method reads every line of text of every log files associated with this class"""
-        filenamePattern = self.logLocationAbsolutePath+"*"
-        for file in glob.glob(filenamePattern):
+        """This method yields one (type, line, user, host, datetime) tuple for every record of every btmp file of this log"""
+        return LogReader_UTMP_WTMP_Parser.readRecords(self)
+
+
+    def decode_entry(self, singleLogEntry):
+        """This method decodes a btmp record into a failed login event
+        @param: tuple - a record as yielded by readLogFile"""
+        try:
+            recordType, line, user, host, eventTime = singleLogEntry
+            if user:
+                self.saveEvent( self.parentRecordID, eventTime, "Faild login: {0:<8} {1:<12} {2}".format(user, line, host))
+        except Exception as e:
+            pass
+
+
+
+
+
+
+
+# -- LogReader_JOURNAL_Parser classes --------------------------------------------------------------------------------------------
+class LogReader_JOURNAL_Parser(LogReaderStdParser):
+    """This class inherits form the LogReaderStdParser class but overwrides the necessary methods to read the binary
+    systemd journal files (/var/log/journal/<machine-id>/*.journal) natively, without spawning 'journalctl'. Each file
+    is memory-mapped and its entry arrays are walked directly, so it honors the '--rootDir' option.
+    Data objects compressed with XZ, LZ4 or ZSTD are decoded when the 'lzma' (or 'backports.lzma'), 'lz4' or
+    'zstandard' modules are installed.
+
+    Example event description:
+
+        sshd[1021]: Failed password for root from 10.0.0.5 port 22 ssh2 (_SYSTEMD_UNIT=ssh.service, _BOOT_ID=5c1b...)
+
+    File format reference: https://systemd.io/JOURNAL_FILE_FORMAT/"""
+
+    # binary log
+    BISECTABLE = False
+
+    # header incompatible flags
+    HEADER_COMPACT = 16
+
+    # object types and object flags
+    OBJECT_DATA = 1
+    OBJECT_ENTRY = 3
+    OBJECT_ENTRY_ARRAY = 6
+    OBJECT_COMPRESSED_XZ = 1
+    OBJECT_COMPRESSED_LZ4 = 2
+    OBJECT_COMPRESSED_ZSTD = 4
+
+    # fields extracted from every entry
+    FIELDS = ("MESSAGE", "_SYSTEMD_UNIT", "_PID", "SYSLOG_IDENTIFIER", "_COMM")
+
+
+    def readLogFile(self):
+        """Yields one (realtime, bootID, fields) tuple for every entry of every journal file associated with this class"""
+        import mmap
+
+        self.sourceFiles = []
+        filenamePattern = os.path.join(self.logLocationAbsolutePath, "*", "*.journal*")
+        for index, file in enumerate(sorted(glob.glob(filenamePattern))):
             c=0
+            self.sourceFiles.append(None)
             try:
-                with open(file) as file_object:
-                    for line in file_object:
-                        c+=1
-                        print("    [*] {0:>12,} log entires parsed for file: '{1}'.".format(c, file), end="\r")
-                        line = line.rstrip() # remove training whitespaces including '\n'
-                        try:
-                            subprocess_output = subprocess.check_output(["last", "-f", file]) 
-                            for line in subprocess_output.splitlines():
-                                self.decode_entry( line )
-                        except Exception as e:
-                            pass
+                with open(file, "rb") as file_object:
+                    journal = mmap.mmap(file_object.fileno(), 0, access=mmap.ACCESS_READ)
+                    try:
+                        source = self.sourceFiles[index] = SourceFile(file, file_object)
+                        hashed = 0
+                        for entry in self.readJournalEntries(journal, index):
+                            # entries are appended to the file, the file is hashed right behind the entry being read
+                            # (along with the data objects written before it) while its pages are in memory
+                            if self.source[1] - hashed >= 1048576:
+                                source.update(journal[hashed:self.source[1]])
+                                hashed = self.source[1]
+                            c+=1
+                            print("    [*] {0:>12,} log entires parsed for file: '{1}'.".format(c, file), end="\r")
+                            yield entry
+                        source.update(journal[hashed:])
+                        source.finish()
+                    finally:
+                        journal.close()
             except Exception, e:
                 pass
             else:
                 print(" ")
 
 
+    def readJournalEntries(self, journal, fileIndex=None):
+        """Walks the chain of entry arrays of one memory-mapped journal file, leaving the offset of every entry in 'source'
+        @param: mmap - The journal file
+        @param: int - index of the file among the journal files read, optional
+        @return: iterator - (realtime in usec, bootID, fields dictionary) tuples"""
+        import struct
+
+        if journal[:8] != "LPKSHHRH":
+            return
+        incompatibleFlags, = struct.unpack_from("<I", journal, 12)
+        compact = (incompatibleFlags & self.HEADER_COMPACT) != 0
+        headerSize, = struct.unpack_from("<Q", journal, 88)
+        nEntries, = struct.unpack_from("<Q", journal, 152)
+        entryArrayOffset, = struct.unpack_from("<Q", journal, 176)
+        # in compact files offsets are 32 bits wide
+        itemFormat, itemSize = ("<I", 4) if compact else ("<Q", 8)
+        dataCache = {}
+
+        seen = 0
+        while entryArrayOffset != 0 and seen < nEntries:
+            objectType, = struct.unpack_from("<B", journal, entryArrayOffset)
+            objectSize, = struct.unpack_from("<Q", journal, entryArrayOffset + 8)
+            if objectType != self.OBJECT_ENTRY_ARRAY or objectSize < 24:
+                break
+            nextEntryArrayOffset, = struct.unpack_from("<Q", journal, entryArrayOffset + 16)
+            for itemOffset in xrange(entryArrayOffset + 24, entryArrayOffset + objectSize, itemSize):
+                entryOffset, = struct.unpack_from(itemFormat, journal, itemOffset)
+                if entryOffset == 0 or seen >= nEntries:
+                    break
+                seen += 1
+                entry = self.readJournalEntry(journal, entryOffset, compact, dataCache)
+                if entry is not None:
+                    self.source = (fileIndex, entryOffset)
+                    yield entry
+            # data objects are shared between entries, keep the cache bounded
+            if len(dataCache) > 100000:
+                dataCache.clear()
+            entryArrayOffset = nextEntryArrayOffset
+
+
+    def readJournalEntry(self, journal, entryOffset, compact, dataCache):
+        """Decodes one entry object: its realtime timestamp, boot ID and the fields of interest of its data objects
+        @param: mmap - The journal file
+        @param: int - Offset of the entry object
+        @param: bool - True for files in compact mode
+        @param: dict - Cache of already decoded data objects by offset
+        @return: tuple - (realtime in usec, bootID, fields dictionary)"""
+        import struct
+
+        objectType, = struct.unpack_from("<B", journal, entryOffset)
+        objectSize, = struct.unpack_from("<Q", journal, entryOffset + 8)
+        if objectType != self.OBJECT_ENTRY:
+            return None
+        realtime, = struct.unpack_from("<Q", journal, entryOffset + 24)
+        bootID = journal[entryOffset + 40:entryOffset + 56].encode("hex")
+        itemFormat, itemSize = ("<I", 4) if compact else ("<Q", 16)
+
+        fields = {}
+        for itemOffset in xrange(entryOffset + 64, entryOffset + objectSize, itemSize):
+            dataOffset, = struct.unpack_from(itemFormat, journal, itemOffset)
+            if dataOffset in dataCache:
+                field = dataCache[dataOffset]
+            else:
+                field = dataCache[dataOffset] = self.readJournalData(journal, dataOffset, compact)
+            if field is not None:
+                fields[field[0]] = field[1]
+        return realtime, bootID, fields
+
+
+    def readJournalData(self, journal, dataOffset, compact):
+        """Decodes one data object of the form 'FIELD=value', uncompressing it if necessary
+        @param: mmap - The journal file
+        @param: int - Offset of the data object
+        @param: bool - True for files in compact mode
+        @return: tuple - (field name, value) for the fields of interest, None otherwise"""
+        import struct
+
+        objectType, objectFlags = struct.unpack_from("<BB", journal, dataOffset)
+        objectSize, = struct.unpack_from("<Q", journal, dataOffset + 8)
+        if objectType != self.OBJECT_DATA:
+            return None
+        payloadOffset = dataOffset + (72 if compact else 64)
+        payload = journal[payloadOffset:dataOffset + objectSize]
+
+        if objectFlags & (self.OBJECT_COMPRESSED_XZ | self.OBJECT_COMPRESSED_LZ4 | self.OBJECT_COMPRESSED_ZSTD):
+            payload = self.decompress(payload, objectFlags)
+            if payload is None:
+                # the field name is compressed too, this only stands in for MESSAGE if the entry has no other one
+                return ("UNDECODED", "[compressed journal data, install the lzma/lz4/zstandard python module to decode it]")
+
+        name, separator, value = payload.partition("=")
+        if separator == "" or name not in self.FIELDS:
+            return None
+        return name, value
+
+
+    def decompress(self, payload, objectFlags):
+        """Uncompresses the payload of a data object, returns None when the necessary module is not installed
+        @param: string - The compressed payload
+        @param: int - The object flags telling which compression was used"""
+        import struct
+        try:
+            if objectFlags & self.OBJECT_COMPRESSED_XZ:
+                try:
+                    import lzma
+                except ImportError:
+                    from backports import lzma
+                return lzma.decompress(payload)
+            if objectFlags & self.OBJECT_COMPRESSED_LZ4:
+                import lz4.block
+                # the payload starts with the uncompressed size
+                size, = struct.unpack_from("<Q", payload, 0)
+                return lz4.block.decompress(payload[8:], uncompressed_size=size)
+            if objectFlags & self.OBJECT_COMPRESSED_ZSTD:
+                import zstandard
+                return zstandard.ZstdDecompressor().decompress(payload, max_output_size=64 * 1024 * 1024)
+        except Exception as e:
+            pass
+        return None
+
+
     def decode_entry(self, singleLogEntry):
-        """This method decodes log entries for the /var/log/wtmp log file"
-        @param: string - The a single line in the log containing the date, time and description of the event"""
+        """This method builds a syslog-like event out of a journal entry
+        @param: tuple - (realtime in usec, bootID, fields dictionary) as yielded by readLogFile"""
         try:
-            #extract one event only: log-in
-            #format string obtained from https://docs.python.org/2/library/datetime.html#strftime-and-strptime-behavior
-            eventTime =  datetime.datetime.strptime(singleLogEntry[39:55]+":00 "+str(date.today().year) , "%a %b %d %H:%M:%S %Y") # of the form 'Tue Jul 22 20:03:00 2014'
-            self.saveEvent( self.parentRecordID, eventTime, "Faild login: "+singleLogEntry)
+            realtime, bootID, fields = singleLogEntry
+            eventTime = datetime.datetime.fromtimestamp(realtime // 1000000)
+            source = fields.get("SYSLOG_IDENTIFIER") or fields.get("_COMM") or fields.get("_SYSTEMD_UNIT", "")
+            if "_PID" in fields:
+                source += "[" + fields["_PID"] + "]"
+            context = "_BOOT_ID=" + bootID
+            if "_SYSTEMD_UNIT" in fields:
+                context = "_SYSTEMD_UNIT=" + fields["_SYSTEMD_UNIT"] + ", " + context
+            eventDescription = "{0}: {1} ({2})".format(source, fields.get("MESSAGE", fields.get("UNDECODED", "")), context)
+            self.saveEvent( self.parentRecordID, eventTime, eventDescription)
         except Exception as e:
             pass
-        pass
 
 
 
@@ -770,13 +4041,143 @@ class LogReader_BTMP_Parser(LogReaderStdParser):
 
 
 
-#--[ start of main program ]-----------------------------------------------------------------------------------------------------
+# -- LogReader_AUDIT_Parser classes --------------------------------------------------------------------------------------------
+class LogReader_AUDIT_Parser(LogReaderStdParser):
+    """This class inherits form the LogReaderStdParser class but overwrides the necessary methods to read the Linux
+    audit log (/var/log/audit/audit.log*). An audit event is written as several records sharing the same
+    'msg=audit(<epoch>.<millis>:<serial>)' stamp, i.e. SYSCALL, EXECVE, CWD, PATH and PROCTITLE records followed by an
+    EOE record. Records are assembled into one event per stamp as the files stream by: an event is saved at its EOE
+    record, or once it has waited PENDING_SECONDS (of log time) for more records, or when more than PENDING_EVENTS
+    events are pending. Memory stays bounded whatever the size of the log. Hex encoded strings (file names, command
+    lines, proctitle...) are decoded and the epoch timestamps are used as they are, without strptime.
+
+    Example event description:
+
+        audit: SYSCALL arch=c000003e syscall=59 success=yes exit=0 ... comm="cat" exe="/usr/bin/cat" key="shadow" |
+        EXECVE argc=2 a0="cat" a1="/etc/shadow" | CWD cwd="/root" | PATH item=0 name="/usr/bin/cat" ... | PROCTITLE
+        proctitle="cat /etc/shadow" (serial=24287)"""
+
+    # events do not come out in the order of the lines they start on
+    BISECTABLE = False
+
+    # bounds of the events being assembled
+    PENDING_SECONDS = 5
+    PENDING_EVENTS = 1000
+
+    # fields written hex encoded by the kernel when they hold spaces, quotes or control characters
+    HEX_FIELD = re.compile(r"(?<= )(proctitle|name|cwd|comm|exe|path|acct|key|data)=([0-9A-F]{2,})(?= |$|')")
+    # every argument of EXECVE records is either quoted or hex encoded
+    HEX_ARGUMENT = re.compile(r"(?<= )(a\d+)=([0-9A-F]{2,})(?= |$)")
+
+
+    def __init__(self, logName, path, desc):
+        """Standard class constructor, see LogReaderStdParser"""
+        LogReaderStdParser.__init__(self, logName, path, desc)
+        self.pending = collections.OrderedDict()
+        self.utcOffsets = {}
+
+
+    def readLogFile(self):
+        """Yields every line of every audit log file (see LogReaderStdParser.readLogFile) then None once all the files
+        are read, to save the events still pending"""
+        self.pending = collections.OrderedDict()
+        for line in LogReaderStdParser.readLogFile(self):
+            yield line
+        yield None
 
-db = dbLogs() # this instantiates the database object
 
-def readLogs( customRootDir="" ):
-    """Use a list to instantiate and hold all our log objects
-    @param: string - the argument passed-in by the '--rootDir' option which will be the common way for Forensic Investigators to use this script """
+    @staticmethod
+    def decodeHex(match):
+        """Decodes a hex encoded field into a quoted string, the NULs separating command line arguments become spaces"""
+        try:
+            value = match.group(2).decode("hex")
+        except Exception as e:
+            return match.group(0)
+        return '{0}="{1}"'.format(match.group(1), value.rstrip("\0").replace("\0", " "))
+
+
+    def localMicroseconds(self, seconds, millis):
+        """Converts an epoch timestamp to microseconds since 1970-01-01 in local time (as the journal reader does), the
+        UTC offset is looked up once per hour"""
+        hour = seconds // 3600
+        offset = self.utcOffsets.get(hour)
+        if offset is None:
+            import calendar
+            offset = self.utcOffsets[hour] = calendar.timegm(time.localtime(seconds)) - seconds
+        return (seconds + offset) * 1000000 + millis * 1000
+
+
+    def savePending(self, stamp):
+        """Saves the event of a stamp assembled so far"""
+        micros, serial, records, source = self.pending.pop(stamp)
+        self.events.appendMicroseconds(self.parentRecordID, micros, "audit: {0} (serial={1})".format(" | ".join(records), serial), source)
+
+
+    def flushPending(self, count=None, before=None):
+        """Saves the oldest pending events: count of them, or those older than 'before', or all of them
+        @param: int - number of events, optional
+        @param: int - microseconds, optional"""
+        pending = self.pending
+        while pending and (count is None or count > 0):
+            stamp = next(iter(pending))
+            if before is not None and pending[stamp][0] >= before:
+                break
+            self.savePending(stamp)
+            if count is not None:
+                count -= 1
+
+
+    def decode_entry(self, singleLogEntry):
+        """This method adds an audit record of the form 'type=SYSCALL msg=audit(1364481363.243:24287): arch=c000003e ...'
+        to the event of its stamp
+        @param: string - a record as yielded by readLogFile, None to save the events still pending"""
+        try:
+            if singleLogEntry is None:
+                self.flushPending()
+                return
+            start = singleLogEntry.find("msg=audit(")
+            end = singleLogEntry.find("):", start)
+            if start < 0 or end < 0:
+                return
+            recordType = singleLogEntry[singleLogEntry.find("type=") + 5:start].strip()
+            stamp = singleLogEntry[start + 10:end]
+            if recordType == "EOE":
+                if stamp in self.pending:
+                    self.savePending(stamp)
+                return
+            # enriched logs (log_format = ENRICHED) append the names of the ids after a group separator
+            fields = singleLogEntry[end + 2:].replace("\x1d", " ")
+            if recordType == "EXECVE":
+                fields = self.HEX_ARGUMENT.sub(self.decodeHex, fields)
+            fields = self.HEX_FIELD.sub(self.decodeHex, fields)
+            event = self.pending.get(stamp)
+            if event is None:
+                timestamp, serial = stamp.split(":")
+                seconds, millis = timestamp.split(".")
+                micros = self.localMicroseconds(int(seconds), int(millis))
+                # the event is located at its first record
+                event = self.pending[stamp] = (micros, serial, [], self.source)
+                # events whose EOE never comes (i.e. single record events of user space programs) are saved once
+                # they are PENDING_SECONDS older than the newest event, or when too many are pending
+                self.flushPending(before=micros - self.PENDING_SECONDS * 1000000)
+                if len(self.pending) > self.PENDING_EVENTS:
+                    self.flushPending(count=len(self.pending) - self.PENDING_EVENTS)
+            event[2].append(recordType + fields)
+        except Exception as e:
+            pass
+
+
+
+
+
+
+
+#--[ start of main program ]-----------------------------------------------------------------------------------------------------
+
+def logReaders( customRootDir="" ):
+    """Use a list to instantiate and hold all our log objects. Readers are lazy: nothing is read until a reader is iterated
+    @param: string - the argument passed-in by the '--rootDir' option which will be the common way for Forensic Investigators to use this script
+    @return: list - one reader object per log family"""
     
     # create filepath variables that take into account, if applicable, the argument passed-in by the '--rootDir' option
     # which will be the common way for Forensic Investigators to use this script 
@@ -794,25 +4195,28 @@ def readLogs( customRootDir="" ):
     filepath_utmp_wtmp    = "{0}/var/log/wtmp".format(customRootDir)
     filepath_btmp         = "{0}/var/log/btmp".format(customRootDir)
     filepath_user         = "{0}/var/log/user".format(customRootDir)
+    filepath_journal      = "{0}/var/log/journal".format(customRootDir)
+    filepath_audit        = "{0}/var/log/audit/audit.log".format(customRootDir)
 
 
     #
     #
-    # start instantiating log readers of different kinds, each instantiation
-    # parses the log and stores it to the database. Note that the parent class
-    # has a few extra helper methods that we are not using, but are available
+    # start instantiating log readers of different kinds, each reader parses
+    # its log when it is iterated or saved to the database. Note that the parent
+    # class has a few extra helper methods that we are not using, but are available
     # for other developers of this script
     #
     #
     
+    logReaders = []
 
-    LogReaderOffsetParserDMESG( 
+    logReaders.append( LogReaderOffsetParserDMESG(
         "dmesg log", filepath_dmesg, "Contains kernel ring buffer information. "+ \
         "When the system boots up, it prints number of messages on the screen that "+ \
         "displays information about the hardware devices that the kernel detects "+ \
         "during boot process. These messages are available in kernel ring buffer and "+ \
         "whenever the new message comes the old message gets overwritten. You can also "+ \
-        "view the content of this file using the dmesg command.")
+        "view the content of this file using the dmesg command."))
         #sample log:
         #$ cat /var/log/dmesg
         #...
@@ -822,13 +4226,10 @@ def readLogs( customRootDir="" ):
         #[    0.178448] NET: Registered protocol family 16
         #...
 
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
 
 
 
-    LogReaderOffsetParserXORG("xorg log", filepath_xorg, "Contains a log of messages from the X"),
+    logReaders.append( LogReaderOffsetParserXORG("xorg log", filepath_xorg, "Contains a log of messages from the X"))
         #sample log:
         #$ cat Xorg.0.log
         #...
@@ -839,16 +4240,13 @@ def readLogs( customRootDir="" ):
         #[     4.124] (==) Using config file: "/etc/X11/xorg.conf"
         #[     4.124] (==) Using system config directory "/usr/share/X11/xorg.conf.d"
     
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
 
 
 
-    logReader = LogReaderStdParser(
+    logReaders.append( LogReaderStdParser(
         "messages log", filepath_messages, "Contains global system messages, "+ \
         "including the messages that are logged during system startup. Several "+ \
-        "things are in this log, such as: mail, cron, daemon, kern, auth, etc."),
+        "things are in this log, such as: mail, cron, daemon, kern, auth, etc."))
         #sample log:
         #$ head /var/log/messages
         #Jul 11 17:54:32 SpiderMan kernel: imklog 5.8.11, log source = /proc/kmsg started.
@@ -856,18 +4254,15 @@ def readLogs( customRootDir="" ):
         #Jul 11 17:54:32 SpiderMan rsyslogd: rsyslogd's groupid changed to 103
         #Jul 11 17:54:32 SpiderMan rsyslogd: rsyslogd's userid changed to 101
         
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
 
 
 
-    logReader = LogReaderStdParser(
+    logReaders.append( LogReaderStdParser(
         "syslog log", filepath_syslog, "Syslog is a way for network devices to send "+ \
         "event messages to a logging server, usually known as a Syslog server. Most "+ \
         "network equipment, like routers and switches, can send Syslog messages. Not only "+ \
         "that, but *nix servers also have the ability to generate Syslog data, as do most "+ \
-        "firewalls, some printers, and even web-servers like Apache. "),
+        "firewalls, some printers, and even web-servers like Apache. "))
         #sample log:
         #$ head /var/log/syslog
         #Jun 29 07:39:42 SpiderMan rsyslogd: [origin software="rsyslogd" swVersion="5.8.11" x-pid="580" x-info="http://www.rsyslog.com"] rsyslogd was HUPed
@@ -875,15 +4270,12 @@ def readLogs( customRootDir="" ):
         #Jun 29 07:39:48 SpiderMan anacron[11496]: Normal exit (1 job run)
         #Jun 29 07:43:36 SpiderMan whoopsie[978]: online
     
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
 
 
 
-    logReader = LogReaderStdParser(
+    logReaders.append( LogReaderStdParser(
         "auth log", filepath_auth, "Contains system authorization information, "+ \
-        "including user logins and authentication machinsm that were used."),
+        "including user logins and authentication machinsm that were used."))
         #sample log:
         #$ head /var/log/auth.log
         #Jul 11 17:53:22 SpiderMan sudo: pam_unix(sudo:session): session opened for user root by carlos(uid=0)
@@ -891,15 +4283,12 @@ def readLogs( customRootDir="" ):
         #Jul 11 17:54:32 SpiderMan sudo: pam_unix(sudo:session): session opened for user root by carlos(uid=0)
         #Jul 11 18:34:59 SpiderMan dbus[507]: [system] Rejected send message, 3 matched rules; type="method_return", sender=":1.66" (uid=1000 pid=2090 comm="/usr/bin/pulseaudio --start --log-target=syslog ") interface="(unset)" member="(unset)" error name="(unset)" requested_reply="0" destination=":1.2" (uid=0 pid=622 comm="/usr/sbin/bluetoothd ")
     
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
 
 
 
-    logReader = LogReaderParserYYYYMMDD(
+    logReaders.append( LogReaderParserYYYYMMDD(
         "dpkg log", filepath_dpkg, "Records all the apt activities, such as installs "+ \
-        "or upgrades, for the various package managers (dpkg, apt-get, synaptic, aptitude)."),
+        "or upgrades, for the various package managers (dpkg, apt-get, synaptic, aptitude)."))
         #sample log:
         #$ head /var/log/dpkg.log
         #2014-07-04 16:55:36 trigproc desktop-file-utils:i386 0.21-1ubuntu3 0.21-1ubuntu3
@@ -907,15 +4296,12 @@ def readLogs( customRootDir="" ):
         #2014-07-04 16:55:36 status installed desktop-file-utils:i386 0.21-1ubuntu3
         #2014-07-04 16:55:36 trigproc gnome-menus:i386 3.8.0-1ubuntu5 3.8.0-1ubuntu5
     
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
 
 
 
-    logReader = LogReaderStdParser(
+    logReaders.append( LogReaderStdParser(
         "kern log", filepath_kern, "Contains information logged by the kernel. "+ \
-        "Helpful for you to troubleshoot a custom-built kernel."),
+        "Helpful for you to troubleshoot a custom-built kernel."))
         #sample log:
         #$ head /var/log/kern.log
         #Jul 10 15:01:36 SpiderMan kernel: [    5.052266] wlan0: authenticate with 10:bf:48:53:c7:90
@@ -926,28 +4312,22 @@ def readLogs( customRootDir="" ):
         #Jul 10 15:01:36 SpiderMan kernel: [    5.112845] wlan0: RX AssocResp from 10:bf:48:53:c7:90 (capab=0x411 status=0 aid=4)
         #Jul 10 15:01:36 SpiderMan kernel: [    5.114950] wlan0: associated
     
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
 
 
 
-    logReader = LogReaderStdParser(
+    logReaders.append( LogReaderStdParser(
         "cron log", filepath_cron, "Whenever cron daemon (or anacron) starts a cron job, it "+ \
-        "logs the information about the cron job in this file"),
+        "logs the information about the cron job in this file"))
         #sample log:
         #$ head /var/log/cron.log
         #Jul 12 08:17:01 SpiderMan CRON[5040]: (root) CMD (   cd / && run-parts --report /etc/cron.hourly)
     
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
 
 
 
-    logReader = LogReaderStdParser(
+    logReaders.append( LogReaderStdParser(
         "daemon log", filepath_deamon, "Contains information logged by the "+ \
-        "various background daemons that runs on the system"),
+        "various background daemons that runs on the system"))
         #sample log:
         #$ head /var/log/daemon.log
         #Jul 12 08:04:20  whoopsie[1020]: last message repeated 4 times
@@ -955,16 +4335,13 @@ def readLogs( customRootDir="" ):
         #Jul 12 08:09:02 SpiderMan whoopsie[1020]: online
         #Jul 12 08:15:16  whoopsie[1020]: last message repeated 5 times
     
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
 
 
 
-    logReader = LogReaderParserTextYYYYMMDD(
+    logReaders.append( LogReaderParserTextYYYYMMDD(
         "alternatives log", filepath_alternatives, "Information by the "+ \
         "update-alternatives are logged into this log file. On Ubuntu, update-alternatives "+ \
-        "maintains symbolic links determining default commands."),
+        "maintains symbolic links determining default commands."))
         #sample log:
         #$ head /var/log/alternatives.log
         #update-alternatives 2014-07-01 15:43:11: link group tclsh updated to point to /usr/bin/tclsh8.5
@@ -972,16 +4349,13 @@ def readLogs( customRootDir="" ):
         #update-alternatives 2014-07-02 23:29:03: run with --remove x-www-browser /usr/bin/chromium-browser
         #update-alternatives 2014-07-04 07:53:48: link group mailx updated to point to /usr/bin/heirloom-mailx
     
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
 
 
 
-    logReader = LogReaderParserTextDateInSquareBrackets(
+    logReaders.append( LogReaderParserTextDateInSquareBrackets(
         "cups access log", filepath_cupsaccess, "The access_log file lists each HTTP resource that "+ \
         "is accessed by a web browser or client. Each line is in an extended version of the so-called 'Common "+ \
-        "Log Format' used by many web servers and web reporting tools")
+        "Log Format' used by many web servers and web reporting tools"))
         #sample log:
         #$ head /var/log/cups/access_log
         #localhost - - [12/Jul/2014:06:52:52 -0700] "POST / HTTP/1.1" 401 186 Renew-Subscription successful-ok
@@ -989,13 +4363,10 @@ def readLogs( customRootDir="" ):
         #localhost - - [12/Jul/2014:07:06:52 -0700] "POST / HTTP/1.1" 401 186 Renew-Subscription successful-ok
         #localhost - carlos [12/Jul/2014:07:06:52 -0700] "POST / HTTP/1.1" 200 186 Renew-Subscription successful-ok
     
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
 
 
-    logReader = LogReaderStdParser(
-        "user log", filepath_user, "Contains information about all user level logs")
+    logReaders.append( LogReaderStdParser(
+        "user log", filepath_user, "Contains information about all user level logs"))
         #sample log:
         #$ head /var/log/cups/access_log
         #Jul 20 12:23:50 SpiderMan mtp-probe: bus: 3, device: 8 was not an MTP device
@@ -1003,16 +4374,13 @@ def readLogs( customRootDir="" ):
         #Jul 22 18:53:07 SpiderMan mtp-probe: checking bus 3, device 6: "/sys/devices/pci0000:00/0000:00:14.0/usb3/3-9/3-9.1"
         #Jul 22 18:53:12 SpiderMan pulseaudio[1845]: [pulseaudio] pid.c: Daemon already running.
     
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
 
 
-    logReader = LogReader_UTMP_WTMP_Parser(
+    logReaders.append( LogReader_UTMP_WTMP_Parser(
         "utmp & wtmp logs", filepath_utmp_wtmp, "The /var/run/utmp file will give you " +\
         "complete picture of users logins at which terminals, logouts, system events and " +\
         "current status of the system, system boot time (used by uptime) etc. Use 'last " +
-        "\-f /var/run/utmp' to view contents. The /var/log/wtmp gives historical data of utmp ")
+        "\-f /var/run/utmp' to view contents. The /var/log/wtmp gives historical data of utmp "))
         #sampel log:
         #$ last -f /var/log/wtmp
         #
@@ -1024,33 +4392,740 @@ def readLogs( customRootDir="" ):
         #
         #wtmp begins Wed Jul  2 23:30:12 2014 """
 
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
 
 
-    logReader = LogReader_BTMP_Parser(
+    logReaders.append( LogReader_BTMP_Parser(
         "btmp log", filepath_btmp, "The /var/log/btmp records only failed login attempts. " +\
         "Use 'last -f /var/log/btmp' to view contents. Use 'last -f /var/log/btmp' to view " +\
         "contents. Note: there may be more logs in this family, so use a pattern of last  " +\
-        "-f /var/log/btmp* to select them.")
-    
-    #deallocate/release memory that we do not need anymore
-    logReader = 0
-    gc.collect()
+        "-f /var/log/btmp* to select them."))
+
+
+    logReaders.append( LogReader_JOURNAL_Parser(
+        "journal log", filepath_journal, "The systemd journal keeps the messages of the kernel, of the boot " +\
+        "process, of every systemd unit and of syslog in binary files (/var/log/journal/<machine-id>/*.journal). " +\
+        "Use 'journalctl' to view contents."))
+        #sample log:
+        #$ journalctl -o short-iso
+        #2014-07-22T18:53:07+0000 SpiderMan systemd[1]: Started OpenBSD Secure Shell server.
+        #2014-07-22T20:04:11+0000 SpiderMan sshd[1021]: Failed password for root from 10.0.0.5 port 22 ssh2
 
 
-def databaseReset():
+    logReaders.append( LogReader_AUDIT_Parser(
+        "audit log", filepath_audit, "The Linux audit framework (auditd) records system calls, command executions, " +\
+        "file accesses, logins and policy changes selected by the audit rules, one event being several records " +\
+        "(SYSCALL, EXECVE, CWD, PATH, PROCTITLE...). Use 'ausearch -i' to view contents."))
+        #sample log:
+        #$ head /var/log/audit/audit.log
+        #type=SYSCALL msg=audit(1364481363.243:24287): arch=c000003e syscall=59 success=yes exit=0 a0=... ppid=2686 pid=3538 auid=1000 uid=0 comm="cat" exe="/usr/bin/cat" key="shadow"
+        #type=EXECVE msg=audit(1364481363.243:24287): argc=2 a0="cat" a1="/etc/shadow"
+        #type=CWD msg=audit(1364481363.243:24287): cwd="/root"
+        #type=PROCTITLE msg=audit(1364481363.243:24287): proctitle=636174002F6574632F736861646F77
+        #type=EOE msg=audit(1364481363.243:24287):
+
+    return logReaders
+
+
+def imageHostName( customRootDir="" ):
+    """Returns the host/image ID used to tag the logs read from a root directory: the hostname recorded in the image's
+    /etc/hostname, or the name of the directory itself. The live host's name is used when no root directory is given.
+    @param: string - the argument passed-in by the '--rootDir' option
+    @return: string - host/image ID"""
+    if customRootDir == "":
+        import socket
+        return socket.gethostname()
+    try:
+        with open(os.path.join(customRootDir, "etc", "hostname")) as file_object:
+            host = file_object.readline().strip()
+            if host != "":
+                return host
+    except Exception as e:
+        pass
+    return os.path.basename(os.path.normpath(customRootDir))
+
+
+def parseRootDirArgument( rootDir ):
+    """Splits a '--rootDir' argument of the form 'HOST=newRootDir' or 'newRootDir' into the host/image ID and the root directory
+    @param: string - the argument passed-in by the '--rootDir' option
+    @return: tuple - (host/image ID, root directory)"""
+    if( "=" in rootDir and not os.path.isdir(rootDir) ):
+        return tuple(rootDir.split("=", 1))
+    return imageHostName(rootDir), rootDir
+
+
+def readLogs( customRootDir="", db=None, host=None ):
+    """Parses every log family and stores its events in the database
+    @param: string - the argument passed-in by the '--rootDir' option which will be the common way for Forensic Investigators to use this script
+    @param: dbLogs - the database to store the events in, 'LinuxLogs.db' in the current directory by default
+    @param: string - the host/image ID to tag the logs with, see imageHostName() for the default"""
+    if db is None:
+        db = dbLogs()
+    if host is None:
+        host = imageHostName( customRootDir )
+
+    readers = logReaders( customRootDir )
+    db.beginIngest( [host], len(readers) )
+    try:
+        for logReader in readers:
+            logReader.saveEventsToDB( db, host )
+    except:
+        db.finishIngest( "failed" )
+        raise
+    db.finishIngest()
+
+
+def parseLogFamily( task ):
+    """Worker of readImages(): parses one log family of one image in a separate process
+    @param: tuple - (image index, root directory, reader index)
+    @return: tuple - the task, the list of parsed events, the login sessions (for the wtmp reader) and the SourceFile of every file read"""
+    imageIndex, customRootDir, readerIndex = task
+    reader = logReaders( customRootDir )[readerIndex]
+    events = reader.readEvents()
+    return task, events, getattr( reader, "sessions", None ), reader.sourceFiles
+
+
+def readImages( images, db, processes=None ):
+    """Parses several disk images side by side and appends their events to the database, every log tagged with the
+    host/image ID it was read from. Log families are parsed in parallel by a pool of processes while this process
+    does all the database writes, publishing every log family as soon as it is saved (see '--progress'). Logs previously
+    ingested for the same host/image are replaced.
+    @param: list - (host/image ID, root directory) tuples
+    @param: dbLogs - the database to store the events in
+    @param: int - number of parser processes, the number of CPUs by default"""
+    import multiprocessing
+
+    for host, customRootDir in images:
+        db.deleteHost( host )
+
+    readers = [logReaders( customRootDir ) for host, customRootDir in images]
+    tasks = [(imageIndex, customRootDir, readerIndex) for imageIndex, (host, customRootDir) in enumerate(images)
+                                                     for readerIndex in range(len(readers[imageIndex]))]
+    db.beginIngest( [host for host, customRootDir in images], len(tasks) )
+    pool = multiprocessing.Pool( processes )
+    try:
+        for (imageIndex, customRootDir, readerIndex), events, sessions, sourceFiles in pool.imap( parseLogFamily, tasks ):
+            if sessions is not None:
+                readers[imageIndex][readerIndex].sessions = sessions
+            readers[imageIndex][readerIndex].sourceFiles = sourceFiles
+            readers[imageIndex][readerIndex].saveEventsToDB( db, images[imageIndex][0], events )
+    except:
+        db.finishIngest( "failed" )
+        raise
+    finally:
+        pool.close()
+        pool.join()
+    db.finishIngest()
+
+
+def writeSegment( images, path, processes=None ):
+    """Parses the log families of several images (in parallel, as readImages() does) into a segment file instead of the
+    database, to be loaded into a central database by dbLogs.mergeSegment(). A segment is a gzip compressed JSON lines
+    file: a header line, then for every log family a line with its LOGS metadata (host, name, file, description, event
+    count, min/max date/time, the wtmp login sessions and the provenance of the files read) followed by its events in
+    time order, one [microseconds since 1970-01-01, description, file index, byte offset] array per line (descriptions
+    are byte strings read as latin-1, the file index and offset are null when not known), and a last line with the
+    event count, min/max date/time and SHA-256 of every line before it.
+    @param: list - (host/image ID, root directory) tuples
+    @param: string - path of the segment file
+    @param: int - number of parser processes, the number of CPUs by default
+    @return: int - number of events written"""
+    import gzip
+    import hashlib
+    import json
+    import multiprocessing
+
+    readers = [logReaders( customRootDir ) for host, customRootDir in images]
+    tasks = [(imageIndex, customRootDir, readerIndex) for imageIndex, (host, customRootDir) in enumerate(images)
+                                                     for readerIndex in range(len(readers[imageIndex]))]
+    digest = hashlib.sha256()
+    c = 0
+    minMicros = maxMicros = None
+
+    def dt(value):
+        return None if value is None else str(value)
+
+    temporary = path + ".tmp"
+    pool = multiprocessing.Pool( processes )
+    try:
+        with gzip.open(temporary, "wb") as segment:
+            def write(line):
+                digest.update(line)
+                segment.write(line)
+            write(json.dumps({"segment": {"version": 1, "created": str(datetime.datetime.now())[:19],
+                                          "hosts": [host for host, customRootDir in images]}}) + "\n")
+            for (imageIndex, customRootDir, readerIndex), events, sessions, sourceFiles in pool.imap( parseLogFamily, tasks ):
+                reader = readers[imageIndex][readerIndex]
+                first = None if len(events) == 0 else EventBuffer.EPOCH + datetime.timedelta(microseconds=events.micros[0])
+                last = None if len(events) == 0 else EventBuffer.EPOCH + datetime.timedelta(microseconds=events.micros[-1])
+                write(json.dumps({"log": {"host": images[imageIndex][0], "log_name": reader.logName, "log_file": reader.logLocationAbsolutePath,
+                                          "log_description": reader.logDescription, "events": len(events),
+                                          "min_datetime": dt(first), "max_datetime": dt(last),
+                                          "sessions": None if sessions is None else [[dt(value) if isinstance(value, datetime.datetime) else value
+                                                                                      for value in session] for session in sessions],
+                                          "files": [None if source is None else {"path": source.path, "size": source.size, "mtime": source.mtime,
+                                                                                 "inode": source.inode, "digests": source.digests}
+                                                    for source in sourceFiles]}}) + "\n")
+                for i in xrange(len(events)):
+                    micros = events.micros[i]
+                    fileIndex, offset = events.source(i)
+                    write(json.dumps([micros, str(events.descriptions[events.offsets[i]:events.offsets[i + 1]]).decode("latin-1"),
+                                      fileIndex, offset]) + "\n")
+                c += len(events)
+                if len(events):
+                    minMicros = events.micros[0] if minMicros is None else min(minMicros, events.micros[0])
+                    maxMicros = events.micros[-1] if maxMicros is None else max(maxMicros, events.micros[-1])
+            toDateTime = lambda micros: None if micros is None else str(EventBuffer.EPOCH + datetime.timedelta(microseconds=micros))
+            segment.write(json.dumps({"end": {"logs": len(tasks), "events": c, "min_datetime": toDateTime(minMicros),
+                                              "max_datetime": toDateTime(maxMicros), "sha256": digest.hexdigest()}}) + "\n")
+    finally:
+        pool.close()
+        pool.join()
+    os.rename(temporary, path)
+    return c
+
+
+class TimelineRuns(object):
+    """Holds the time-sorted runs produced while building a timeline. Runs are kept in memory while they are small and
+    the largest one is spilled to a temporary file whenever the events held in memory by all runs exceed a budget, so
+    memory stays bounded no matter how big the image is. Only the spilled run being appended to is kept open and the
+    spilled runs are merged at most FAN_IN at a time, so the number of open files does not grow with the number of
+    images, logs and rotated files either."""
+
+    # maximum number of spilled runs merged (and open) at once
+    FAN_IN = 64
+
+    def __init__(self, memoryBudget=200000):
+        """Standard class constructor
+        @param: int - maximum number of events held in memory by all runs together"""
+        self.memoryBudget = memoryBudget
+        self.inMemory = 0
+        # lists of events, or the paths of the spilled runs
+        self.runs = []
+        # (run index, file object) of the spilled run being appended to
+        self.writer = None
+
+
+    def newRun(self):
+        """Starts a new (empty) run and returns its index"""
+        self.runs.append([])
+        return len(self.runs) - 1
+
+
+    def append(self, run, event):
+        """Appends an event to a run, events must be appended in time order
+        @param: int - the run index
+        @param: tuple - (eventDateTime, host, logName, eventDescription)"""
+        import cPickle
+        events = self.runs[run]
+        if isinstance(events, list):
+            events.append(event)
+            self.inMemory += 1
+            if self.inMemory > self.memoryBudget:
+                self.spill(max((index for index, events in enumerate(self.runs) if isinstance(events, list)),
+                               key=lambda index: len(self.runs[index])))
+        else:
+            cPickle.dump(event, self.spillWriter(run), 2)
+
+
+    def spillWriter(self, run):
+        """Returns the file a spilled run is appended to, closing the one of any other run"""
+        if self.writer is not None and self.writer[0] != run:
+            self.writer[1].close()
+            self.writer = None
+        if self.writer is None:
+            self.writer = (run, open(self.runs[run], "ab"))
+        return self.writer[1]
+
+
+    def spill(self, run):
+        """Moves the events of a run from memory to a temporary file"""
+        import cPickle
+        import tempfile
+        descriptor, path = tempfile.mkstemp(prefix="LinuxLogs-timeline-")
+        os.close(descriptor)
+        events = self.runs[run]
+        self.runs[run] = path
+        spillFile = self.spillWriter(run)
+        for event in events:
+            cPickle.dump(event, spillFile, 2)
+        self.inMemory -= len(events)
+
+
+    def readRun(self, events):
+        """Yields the events of a run (a list or the path of a spilled run, which is deleted once read) in time order"""
+        import cPickle
+        if isinstance(events, list):
+            for event in events:
+                yield event
+        else:
+            with open(events, "rb") as spillFile:
+                while True:
+                    try:
+                        yield cPickle.load(spillFile)
+                    except EOFError:
+                        break
+            os.remove(events)
+
+
+    def merge(self):
+        """Yields the events of all runs merged in time order (heap-based k-way merge). While there are more than FAN_IN
+        spilled runs, the oldest FAN_IN are merged into a new spilled run first (multi-pass merge)."""
+        import heapq
+        import cPickle
+        if self.writer is not None:
+            self.writer[1].close()
+            self.writer = None
+        try:
+            spilled = [events for events in self.runs if not isinstance(events, list)]
+            while len(spilled) > self.FAN_IN:
+                group, spilled = spilled[:self.FAN_IN], spilled[self.FAN_IN:]
+                run = self.newRun()
+                self.spill(run)
+                spillFile = self.spillWriter(run)
+                for event in heapq.merge(*[self.readRun(events) for events in group]):
+                    cPickle.dump(event, spillFile, 2)
+                spillFile.close()
+                self.writer = None
+                spilled.append(self.runs[run])
+                self.runs = [events for events in self.runs if events not in group]
+            for event in heapq.merge(*[self.readRun(events) for events in self.runs]):
+                yield event
+        finally:
+            # runs left behind by a merge that was not read to the end
+            for events in self.runs:
+                if not isinstance(events, list) and os.path.exists(events):
+                    os.remove(events)
+
+
+def timelineEvents( images, reorderBuffer=10000, memoryBudget=200000 ):
+    """Reads every log family of every image in a single pass and returns all their events merged in time order, without
+    a database. Each family goes through a bounded reorder buffer (replacement selection): slightly out-of-order lines
+    are put back in order, and events older than what was already written start a new sorted run (i.e. the next
+    rotated file of the family). All runs are then merged with a k-way merge, which brings the duplicates read from
+    archived versions of a log next to each other, where they are dropped: nothing grows with the size of a family.
+    @param: list - (host/image ID, root directory) tuples, use [(imageHostName(), "")] for the live host
+    @param: int - size of the reorder buffer of each log family
+    @param: int - maximum number of events held in memory by the sorted runs, see TimelineRuns
+    @return: iterator - (eventDateTime, host, logName, eventDescription) tuples in time order"""
+    import heapq
+    runs = TimelineRuns(memoryBudget)
+    for host, customRootDir in images:
+        for logReader in logReaders( customRootDir ):
+            heap = []
+            nextRun = []
+            run = runs.newRun()
+            last = None
+            for logID, eventDateTime, eventDescription in logReader:
+                event = (eventDateTime, host, logReader.logName, eventDescription)
+                if last is not None and event < last:
+                    # too late for the current run, keep it for the next one
+                    heapq.heappush(nextRun, event)
+                else:
+                    heapq.heappush(heap, event)
+                if len(heap) + len(nextRun) > reorderBuffer:
+                    if not heap:
+                        heap, nextRun = nextRun, []
+                        run = runs.newRun()
+                    last = heapq.heappop(heap)
+                    runs.append(run, last)
+            while heap or nextRun:
+                if not heap:
+                    heap, nextRun = nextRun, []
+                    run = runs.newRun()
+                runs.append(run, heapq.heappop(heap))
+    return uniqueEvents( runs.merge() )
+
+
+def uniqueEvents( events ):
+    """Drops the repeats of an event from a stream of events merged in time order, where equal events are adjacent
+    @param: iterator - (eventDateTime, host, logName, eventDescription) tuples in time order
+    @return: iterator - the same tuples, each one once"""
+    previous = None
+    for event in events:
+        # archived versions of a log may hold the same events
+        if event != previous:
+            yield event
+        previous = event
+
+
+def writeTimeline( images, output, reorderBuffer=10000, memoryBudget=200000 ):
+    """Writes the unified timeline of the given images to a CSV file, or a JSON lines file when the output name ends with
+    '.jsonl' or '.json'. Nothing is stored in the database.
+    @param: list - (host/image ID, root directory) tuples
+    @param: string - path of the output file, '-' for the standard output
+    @return: int - number of events written"""
+    import csv
+    import json
+    toStdout = (output == "-")
+    stdout = sys.stdout
+    if toStdout:
+        # keep the parsing progress messages out of the timeline
+        sys.stdout = sys.stderr
+    try:
+        events = timelineEvents( images, reorderBuffer, memoryBudget )
+    finally:
+        sys.stdout = stdout
+
+    out = stdout if toStdout else open(output, "wb")
+    c = 0
+    try:
+        if output.endswith(".jsonl") or output.endswith(".json"):
+            for eventDateTime, host, logName, eventDescription in events:
+                c += 1
+                out.write(json.dumps({"event_datetime": str(eventDateTime), "host": host, "log_name": logName,
+                                      "event_description": eventDescription.decode("utf-8", "replace")}) + "\n")
+        else:
+            writer = csv.writer(out)
+            writer.writerow(["event_datetime", "host", "log_name", "event_description"])
+            for eventDateTime, host, logName, eventDescription in events:
+                c += 1
+                writer.writerow([str(eventDateTime), host, logName, eventDescription])
+    finally:
+        if not toStdout:
+            out.close()
+    return c
+
+
+def descriptionProgram( eventDescription ):
+    """Returns the syslog program of an event description, i.e. 'sshd' for 'sshd[2090]: Accepted password for ...' or
+    'web01 sshd[2090]: Accepted password for ...' (syslog descriptions keep the host name), None if the description
+    does not start with one"""
+    return eventDescription.split(":", 1)[0].split("[", 1)[0].rsplit(" ", 1)[-1] if ":" in eventDescription[:64] else None
+
+
+def loadColumns( directory, names ):
+    """Loads columns exported by dbLogs.exportColumns() as NumPy arrays, memory-mapped for .npy files
+    @param: string - the export directory
+    @param: list - column names, i.e. ['event_time', 'log_id']
+    @return: dict - column name -> numpy array"""
+    import numpy
+    columns = {}
+    if os.path.exists(os.path.join(directory, "events.parquet")) or os.path.exists(os.path.join(directory, "events.arrow")):
+        import pyarrow
+        if os.path.exists(os.path.join(directory, "events.parquet")):
+            import pyarrow.parquet
+            table = pyarrow.parquet.read_table(os.path.join(directory, "events.parquet"), columns=names)
+        else:
+            table = pyarrow.ipc.open_file(pyarrow.memory_map(os.path.join(directory, "events.arrow"))).read_all()
+        for name in names:
+            chunks = [chunk.to_numpy() for chunk in table.column(name).chunks]
+            columns[name] = numpy.concatenate(chunks) if chunks else numpy.zeros(0, numpy.int64)
+    else:
+        for name in names:
+            columns[name] = numpy.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+    return columns
+
+
+def timelineAnalytics( directory, binSeconds=1, sigma=4.0, minGap=3600, window=60, top=10 ):
+    """Prints analytics of the events exported by dbLogs.exportColumns(), computed with NumPy on whole columns:
+    the event rate histogram (busiest bins), bursts (runs of bins with more than mean + sigma * standard deviation
+    events, more than twice the median of the bins with events and more than 2 events, since on sparse logs the
+    mean and deviation over mostly empty bins are below one event), gaps (silences of a log of at least minGap seconds)
+    and the cross-log co-occurrence matrix (the number of windows of 'window' seconds in which both logs have events).
+    @param: string - the export directory
+    @param: int - histogram bin width in seconds
+    @param: float - burst threshold in standard deviations above the mean rate
+    @param: int - minimum gap in seconds
+    @param: int - co-occurrence window in seconds
+    @param: int - number of bins, bursts and gaps listed"""
+    import json
+    import numpy
+    columns = loadColumns(directory, ["event_time", "log_id"])
+    eventTimes = numpy.asarray(columns["event_time"], numpy.int64)
+    logIDs = numpy.asarray(columns["log_id"], numpy.int64)
+    with open(os.path.join(directory, "logs.json")) as file_object:
+        logNames = dict((log["id"], "{0}:{1}".format(log["host"], log["log_name"])) for log in json.load(file_object))
+    if len(eventTimes) == 0:
+        print("[*] no events exported in '{0}'".format(directory))
+        return
+    def timeStr(seconds):
+        return str(datetime.datetime.utcfromtimestamp(int(seconds)))
+
+    # event rate histogram, only the bins with events are materialized so years of 1 second bins fit in memory
+    first = eventTimes.min()
+    bins, counts = numpy.unique((eventTimes - first) // binSeconds, return_counts=True)
+    totalBins = bins[-1] + 1
+    print("[*] {0:,} events from {1} to {2}, {3:,} bins of {4} seconds ({5:,} with events)".format(len(eventTimes), timeStr(first),
+          timeStr(eventTimes.max()), totalBins, binSeconds, len(bins)))
+    print("[*] busiest bins")
+    for b in numpy.argsort(counts, kind="mergesort")[::-1][:top]:
+        print("     {0}  {1:>8,} events".format(timeStr(first + bins[b] * binSeconds), counts[b]))
+
+    # bursts: runs of consecutive bins above the threshold, mean and deviation include the empty bins
+    mean = len(eventTimes) / float(totalBins)
+    threshold = mean + sigma * numpy.sqrt(max(0.0, (counts.astype(numpy.float64) ** 2).sum() / totalBins - mean ** 2))
+    threshold = max(threshold, 2 * numpy.median(counts), 2.0)
+    hot = numpy.flatnonzero(counts > threshold)
+    breaks = numpy.flatnonzero(numpy.diff(bins[hot]) != 1) + 1
+    starts = hot[numpy.concatenate(([0], breaks))] if len(hot) else hot
+    ends = hot[numpy.concatenate((breaks - 1, [len(hot) - 1]))] if len(hot) else hot
+    cumulative = numpy.concatenate(([0], numpy.cumsum(counts)))
+    burstEvents = cumulative[ends + 1] - cumulative[starts]
+    print("[*] {0:,} bursts above {1:.1f} events per bin".format(len(starts), threshold))
+    for b in numpy.argsort(burstEvents, kind="mergesort")[::-1][:top]:
+        print("     {0}  {1:>6} seconds  {2:>8,} events".format(timeStr(first + bins[starts[b]] * binSeconds),
+              (bins[ends[b]] - bins[starts[b]] + 1) * binSeconds, burstEvents[b]))
+
+    # gaps: silences of every log
+    order = numpy.lexsort((eventTimes, logIDs))
+    sortedTimes, sortedLogs = eventTimes[order], logIDs[order]
+    silences = numpy.diff(sortedTimes)
+    gaps = numpy.flatnonzero((silences >= minGap) & (sortedLogs[1:] == sortedLogs[:-1]))
+    print("[*] {0:,} gaps of at least {1} seconds".format(len(gaps), minGap))
+    for g in gaps[numpy.argsort(silences[gaps])[::-1][:top]]:
+        print("     {0:<30}  {1} - {2}  ({3} seconds)".format(logNames.get(sortedLogs[g], sortedLogs[g]), timeStr(sortedTimes[g]), timeStr(sortedTimes[g + 1]), silences[g]))
+
+    # co-occurrence: logs x occupied windows presence matrix times its transpose
+    logs, logIndex = numpy.unique(logIDs, return_inverse=True)
+    cells = numpy.unique((eventTimes - first) // window * len(logs) + logIndex)
+    windows, windowIndex = numpy.unique(cells // len(logs), return_inverse=True)
+    presence = numpy.zeros((len(windows), len(logs)), numpy.int32)
+    presence[windowIndex, cells % len(logs)] = 1
+    cooccurrence = presence.T.dot(presence)
+    print("[*] co-occurrence of the logs in {0:,} windows of {1} seconds (diagonal: windows with events of the log)".format(len(windows), window))
+    print("     {0:<30}".format("") + "".join("{0:>8}".format(logID) for logID in logs))
+    for i, logID in enumerate(logs):
+        print("     {0:<30}".format("{0} {1}".format(logID, logNames.get(logID, ""))[:30]) + "".join("{0:>8}".format(n) for n in cooccurrence[i]))
+
+
+def lineAt( reader, file_object, offset ):
+    """Returns the first line with a date/time at or after a byte offset of a raw log file, the partial line at the
+    offset is skipped
+    @return: tuple - (eventDateTime, offset of the line), (None, end of the file) if there is none"""
+    file_object.seek(offset)
+    if offset > 0:
+        file_object.readline()
+    while True:
+        position = file_object.tell()
+        line = file_object.readline()
+        if not line:
+            return None, position
+        decoded = reader.decodeLine(line.rstrip())
+        if decoded is not None:
+            return decoded[0], position
+
+
+def scanLines( reader, file_object, offset, startDateTime, endDateTime ):
+    """Yields the (eventDateTime, eventDescription) of the lines of a raw log file from a byte offset (a line start)
+    on that are within the window, up to the first one after the window"""
+    file_object.seek(offset)
+    for line in file_object:
+        decoded = reader.decodeLine(line.rstrip())
+        if decoded is None:
+            continue
+        if decoded[0] > endDateTime:
+            break
+        if decoded[0] >= startDateTime:
+            yield decoded
+
+
+def bisectFile( reader, path, startDateTime, endDateTime, db, blockSize=65536 ):
+    """Yields the events of a plain text log file that are within the window. The file is bisected by byte offset
+    down to blockSize bytes, which reads a few dozen blocks however big the file is, and pruned without reading it
+    when its zone map (first and last date/time, saved in the database) does not overlap the window."""
+    with open(path, "rb") as file_object:
+        index = db.fileIndex(path)
+        if index is None:
+            firstDateTime = lineAt(reader, file_object, 0)[0]
+            lastDateTime = None
+            tail = max(0, os.path.getsize(path) - blockSize)
+            while lastDateTime is None and firstDateTime is not None:
+                file_object.seek(tail)
+                if tail > 0:
+                    file_object.readline()
+                for line in file_object:
+                    decoded = reader.decodeLine(line.rstrip())
+                    if decoded is not None:
+                        lastDateTime = decoded[0]
+                tail = max(0, tail - blockSize)
+            db.saveFileIndex(path, firstDateTime, lastDateTime)
+            index = db.fileIndex(path) or (None, firstDateTime and str(firstDateTime), lastDateTime and str(lastDateTime))
+        if index[1] is None or index[1] > str(endDateTime) or index[2] < str(startDateTime):
+            return
+
+        low, high = 0, os.path.getsize(path)
+        while high - low > blockSize:
+            middle = (low + high) // 2
+            eventDateTime, position = lineAt(reader, file_object, middle)
+            if eventDateTime is None or eventDateTime >= startDateTime:
+                high = middle
+            else:
+                low = middle
+        if low > 0:
+            file_object.seek(low)
+            file_object.readline()
+            low = file_object.tell()
+        for event in scanLines(reader, file_object, low, startDateTime, endDateTime):
+            yield event
+
+
+def chunkEvents( reader, lines, lowDateTime, highDateTime, startDateTime, endDateTime ):
+    """Yields the (eventDateTime, eventDescription) of the lines within the window, if the date/times of the lines
+    around them (None when unknown) show they may be"""
+    if (lowDateTime is None or lowDateTime <= endDateTime) and (highDateTime is None or highDateTime >= startDateTime):
+        for line in lines:
+            decoded = reader.decodeLine(line.rstrip())
+            if decoded is not None and startDateTime <= decoded[0] <= endDateTime:
+                yield decoded
+
+
+def scanGzipFile( reader, path, startDateTime, endDateTime, db, nextDateTime=None, pointEvery=1048576 ):
+    """Yields the events of a gzip archived log file that are within the window. Archives cannot be bisected, so the
+    first query that needs an archive reads all of it and saves its zone map and a sparse index (the date/time of a
+    line every pointEvery uncompressed bytes). Later queries skip archives outside the window and start decompressing
+    at the last indexed line before it. Archives not indexed yet are skipped when their first line is after the window
+    or the first line of the next (newer) file of the log is before it, and after the first line of the archive."""
+    import gzip
+    index = db.fileIndex(path)
+    file_object = gzip.open(path, "rb")
+    try:
+        if index is None:
+            firstDateTime = lineAt(reader, file_object, 0)[0]
+            if firstDateTime is None or firstDateTime > endDateTime:
+                return
+            # the next file only bounds this archive when it really starts after it
+            if nextDateTime is not None and firstDateTime < nextDateTime < startDateTime:
+                return
+            file_object.rewind()
+            # only the first line after every index point is decoded, the lines in between are decoded when
+            # the index points around them show they may be within the window
+            points = []
+            chunk = []
+            chunkDateTime = None
+            offset = nextPoint = 0
+            for line in file_object:
+                if offset >= nextPoint:
+                    decoded = reader.decodeLine(line.rstrip())
+                    if decoded is not None:
+                        for event in chunkEvents(reader, chunk, chunkDateTime, decoded[0], startDateTime, endDateTime):
+                            yield event
+                        chunk = []
+                        chunkDateTime = decoded[0]
+                        points.append((offset, decoded[0]))
+                        nextPoint = offset + pointEvery
+                chunk.append(line)
+                offset += len(line)
+            for event in chunkEvents(reader, chunk, chunkDateTime, None, startDateTime, endDateTime):
+                yield event
+            lastDateTime = None
+            for line in reversed(chunk):
+                decoded = reader.decodeLine(line.rstrip())
+                if decoded is not None:
+                    lastDateTime = decoded[0]
+                    break
+            db.saveFileIndex(path, points[0][1] if points else None, lastDateTime, points)
+            return
+        fileID, firstDateTime, lastDateTime = index
+        if firstDateTime is None or firstDateTime > str(endDateTime) or lastDateTime < str(startDateTime):
+            return
+        for event in scanLines(reader, file_object, db.fileIndexOffset(fileID, startDateTime), startDateTime, endDateTime):
+            yield event
+    finally:
+        file_object.close()
+
+
+def rotationOrder( basePath, path ):
+    """Sort key that puts the files of a log in rotation order, oldest first: the highest numbered archive
+    (auth.log.3.gz), down to auth.log.1, then the live file. The mtimes of extracted or copied files do not follow
+    rotation, so they are not used. Files with other suffixes (e.g. dateext's auth.log-20260301.gz) go first, by name.
+    @param: string - The path of the live file of the log
+    @param: string - The path of one of its files
+    @return: tuple - the sort key"""
+    suffix = path[len(basePath):]
+    if not suffix:
+        return (2, 0, "")
+    match = re.match(r"^\.(\d+)(\.gz)?$", suffix)
+    if match:
+        return (1, -int(match.group(1)), "")
+    return (0, 0, suffix)
+
+
+def directQueryEvents( images, startDateTime, endDateTime, db ):
+    """Yields the events of the raw log files of the given images that are within the window, merged in time order,
+    without ingesting anything. Only the logs whose files are in time order with absolute dates (BISECTABLE readers)
+    are searched.
+    @param: list - (host/image ID, root directory) tuples
+    @param: datetime - Start date/time of the window
+    @param: datetime - End date/time of the window
+    @param: dbLogs - the database holding the file indexes
+    @return: iterator - (eventDateTime, host, logName, eventDescription) tuples"""
+    import heapq
+    import gzip
+
+    def fileEvents(reader, host, path, nextPath):
+        if path.endswith(".gz"):
+            nextDateTime = None
+            if nextPath is not None:
+                # the events of an archive are older than the ones of the next file of the log
+                with (gzip.open(nextPath, "rb") if nextPath.endswith(".gz") else open(nextPath, "rb")) as file_object:
+                    nextDateTime = lineAt(reader, file_object, 0)[0]
+            events = scanGzipFile(reader, path, startDateTime, endDateTime, db, nextDateTime)
+        else:
+            events = bisectFile(reader, path, startDateTime, endDateTime, db)
+        for eventDateTime, eventDescription in events:
+            yield eventDateTime, host, reader.getLogName(), eventDescription
+
+    streams = []
+    for host, customRootDir in images:
+        for reader in logReaders( customRootDir ):
+            if reader.BISECTABLE:
+                basePath = reader.logLocationAbsolutePath
+                paths = [path for path in sorted(glob.glob(basePath+"*"), key=lambda path: rotationOrder(basePath, path)) if os.path.isfile(path)]
+                for path, nextPath in zip(paths, paths[1:] + [None]):
+                    streams.append(fileEvents(reader, host, path, nextPath))
+    for event in uniqueEvents( heapq.merge(*streams) ):
+        yield event
+
+
+def scanEventRange( task, database=None ):
+    """Worker of dbLogs.queryEventsRegex(): searches one id range of one partition on its own connection
+    @param: tuple - (database path, partition, first id, last id, pattern, hosts, logIDs, start, end, generation)
+    @param: dbLogs - the database to search instead of opening the path, optional
+    @return: list - the matching rows in time order"""
+    path, name, firstID, lastID, pattern, hosts, logIDs, start, end, generation = task
+    db = dbLogs( path ) if database is None else database
+    try:
+        hostStr, params = db.hostFilter(hosts)
+        queryStr = "SELECT E.event_datetime, E.id, LOGS.id, LOGS.host, LOGS.log_name, DESCRIPTION(E.template_id, E.params, E.event_description) " +\
+                   "FROM LOGS, {0} E WHERE LOGS.id = E.fk_logid AND E.id BETWEEN ? AND ? ".format(name) + hostStr
+        # logs read before log families were published have no generation
+        queryStr += "AND COALESCE(LOGS.generation, 0) <= ? "
+        params = [firstID, lastID] + params + [generation]
+        if logIDs:
+            queryStr += "AND E.fk_logid IN ({0}) ".format(", ".join("?" * len(logIDs)))
+            params += list(logIDs)
+        if start is not None:
+            queryStr += "AND E.event_datetime >= ? "
+            params.append(start)
+        if end is not None:
+            queryStr += "AND E.event_datetime <= ? "
+            params.append(end)
+        # the regular expression goes last so it only runs on the rows the other filters kept
+        queryStr += "AND DESCRIPTION(E.template_id, E.params, E.event_description) REGEXP ? ORDER BY E.event_datetime, E.id;"
+        return db.connection.execute(queryStr, params + [pattern]).fetchall()
+    finally:
+        if database is None:
+            db.close()
+
+
+def databaseReset( db ):
     """
     This function will cause the database to be wiped out, tables and indicies dropped, recreated and reset to a clean slate
+    @param: dbLogs - the database to reset
     """
     db.dropDBitems()
     db.createDBitems()
 
 
+# the public name of the database object for tools that embed the engine, i.e. 'LinuxLogs.Database("/cases/host1.db")'
+Database = dbLogs
+
+
 def main(argv):
     """Main's responsibility to accepts to parse arguments and carry-out user's choices."""
 
+    import argparse
+
     # reference: https://docs.python.org/2/howto/argparse.html
     parser = argparse.ArgumentParser(description='Linux System Logs Analysis for Digital Forensics by Carlos Villegas')
     parser.add_argument("--resetDB",              help="Causes database to be wiped and logs to be re-read.",  action='store_true') #optional
@@ -1059,30 +5134,152 @@ def main(argv):
     parser.add_argument("--query",                help="Searches the 'LinuxLogs.db' database for all events within +/- window of N seconds "+\
                                                        "from a specific date/tiem. The'dateTimeStr' should be of this format 'YYYY-MM-DD hh:mm:ss, N' "+\
                                                        "with quotes. For example: '2014-02-19 19:07:05, 3' to list all events across all logs in "+\
-                                                       "the database in between '2014-02-19 19:07:02' and '2014-02-19 19:07:08' (inclusive).", \
+                                                       "the database in between '2014-02-19 19:07:02' and '2014-02-19 19:07:08' (inclusive). The login sessions "+\
+                                                       "(wtmp) overlapping the window are listed too, use N=0 to see who was logged in at that time.", \
                                                        type=str, metavar="dateTimeStr")  #optional w/argument
+    parser.add_argument("--direct",               help="Runs --query against the raw log files of --rootDir (or of this host) instead of 'LinuxLogs.db', " +\
+                                                       "nothing is ingested. Text logs are bisected by byte offset, gzip archives are pruned and " +\
+                                                       "entered through a sparse index saved in 'LinuxLogs.db' by the first query.", action='store_true')  #optional
     parser.add_argument("--logs",                 help="Lists all LogIDs and associated LogNames stored in 'LinuxLogs.db'", action='store_true')  #optional
     parser.add_argument("--rootDir",              help="Intended audience: Forensics Investigators. Use this when you have extracted a Linux " +\
                                                        "disk image to a directory of your choice. An absolute path that you have read permissions " +\
-                                                       "must be given.  WARNING: this will cause the 'LinuxLogs.db' database to be wiped and logs " +\
-                                                       "to be re-read within the new root directory. For example: if you extracted the disk image " +\
+                                                       "must be given. The logs are added to the 'LinuxLogs.db' database tagged with the host/image " +\
+                                                       "ID (read from the image's /etc/hostname, or the directory name, or given as 'HOST=newRootDir'), " +\
+                                                       "replacing logs previously read for the same host/image only. Repeat the option to read " +\
+                                                       "several images in parallel. For example: if you extracted the disk image " +\
                                                        "to a subdirectory inside your home directory called 'forensicTree', then you should use " +\
                                                        "'/home/yourname/forensicsTree'", \
-                                                       type=str, metavar="newRootDir")  #optional w/argument
+                                                       type=str, metavar="newRootDir", action='append')  #optional w/argument
+    parser.add_argument("--db",                   help="The SQLite database file to use instead of 'LinuxLogs.db' in the current directory, " +\
+                                                       "i.e. one file per case or a file on fast local storage", type=str, metavar="PATH")  #optional w/argument
+    parser.add_argument("--memory",               help="Works on an in-memory database: the --db file (if it exists) is loaded into RAM first, " +\
+                                                       "and written back with a snapshot at the end if anything changed", action='store_true')  #optional
+    parser.add_argument("--snapshot",             help="Writes a consistent copy of the database to a file (through the SQLite online backup API " +\
+                                                       "or VACUUM INTO) once everything else is done", type=str, metavar="PATH")  #optional w/argument
+    parser.add_argument("--snapshotEvery",        help="Also writes the snapshot (--snapshot, or the --db file with --memory) every N seconds " +\
+                                                       "while logs are read", type=int, metavar="N")  #optional w/argument
+    parser.add_argument("--prefetch",             help="Number of 1 MB blocks of log files read ahead of the parser by a background thread while " +\
+                                                       "logs are read (4 by default). Read further ahead on slow or network storage, 0 reads without " +\
+                                                       "a background thread.", type=int, metavar="N")  #optional w/argument
+    parser.add_argument("--host",                 help="Restricts --query, --stringMatch, --regex, --contents, --summary, --pivot and --sources to the events of one host/image ID. " +\
+                                                       "Repeat the option to select several hosts, results are merged in time order.", \
+                                                       type=str, metavar="hostID", action='append')  #optional w/argument
     parser.add_argument("--stringMatch",          help="Searches the 'LinuxLogs.db' database for all events that contain a string within their "+\
                                                        "description. Use 'root' if, for example, you want to search for all events that contain "+\
                                                        "'root' anywhere within their event description field.", \
                                                        type=str, metavar="descriptionStr")  #optional w/argument
+    parser.add_argument("--regex",                help="Searches the 'LinuxLogs.db' database for all events whose description matches a (Python) " +\
+                                                       "regular expression, i.e. 'Accepted (password|publickey) for \\w+ from 10\\.'. The search " +\
+                                                       "runs in parallel on every CPU, narrow it with --host, --logID, --since and --until.", \
+                                                       type=str, metavar="pattern")  #optional w/argument
+    parser.add_argument("--context",              help="Also prints the K events of the same log before and after every event found by --stringMatch " +\
+                                                       "or --regex, like 'grep -C K'. Matches are marked with '*', overlapping contexts are merged", \
+                                                       type=int, metavar="K", default=0)  #optional w/argument
+    parser.add_argument("--logID",                help="Restricts --regex and --summary to the events of one LogID (see --logs), repeat the option to select several", \
+                                                       type=int, metavar="logID", action='append')  #optional w/argument
+    parser.add_argument("--since",                help="Restricts --regex, --summary and --pivot to the events at or after a date/time of the format 'YYYY-MM-DD hh:mm:ss'", \
+                                                       type=str, metavar="dateTimeStr")  #optional w/argument
+    parser.add_argument("--until",                help="Restricts --regex, --summary and --pivot to the events at or before a date/time of the format 'YYYY-MM-DD hh:mm:ss'", \
+                                                       type=str, metavar="dateTimeStr")  #optional w/argument
+
+    parser.add_argument("--summary",              help="Prints the top values and the number of distinct values of a field of the events (program, ip, " +\
+                                                       "user or failed_user) with error bounds, from the hourly sketches kept while logs are read. " +\
+                                                       "Combine with --host, --logID, --since and --until", \
+                                                       type=str, metavar="field", choices=FieldSketch.FIELDS)  #optional w/argument
+    parser.add_argument("--top",                  help="Number of top values printed by --summary, and of related entities printed by --pivot " +\
+                                                       "per expansion step (20 by default)", type=int, metavar="N", default=20)  #optional w/argument
+    parser.add_argument("--pivot",                help="Prints every event that involves an entity (an IP address, user, process, file path or dpkg " +\
+                                                       "package), i.e. '10.0.0.5', 'user=carlos', 'sshd[2090]' or 'path=/etc/shadow', read from " +\
+                                                       "the entity index built while logs are read (no substring matches), then the related entities. " +\
+                                                       "Combine with --host, --since and --until", type=str, metavar="entity")  #optional w/argument
+    parser.add_argument("--hops",                 help="Number of expansion steps of the entities related to --pivot, i.e. 2 for IP address -> " +\
+                                                       "users -> other IP addresses (1 by default, 0 for none)", type=int, metavar="N", default=1)  #optional w/argument
+    parser.add_argument("--templates",            help="Groups the events of 'LinuxLogs.db' by message template (i.e. 'CRON[<*>]: (root) CMD <*>') " +\
+                                                       "and lists the most frequent templates along with their number of events", action='store_true')  #optional
+    parser.add_argument("--rareTemplates",        help="Lists the rare message templates of 'LinuxLogs.db', those seen at most N times, along with " +\
+                                                       "all their events. Rare messages stand out among thousands of routine ones.", \
+                                                       type=int, metavar="N")  #optional w/argument
+    parser.add_argument("--rules",                help="Saliency rules (a JSON list of threshold, sequence and timeOfDay rules, see the SaliencyEngine " +\
+                                                       "class) evaluated on every event while logs are read. The built-in rules (failed login bursts, " +\
+                                                       "sudo after an authentication failure, dpkg installs outside business hours) are used by default.", \
+                                                       type=str, metavar="rulesFile")  #optional w/argument
+    parser.add_argument("--alertsFile",           help="Appends the alerts raised while logs are read to a JSON lines file, on top of the ALERTS table " +\
+                                                       "and the standard output", type=str, metavar="alertsFile")  #optional w/argument
+    parser.add_argument("--alerts",               help="Lists the alerts raised by the saliency rules stored in 'LinuxLogs.db'", action='store_true')  #optional
+    parser.add_argument("--progress",             help="Lists the ingestions of 'LinuxLogs.db' with the number of log families and events published so far. " +\
+                                                       "Queries run while logs are being read see the log families published when they start.", action='store_true')  #optional
+    parser.add_argument("--sources",              help="Lists the files the logs of 'LinuxLogs.db' were read from (of the --host hosts/images, or all) " +\
+                                                       "with their size, mtime, inode and the SHA-256 of their raw bytes (compressed bytes for .gz " +\
+                                                       "files) computed while they were read. Every event is linked to its file and byte offset.", action='store_true')  #optional
+    parser.add_argument("--md5",                  help="Also computes the MD5 of every file read, along with its SHA-256 (see --sources)", action='store_true')  #optional
+    parser.add_argument("--timeline",             help="Writes one unified timeline of every log of the --rootDir image(s), or of this host when no " +\
+                                                       "--rootDir is given, to a CSV file (or JSON lines when the file name ends with '.jsonl'). " +\
+                                                       "Use '-' for the standard output. The 'LinuxLogs.db' database is not used.", \
+                                                       type=str, metavar="outputFile")  #optional w/argument
+    parser.add_argument("--segment",              help="Parses the logs of the --rootDir image(s), or of this host, into a compressed segment file " +\
+                                                       "instead of 'LinuxLogs.db', i.e. on every collection node, to be loaded centrally with --merge", \
+                                                       type=str, metavar="FILE")  #optional w/argument
+    parser.add_argument("--merge",                help="Loads segment files written by --segment into 'LinuxLogs.db' without parsing the logs again. " +\
+                                                       "Segments already merged are skipped, as are the events already stored for the same host and log", \
+                                                       type=str, metavar="FILE", nargs='+')  #optional w/argument
+    parser.add_argument("--export",               help="Exports the events of 'LinuxLogs.db' (of the --host hosts/images, or all) in time order as " +\
+                                                       "columns to a directory: Parquet when pyarrow is installed, one NumPy .npy file per column " +\
+                                                       "otherwise", type=str, metavar="directory")  #optional w/argument
+    parser.add_argument("--analyze",              help="Prints the event rate histogram, bursts, gaps of every log and the cross-log co-occurrence " +\
+                                                       "matrix of the events exported with --export to a directory (NumPy required)", \
+                                                       type=str, metavar="directory")  #optional w/argument
+    parser.add_argument("--binSeconds",           help="Width of the event rate histogram bins of --analyze in seconds, 1 by default", \
+                                                       type=int, metavar="N")  #optional w/argument
+    parser.add_argument("--sigma",                help="Burst threshold of --analyze in standard deviations above the mean rate, 4 by default", \
+                                                       type=float, metavar="N")  #optional w/argument
+    parser.add_argument("--retention",            help="Retention policy: keep only the newest N months of events in 'LinuxLogs.db'. Events are "+\
+                                                       "stored in one partition per month, so older months are dropped whole. For example: "+\
+                                                       "'--retention 12' keeps one year worth of events.", \
+                                                       type=int, metavar="N")  #optional w/argument
 
     try:
         args=parser.parse_args()
     except Exception, e:
         pass
 
+    if( args.prefetch!=None ):
+        LogReaderStdParser.PREFETCH_DEPTH = max(0, args.prefetch)
+
+    if( args.md5 ):
+        SourceFile.DIGESTS = ("sha256", "md5")
+
+    path = 'LinuxLogs.db' if args.db==None else args.db
+    if( args.memory ):
+        print("[*] memory detected")
+        db = dbLogs(':memory:')
+        if( os.path.exists(path) ):
+            db.loadSnapshot(path)
+    else:
+        db = dbLogs(path) # this instantiates the database object
+    loadedChanges = db.connection.total_changes
+
+    snapshotPath = args.snapshot if args.snapshot!=None else (path if args.memory else None)
+    if( args.snapshotEvery!=None and snapshotPath!=None ):
+        db.snapshotPath = snapshotPath
+        db.snapshotSeconds = args.snapshotEvery
+
+    # saliency rules are evaluated while logs are read
+    try:
+        db.ruleEngine = SaliencyEngine(None if args.rules==None else SaliencyEngine.loadRules(args.rules))
+    except Exception, e:
+        print("Opps! The saliency rules of '{0}' could not be loaded: {1}, please try again.".format(args.rules, e))
+        db.close()
+        return
+    db.ruleEngine.sinks.append(SaliencyEngine.printAlert)
+    if( args.alertsFile!=None ):
+        db.ruleEngine.sinks.append(SaliencyEngine.jsonLinesSink(args.alertsFile))
+
     if( args.resetDB ):
         print("[*] resetDB detected")
-        databaseReset()
-        readLogs()
+        databaseReset(db)
+        readLogs(db=db)
+    else:
+        db.createDBitems()
 
     if( args.logs ):
         print("[*] logs detected")
@@ -1090,7 +5287,7 @@ def main(argv):
 
     if( args.contents!=None ):
         print("[*] contents with LogID={0} detected".format(args.contents))
-        db.displayLogContents(args.contents)
+        db.displayLogContents(args.contents, args.host)
 
     if( args.query!=None ):
         print("[*] query with datetimeStr='{0}' detected".format(args.query))
@@ -1113,32 +5310,150 @@ def main(argv):
                     startOfWindow = parsedDateTime - datetime.timedelta(0, int(splitQueryStr[1]))
                     endOfWindow   = parsedDateTime + datetime.timedelta(0, int(splitQueryStr[1]))
                     print("[*]startOfWindow = '{0}' to endOfWindow = '{1}'".format(str(startOfWindow), str(endOfWindow)))
-                    db.queryEventsDateTimeWindow( startOfWindow, endOfWindow)
+                    if( args.direct ):
+                        images = [(imageHostName(), "")]
+                        if( args.rootDir!=None ):
+                            images = [parseRootDirArgument(rootDir) for rootDir in args.rootDir]
+                        for eventDateTime, host, logName, eventDescription in directQueryEvents( images, startOfWindow, endOfWindow, db ):
+                            print("{0:>3}  {1:<15}  {2:<20}  {3}    {4}".format("-", host, logName, eventDateTime, eventDescription))
+                    else:
+                        db.queryEventsDateTimeWindow( startOfWindow, endOfWindow, args.host)
                 except Exception, e:
                     pass
 
     if( args.stringMatch!=None ):
         print("[*] query with stringMatch='{0}' detected".format(args.stringMatch))
-        db.queryEventsSalientStr( args.stringMatch )
+        db.queryEventsSalientStr( args.stringMatch, args.host, args.context )
+
+    if( args.regex!=None ):
+        print("[*] query with regex='{0}' detected".format(args.regex))
+        try:
+            since = None if args.since==None else datetime.datetime.strptime(args.since, "%Y-%m-%d %H:%M:%S")
+            until = None if args.until==None else datetime.datetime.strptime(args.until, "%Y-%m-%d %H:%M:%S")
+        except Exception, e:
+            print("Opps! --since and --until should be of the format: 'YYYY-MM-DD hh:mm:ss', please try again.")
+        else:
+            db.queryEventsRegex( args.regex, args.host, args.logID, since, until, context=args.context )
+
+    if( args.summary!=None ):
+        print("[*] summary of '{0}' detected".format(args.summary))
+        try:
+            since = None if args.since==None else datetime.datetime.strptime(args.since, "%Y-%m-%d %H:%M:%S")
+            until = None if args.until==None else datetime.datetime.strptime(args.until, "%Y-%m-%d %H:%M:%S")
+        except Exception, e:
+            print("Opps! --since and --until should be of the format: 'YYYY-MM-DD hh:mm:ss', please try again.")
+        else:
+            db.summary( args.summary, args.host, args.logID, since, until, args.top )
+
+    if( args.pivot!=None ):
+        print("[*] pivot on '{0}' detected".format(args.pivot))
+        try:
+            since = None if args.since==None else datetime.datetime.strptime(args.since, "%Y-%m-%d %H:%M:%S")
+            until = None if args.until==None else datetime.datetime.strptime(args.until, "%Y-%m-%d %H:%M:%S")
+        except Exception, e:
+            print("Opps! --since and --until should be of the format: 'YYYY-MM-DD hh:mm:ss', please try again.")
+        else:
+            db.pivot( args.pivot, args.host, since, until, args.hops, args.top )
+
+    if( args.alerts ):
+        print("[*] alerts detected")
+        db.queryAlerts(args.host)
+
+    if( args.progress ):
+        print("[*] progress detected")
+        db.queryIngest()
+
+    if( args.sources ):
+        print("[*] sources detected")
+        db.querySourceFiles(args.host)
+
+    if( args.templates ):
+        print("[*] templates detected")
+        db.queryTemplates(args.host)
+
+    if( args.rareTemplates!=None ):
+        print("[*] rareTemplates with N={0} detected".format(args.rareTemplates))
+        db.queryRareTemplates(args.rareTemplates, args.host)
+
+    if( args.timeline!=None ):
+        images = [(imageHostName(), "")]
+        if( args.rootDir!=None ):
+            images = [parseRootDirArgument(rootDir) for rootDir in args.rootDir]
+        print("[*] timeline detected, writing to '{0}'".format(args.timeline), file=sys.stderr)
+        c = writeTimeline(images, args.timeline)
+        print("[*] wrote {0:,} events to the timeline".format(c), file=sys.stderr)
+
+    elif( args.segment!=None ):
+        images = [(imageHostName(), "")]
+        if( args.rootDir!=None ):
+            images = [parseRootDirArgument(rootDir) for rootDir in args.rootDir]
+        print("[*] segment detected, writing to '{0}'".format(args.segment))
+        c = writeSegment(images, args.segment)
+        print("[*] wrote {0:,} events to the segment".format(c))
+
+    elif( args.rootDir!=None and args.direct==False ):
+        images = []
+        for rootDir in args.rootDir:
+            host, rootDir = parseRootDirArgument(rootDir)
+            print("[*] rootDir detected with '{0}' for host '{1}'".format(rootDir, host))
+            images.append((host, rootDir))
+        readImages(images, db)
+
+    if( args.merge!=None ):
+        print("[*] merge detected with {0} segment(s)".format(len(args.merge)))
+        for path in args.merge:
+            db.mergeSegment(path)
+
+    if( args.export!=None ):
+        print("[*] export detected, writing to '{0}'".format(args.export))
+        c = db.exportColumns(args.export, args.host)
+        print("[*] exported {0:,} events".format(c))
+
+    if( args.analyze!=None ):
+        print("[*] analyze detected, reading '{0}'".format(args.analyze))
+        try:
+            timelineAnalytics(args.analyze, 1 if args.binSeconds==None else max(1, args.binSeconds), 4.0 if args.sigma==None else args.sigma)
+        except ImportError, e:
+            print("Opps! --analyze needs NumPy (and pyarrow for Parquet exports): {0}".format(e))
+
+    if( args.retention!=None ):
+        print("[*] retention with N={0} months detected".format(args.retention))
+        db.applyRetention(args.retention)
 
-    if( args.rootDir!=None):
-        print("[*] rootDir detected with '{0}'".format(args.rootDir))
-        databaseReset()
-        readLogs(args.rootDir)
+    # an in-memory database is written back only if it changed, i.e. not after queries
+    if( args.snapshot!=None or (args.memory and db.connection.total_changes > loadedChanges) ):
+        db.saveSnapshot(snapshotPath)
 
     if( args.resetDB==False and
         args.logs==False and
         args.contents==None and
         args.query==None and
         args.stringMatch==None and
-        args.rootDir==None ):
+        args.regex==None and
+        args.summary==None and
+        args.pivot==None and
+        args.rootDir==None and
+        args.timeline==None and
+        args.segment==None and
+        args.merge==None and
+        args.templates==False and
+        args.alerts==False and
+        args.progress==False and
+        args.sources==False and
+        args.export==None and
+        args.analyze==None and
+        args.rareTemplates==None and
+        args.snapshot==None and
+        args.retention==None ):
         
         print("[*] no options detected. Please type 'LinuxLogs.py --help' for help on how to use this script.\n\nUSER GUIDE:\n\n" +\
               "If you are a Forensic Investigator, \n\n" +\
               "     these are the steps you must to do in the order specified:\n\n" +\
               "     1. Extract all files within a disk image to a subdirectory, for example, extract them to FooBarDir\n\n" +\
               "     2. Have this script read, parse and store logs into the 'LinuxLogs.db' database\n" +\
-              "        use this command:  $python LinuxLogs.py --rootDir 'FooBarDir' \n\n" +\
+              "        use this command:  $python LinuxLogs.py --rootDir 'FooBarDir' \n" +\
+              "        several disk images of a case are read side by side, each tagged with its host/image ID:\n" +\
+              "                           $python LinuxLogs.py --rootDir 'host1=FooBarDir' --rootDir 'host2=BazDir' \n\n" +\
               
               "If you are a Network Security person or System Administrator,\n\n" +\
               "     You must do this step first:\n\n" +\
@@ -1154,7 +5469,34 @@ def main(argv):
               "     C. Query the 'LinuxLogs.db' database for all events accross all logs that occured the within a date/time window'\n" +\
               "        use this command:  $python LinuxLogs.py --query '2014-07-24 17:45:06, 2000' \n\n" +\
               "     D. Quey the 'LinuxLogs.db' database for all events that contain a string of interest within their description field.\n"+\
-              "        use this command:  $python LinuxLogs.py --stringMatch 'chown' \n")
+              "        use this command:  $python LinuxLogs.py --stringMatch 'chown' \n" +\
+              "        or a regular expression:  $python LinuxLogs.py --regex 'Failed password for (invalid user )?\\w+ from' \n" +\
+              "        with the 5 events of the same log before and after every match:  $python LinuxLogs.py --stringMatch 'chown' --context 5 \n\n" +\
+              "     E. Write a unified timeline of every log of an image straight to a CSV (or .jsonl) file, without the database\n" +\
+              "        use this command:  $python LinuxLogs.py --timeline timeline.csv --rootDir 'FooBarDir' \n\n" +\
+              "     F. List the most frequent message templates, or the rare ones (seen at most N times) with their events\n" +\
+              "        use this command:  $python LinuxLogs.py --templates \n" +\
+              "                           $python LinuxLogs.py --rareTemplates 3 \n\n" +\
+              "     G. List the alerts raised by the saliency rules while the logs were read\n" +\
+              "        use this command:  $python LinuxLogs.py --alerts \n\n" +\
+              "     H. Export the events as columns (Parquet or NumPy .npy) and print rate, burst, gap and co-occurrence analytics\n" +\
+              "        use this command:  $python LinuxLogs.py --export exportDir \n" +\
+              "                           $python LinuxLogs.py --analyze exportDir \n" +\
+              "                           $python LinuxLogs.py --analyze exportDir --binSeconds 60 --sigma 3 \n\n" +\
+              "     I. Follow an ingestion in progress (any of the above can run meanwhile, on the log families published so far)\n" +\
+              "        use this command:  $python LinuxLogs.py --progress \n\n" +\
+              "     J. Parse the logs on every collection node into a segment file, then load the segments into one database\n" +\
+              "        use this command:  $python LinuxLogs.py --segment web01.seg --rootDir 'FooBarDir' \n" +\
+              "                           $python LinuxLogs.py --merge web01.seg db01.seg \n\n" +\
+              "     K. Top values and distinct counts of a field (program, ip, user, failed_user), from sketches kept at ingest time\n" +\
+              "        use this command:  $python LinuxLogs.py --summary ip --logID 5 --top 20 \n" +\
+              "                           $python LinuxLogs.py --summary failed_user --since '2014-07-21 00:00:00' \n\n" +\
+              "     L. Pivot on an IP address, user, process, file path or package: its events, then the entities related to it\n" +\
+              "        use this command:  $python LinuxLogs.py --pivot 10.0.0.5 \n" +\
+              "                           $python LinuxLogs.py --pivot user=carlos --hops 2 --top 10 \n\n" +\
+              "     M. List the files the logs were read from with their size, mtime, inode and SHA-256 (add --md5 when reading for MD5 too)\n" +\
+              "        use this command:  $python LinuxLogs.py --sources \n\n" +\
+              "     Add '--host host1' to B, C, D, F, G, H, K, L or M to only see the events of one host/image (repeat it to select several).\n")
 
 
 if __name__ == '__main__':
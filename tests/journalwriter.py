@@ -0,0 +1,157 @@
+"""Writes small systemd journal files for the tests of LogReader_JOURNAL_Parser. Only the objects a reader walks are
+written (data objects, entries and the chain of entry arrays, along with empty hash tables) in either the regular or the
+compact layout, see https://systemd.io/JOURNAL_FILE_FORMAT/. Data objects are stored uncompressed unless their field is
+listed in 'lz4Fields', they are then LZ4 compressed (as literals only, which any LZ4 decoder accepts).
+
+Regenerate the fixtures with:  python tests/journalwriter.py"""
+
+import os
+import struct
+import uuid
+
+
+HEADER_SIZE = 264
+HEADER_COMPATIBLE_NONE = 0
+HEADER_INCOMPATIBLE_COMPACT = 16
+OBJECT_DATA, OBJECT_ENTRY, OBJECT_DATA_HASH_TABLE, OBJECT_FIELD_HASH_TABLE, OBJECT_ENTRY_ARRAY = 1, 3, 4, 5, 6
+OBJECT_COMPRESSED_LZ4 = 2
+STATE_OFFLINE = 0
+
+
+def align(offset):
+    return (offset + 7) & ~7
+
+
+def lz4Literals(data):
+    """Encodes data as a single LZ4 block sequence made of literals only"""
+    length = len(data)
+    if length < 15:
+        return chr(length << 4) + data
+    length -= 15
+    extra = ""
+    while length >= 255:
+        extra += chr(255)
+        length -= 255
+    return chr(15 << 4) + extra + chr(length) + data
+
+
+def fieldHash(payload):
+    """Any 64 bits value will do for the readers, the hash tables are left empty"""
+    return struct.unpack("<Q", uuid.uuid5(uuid.NAMESPACE_OID, payload).bytes[:8])[0]
+
+
+def writeJournal(path, entries, compact=False, lz4Fields=(), entriesPerArray=4):
+    """Writes a journal file
+    @param: string - path of the file
+    @param: list - (realtime in usec, boot ID as 16 bytes, [(field, value)...]) tuples in time order
+    @param: bool - True for the compact layout
+    @param: tuple - names of the fields whose data objects are LZ4 compressed
+    @param: int - capacity of the entry arrays, small to exercise the chain of arrays"""
+    objects = []
+    offset = [HEADER_SIZE]
+
+    def add(objectType, flags, body):
+        start = offset[0]
+        size = 16 + len(body)
+        objects.append((start, struct.pack("<BB6xQ", objectType, flags, size) + body))
+        offset[0] = align(start + size)
+        return start
+
+    dataHashTable = add(OBJECT_DATA_HASH_TABLE, 0, "\0" * 16 * 64) + 16
+    fieldHashTable = add(OBJECT_FIELD_HASH_TABLE, 0, "\0" * 16 * 16) + 16
+
+    # data objects are shared between the entries carrying the same field, the back references are patched below
+    dataObjects = {}
+    references = {}
+    entryOffsets = []
+    for seqnum, (realtime, bootID, fields) in enumerate(entries, 1):
+        items = []
+        for name, value in fields:
+            payload = name + "=" + value
+            if payload not in dataObjects:
+                flags = 0
+                stored = payload
+                if name in lz4Fields:
+                    flags = OBJECT_COMPRESSED_LZ4
+                    stored = struct.pack("<Q", len(payload)) + lz4Literals(payload)
+                # hash, next_hash_offset, next_field_offset, entry_offset, entry_array_offset, n_entries (, tail_entry_array_offset, n)
+                body = struct.pack("<QQQQQQ", fieldHash(payload), 0, 0, 0, 0, 0) + ("\0" * 8 if compact else "") + stored
+                dataObjects[payload] = add(OBJECT_DATA, flags, body)
+            items.append((dataObjects[payload], fieldHash(payload)))
+        xorHash = 0
+        for item in items:
+            xorHash ^= item[1]
+        if compact:
+            packedItems = "".join(struct.pack("<I", item[0]) for item in items)
+        else:
+            packedItems = "".join(struct.pack("<QQ", item[0], item[1]) for item in items)
+        # seqnum, realtime, monotonic, boot_id, xor_hash, items
+        body = struct.pack("<QQQ", seqnum, realtime, seqnum * 1000000) + bootID + struct.pack("<Q", xorHash) + packedItems
+        entryOffset = add(OBJECT_ENTRY, 0, body)
+        entryOffsets.append(entryOffset)
+        for item in items:
+            references.setdefault(item[0], []).append(entryOffset)
+
+    # the chain of entry arrays, the last one is not full
+    itemFormat = "<I" if compact else "<Q"
+    arrays = []
+    for start in range(0, len(entryOffsets), entriesPerArray):
+        chunk = entryOffsets[start:start + entriesPerArray]
+        chunk += [0] * (entriesPerArray - len(chunk))
+        arrays.append(add(OBJECT_ENTRY_ARRAY, 0, struct.pack("<Q", 0) + "".join(struct.pack(itemFormat, o) for o in chunk)))
+    patches = [(array + 16, struct.pack("<Q", nextArray)) for array, nextArray in zip(arrays, arrays[1:])]
+    # a data object points at its first entry, the others are not referenced as no reader here looks them up
+    for dataOffset, entryList in references.items():
+        patches.append((dataOffset + 40, struct.pack("<Q", entryList[0])))
+        patches.append((dataOffset + 56, struct.pack("<Q", 1)))
+
+    fileSize = offset[0]
+    journal = bytearray(fileSize)
+    for start, blob in objects:
+        journal[start:start + len(blob)] = blob
+    for start, blob in patches:
+        journal[start:start + len(blob)] = blob
+
+    fileID, machineID, seqnumID = uuid.uuid4().bytes, uuid.uuid4().bytes, uuid.uuid4().bytes
+    header = "LPKSHHRH"
+    header += struct.pack("<II", HEADER_COMPATIBLE_NONE, HEADER_INCOMPATIBLE_COMPACT if compact else 0)
+    header += struct.pack("<B7x", STATE_OFFLINE)
+    header += fileID + machineID + (entries[-1][1] if entries else "\0" * 16) + seqnumID
+    header += struct.pack("<QQ", HEADER_SIZE, fileSize - HEADER_SIZE)
+    header += struct.pack("<QQQQ", dataHashTable, 16 * 64, fieldHashTable, 16 * 16)
+    header += struct.pack("<QQQ", objects[-1][0], len(objects), len(entryOffsets))
+    header += struct.pack("<QQ", 1 if entries else 0, len(entries))
+    header += struct.pack("<Q", arrays[0] if arrays else 0)
+    header += struct.pack("<QQQ", entries[0][0] if entries else 0, entries[-1][0] if entries else 0, len(entries) * 1000000)
+    header += struct.pack("<QQQQ", len(dataObjects), 0, 0, len(arrays))
+    header += struct.pack("<QQ", 0, 0)
+    header += struct.pack("<II", arrays[-1] if compact and arrays else 0, len(entryOffsets) - (len(arrays) - 1) * entriesPerArray if compact and arrays else 0)
+    assert len(header) == HEADER_SIZE, len(header)
+    journal[0:HEADER_SIZE] = header
+
+    with open(path, "wb") as file_object:
+        file_object.write(journal)
+
+
+# the entries of the fixtures, shared by the tests
+BOOT_ID = "5c1b7a2e9d3f4e10a1b2c3d4e5f60718".decode("hex")
+FIXTURE_ENTRIES = [
+    (1784451600123456, BOOT_ID, [("_PID", "1021"), ("_SYSTEMD_UNIT", "ssh.service"), ("SYSLOG_IDENTIFIER", "sshd"),
+                                 ("MESSAGE", "Failed password for root from 10.0.0.5 port 22 ssh2")]),
+    (1784451601000000, BOOT_ID, [("_PID", "1021"), ("_SYSTEMD_UNIT", "ssh.service"), ("SYSLOG_IDENTIFIER", "sshd"),
+                                 ("MESSAGE", "Accepted password for alice from 10.0.0.6 port 22 ssh2")]),
+    (1784451662500000, BOOT_ID, [("_PID", "1"), ("_SYSTEMD_UNIT", "init.scope"), ("_COMM", "systemd"),
+                                 ("MESSAGE", "Started Daily apt upgrade and clean activities.")]),
+    (1784451700000000, BOOT_ID, [("_PID", "733"), ("_SYSTEMD_UNIT", "cron.service"), ("SYSLOG_IDENTIFIER", "CRON"),
+                                 ("MESSAGE", "pam_unix(cron:session): session opened for user root(uid=0) by (uid=0)")]),
+    (1784451703999999, BOOT_ID, [("_PID", "733"), ("_SYSTEMD_UNIT", "cron.service"), ("SYSLOG_IDENTIFIER", "CRON"),
+                                 ("MESSAGE", "pam_unix(cron:session): session closed for user root")]),
+    (1784451800000000, BOOT_ID, [("_PID", "2048"), ("_COMM", "kernel"),
+                                 ("MESSAGE", "usb 1-1: new high-speed USB device number 2 using ehci-pci")]),
+]
+
+
+if __name__ == "__main__":
+    fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+    writeJournal(os.path.join(fixtures, "regular.journal"), FIXTURE_ENTRIES)
+    writeJournal(os.path.join(fixtures, "compact.journal"), FIXTURE_ENTRIES, compact=True)
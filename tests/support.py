@@ -0,0 +1,26 @@
+"""Shared by the tests: puts LinuxLogs.py on the path and silences the progress the readers print"""
+
+import contextlib
+import os
+import sys
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS, os.pardir))
+
+
+class NullOutput(object):
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+@contextlib.contextmanager
+def quiet():
+    """Discards what is printed within the block"""
+    stdout, sys.stdout = sys.stdout, NullOutput()
+    try:
+        yield
+    finally:
+        sys.stdout = stdout
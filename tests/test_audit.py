@@ -0,0 +1,91 @@
+"""Tests of LogReader_AUDIT_Parser: the records of an audit event are assembled into one event as the log streams by"""
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from support import quiet
+import LinuxLogs
+
+
+AUDIT_LOG = """\
+type=SYSCALL msg=audit(1784451600.243:24287): arch=c000003e syscall=59 success=yes exit=0 a0=55d1 a1=55d2 a2=55d3 a3=0 items=2 ppid=1402 pid=1500 auid=1000 uid=0 gid=0 euid=0 suid=0 fsuid=0 egid=0 sgid=0 fsgid=0 tty=pts0 ses=3 comm="cat" exe="/usr/bin/cat" key="shadow"
+type=EXECVE msg=audit(1784451600.243:24287): argc=2 a0="cat" a1=2F6574632F736861646F77
+type=CWD msg=audit(1784451600.243:24287): cwd="/root"
+type=USER_LOGIN msg=audit(1784451600.250:24288): pid=1021 uid=0 auid=1000 ses=3 msg='op=login id=1000 exe="/usr/sbin/sshd" hostname=? addr=10.0.0.5 terminal=ssh res=success'\x1dUID="root" AUID="alice"
+type=PATH msg=audit(1784451600.243:24287): item=0 name="/usr/bin/cat" inode=1311 dev=fd:00 mode=0100755 ouid=0 ogid=0 rdev=00:00 nametype=NORMAL
+type=PROCTITLE msg=audit(1784451600.243:24287): proctitle=636174002F6574632F736861646F77
+type=EOE msg=audit(1784451600.243:24287):
+type=USER_CMD msg=audit(1784451620.000:24300): pid=1600 uid=1000 auid=1000 ses=3 msg='cwd="/home/alice" cmd=6C73202D6C61 terminal=pts/0 res=success'
+type=SERVICE_START msg=audit(1784451700.500:24301): pid=1 uid=0 auid=4294967295 ses=4294967295 msg='unit=cron comm="systemd" exe="/usr/lib/systemd/systemd" hostname=? addr=? terminal=? res=success'
+garbage line without a stamp
+"""
+
+
+def localDateTime(seconds, millis):
+    """The local date/time of an epoch timestamp, as the readers stamp events"""
+    return datetime.datetime.fromtimestamp(seconds) + datetime.timedelta(milliseconds=millis)
+
+
+class AuditReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "audit.log")
+        with open(self.path, "wb") as file_object:
+            file_object.write(AUDIT_LOG)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def events(self):
+        reader = LinuxLogs.LogReader_AUDIT_Parser("audit", self.path, "audit log")
+        with quiet():
+            return reader.readEvents()
+
+
+    def testAssembly(self):
+        events = self.events()
+        descriptions = [event[2] for event in events]
+        self.assertEqual(len(events), 4)
+        # the records of serial 24287 are one event, in the order they were written, with the hex fields decoded
+        self.assertEqual(events[0][1], localDateTime(1784451600, 243))
+        self.assertEqual(descriptions[0],
+            'audit: SYSCALL arch=c000003e syscall=59 success=yes exit=0 a0=55d1 a1=55d2 a2=55d3 a3=0 items=2 ppid=1402 pid=1500 ' +
+            'auid=1000 uid=0 gid=0 euid=0 suid=0 fsuid=0 egid=0 sgid=0 fsgid=0 tty=pts0 ses=3 comm="cat" exe="/usr/bin/cat" key="shadow" | ' +
+            'EXECVE argc=2 a0="cat" a1="/etc/shadow" | CWD cwd="/root" | ' +
+            'PATH item=0 name="/usr/bin/cat" inode=1311 dev=fd:00 mode=0100755 ouid=0 ogid=0 rdev=00:00 nametype=NORMAL | ' +
+            'PROCTITLE proctitle="cat /etc/shadow" (serial=24287)')
+        # a single record event interleaved with the records of another one, the enriched names follow a space
+        self.assertEqual(events[1][1], localDateTime(1784451600, 250))
+        self.assertEqual(descriptions[1], "audit: USER_LOGIN pid=1021 uid=0 auid=1000 ses=3 msg='op=login id=1000 exe=\"/usr/sbin/sshd\" " +
+                                          "hostname=? addr=10.0.0.5 terminal=ssh res=success' UID=\"root\" AUID=\"alice\" (serial=24288)")
+        self.assertEqual(events[2][1], localDateTime(1784451620, 0))
+        self.assertTrue(descriptions[2].startswith("audit: USER_CMD pid=1600 "))
+        # the last event never gets an EOE, it is saved once the log ends
+        self.assertEqual(events[3][1], localDateTime(1784451700, 500))
+        self.assertTrue(descriptions[3].endswith("res=success' (serial=24301)"))
+
+
+    def testPendingEventsAreBounded(self):
+        """Events without EOE are saved once they are PENDING_SECONDS older than the newest event, or when too many are pending"""
+        reader = LinuxLogs.LogReader_AUDIT_Parser("audit", self.path, "audit log")
+        lines = ["type=USER_CMD msg=audit(1784451600.{0:03d}:{1}): pid=1 res=success".format(i % 1000, 100 + i) for i in range(1500)]
+        lines.append("type=USER_CMD msg=audit(1784451610.000:9000): pid=2 res=success")
+        for line in lines:
+            reader.decode_entry(line)
+            self.assertTrue(len(reader.pending) <= reader.PENDING_EVENTS)
+        # all the events are more than 5 seconds older than the last one
+        self.assertEqual(len(reader.pending), 1)
+        self.assertEqual(len(reader.events), 1500)
+        reader.decode_entry(None)
+        self.assertEqual(len(reader.events), 1501)
+        self.assertEqual(reader.events[1500][2], "audit: USER_CMD pid=2 res=success (serial=9000)")
+
+
+if __name__ == "__main__":
+    unittest.main()
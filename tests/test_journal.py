@@ -0,0 +1,149 @@
+"""Tests of LogReader_JOURNAL_Parser against the fixture journals (see journalwriter.py), in the regular and the compact
+layout. Run from the top of the repository with:  python -m unittest discover -s tests"""
+
+import datetime
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from support import TESTS, quiet
+import LinuxLogs
+import journalwriter
+
+
+def journalctl():
+    """Returns the path of journalctl, None if it is not installed"""
+    for directory in os.environ.get("PATH", "").split(os.pathsep) + ["/usr/bin", "/bin"]:
+        path = os.path.join(directory, "journalctl")
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def lz4Installed():
+    try:
+        import lz4.block
+    except ImportError:
+        return False
+    return True
+
+
+class JournalReaderTest(unittest.TestCase):
+    """Reads the journal files of a /var/log/journal/<machine-id> directory built in a temporary directory"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.machine = os.path.join(self.directory, "journal", "0123456789abcdef0123456789abcdef")
+        os.makedirs(self.machine)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def reader(self):
+        return LinuxLogs.LogReader_JOURNAL_Parser("journal", os.path.join(self.directory, "journal"), "systemd journal")
+
+
+    def entries(self, path):
+        """Returns the (realtime, bootID, fields) tuples of a journal file as walked by readJournalEntries"""
+        with open(path, "rb") as file_object:
+            journal = mmap.mmap(file_object.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                return list(self.reader().readJournalEntries(journal))
+            finally:
+                journal.close()
+
+
+    def checkEntries(self, path):
+        entries = self.entries(path)
+        self.assertEqual(len(entries), len(journalwriter.FIXTURE_ENTRIES))
+        for (realtime, bootID, fields), (expectedRealtime, expectedBootID, expectedFields) in zip(entries, journalwriter.FIXTURE_ENTRIES):
+            expectedFields = dict(expectedFields)
+            self.assertEqual(realtime, expectedRealtime)
+            self.assertEqual(bootID, expectedBootID.encode("hex"))
+            self.assertEqual(fields.get("MESSAGE"), expectedFields["MESSAGE"])
+            self.assertEqual(fields.get("_PID"), expectedFields["_PID"])
+            self.assertEqual(fields.get("_SYSTEMD_UNIT"), expectedFields.get("_SYSTEMD_UNIT"))
+
+
+    def testRegularEntries(self):
+        self.checkEntries(os.path.join(TESTS, "fixtures", "regular.journal"))
+
+
+    def testCompactEntries(self):
+        self.checkEntries(os.path.join(TESTS, "fixtures", "compact.journal"))
+
+
+    def testEvents(self):
+        """The events of both layouts are the same syslog-like lines, stamped with the local time of the entries"""
+        for name in ("regular", "compact"):
+            shutil.copy(os.path.join(TESTS, "fixtures", name + ".journal"), os.path.join(self.machine, "system.journal"))
+            with quiet():
+                events = list(self.reader())
+            self.assertEqual(len(events), 6)
+            self.assertEqual(events[0], (None, datetime.datetime.fromtimestamp(1784451600),
+                                         "sshd[1021]: Failed password for root from 10.0.0.5 port 22 ssh2 " +
+                                         "(_SYSTEMD_UNIT=ssh.service, _BOOT_ID=5c1b7a2e9d3f4e10a1b2c3d4e5f60718)"))
+            # without SYSLOG_IDENTIFIER the command name is the source
+            self.assertEqual(events[2][2], "systemd[1]: Started Daily apt upgrade and clean activities. " +
+                                           "(_SYSTEMD_UNIT=init.scope, _BOOT_ID=5c1b7a2e9d3f4e10a1b2c3d4e5f60718)")
+            # and without unit there is only the boot ID
+            self.assertEqual(events[5][1], datetime.datetime.fromtimestamp(1784451800))
+            self.assertEqual(events[5][2], "kernel[2048]: usb 1-1: new high-speed USB device number 2 using ehci-pci " +
+                                           "(_BOOT_ID=5c1b7a2e9d3f4e10a1b2c3d4e5f60718)")
+
+
+    def testCompressedMessage(self):
+        """LZ4 compressed data objects are decoded when the lz4 module is installed, and stand in as a placeholder otherwise"""
+        path = os.path.join(self.machine, "system.journal")
+        journalwriter.writeJournal(path, journalwriter.FIXTURE_ENTRIES, compact=True, lz4Fields=("MESSAGE",))
+        with quiet():
+            events = list(self.reader())
+        self.assertEqual(len(events), 6)
+        if lz4Installed():
+            self.assertTrue(events[0][2].startswith("sshd[1021]: Failed password for root from 10.0.0.5 port 22 ssh2 ("))
+        else:
+            self.assertTrue(events[0][2].startswith("sshd[1021]: [compressed journal data, install the lzma/lz4/zstandard python module"))
+
+
+    def testDigestOfLargeFile(self):
+        """Files of several MB are hashed in steps behind the entries being walked, the digest is the one of the whole file"""
+        path = os.path.join(self.machine, "system.journal")
+        start = journalwriter.FIXTURE_ENTRIES[0][0]
+        entries = [(start + i * 1000, journalwriter.BOOT_ID, [("_PID", str(i % 500)), ("MESSAGE", "message number {0} {1}".format(i, "x" * (i % 40)))])
+                   for i in range(30000)]
+        journalwriter.writeJournal(path, entries, entriesPerArray=1000)
+        self.assertTrue(os.path.getsize(path) > 2 * 1048576)
+        reader = self.reader()
+        with quiet():
+            events = list(reader)
+        self.assertEqual(len(events), 30000)
+        self.assertTrue(events[-1][2].startswith("[499]: message number 29999 "))
+        with open(path, "rb") as file_object:
+            self.assertEqual(reader.sourceFiles[0].digests["sha256"], hashlib.sha256(file_object.read()).hexdigest())
+        self.assertEqual(reader.sourceFiles[0].size, os.path.getsize(path))
+
+
+    @unittest.skipUnless(journalctl(), "journalctl is not installed")
+    def testFixturesMatchJournalctl(self):
+        """systemd decodes the fixtures the same way"""
+        for name in ("regular", "compact"):
+            path = os.path.join(TESTS, "fixtures", name + ".journal")
+            output = subprocess.check_output([journalctl(), "--file", path, "-o", "json", "--no-pager"])
+            decoded = [json.loads(line) for line in output.splitlines() if line.strip()]
+            self.assertEqual(len(decoded), len(journalwriter.FIXTURE_ENTRIES))
+            for entry, (realtime, bootID, fields) in zip(decoded, self.entries(path)):
+                self.assertEqual(int(entry["__REALTIME_TIMESTAMP"]), realtime)
+                self.assertEqual(entry["_BOOT_ID"], bootID)
+                for name in ("MESSAGE", "_PID", "_SYSTEMD_UNIT"):
+                    self.assertEqual(entry.get(name), fields.get(name))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+"""Tests of the searches that skip most of the events: dbLogs.contextBlocks() seeks the events around the hits, and the
+direct queries bisect plain text logs (bisectFile) or use the sparse index of archives (scanGzipFile). They return
+what a full scan of the events returns."""
+
+import datetime
+import gzip
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from support import quiet
+import LinuxLogs
+
+
+def memoryDatabase():
+    db = LinuxLogs.dbLogs(":memory:")
+    with quiet():
+        db.createDBitems()
+    return db
+
+
+class ContextBlocksTest(unittest.TestCase):
+    """Two logs whose events span three monthly partitions, many of them sharing their second"""
+
+    def setUp(self):
+        self.db = memoryDatabase()
+        generator = random.Random(3)
+        for host, logName in (("web01", "auth"), ("web01", "syslog")):
+            events = LinuxLogs.EventBuffer()
+            eventDateTime = datetime.datetime(2026, 1, 20)
+            for i in range(800):
+                eventDateTime += datetime.timedelta(seconds=generator.choice([0, 0, 1, 3600, 7 * 3600]))
+                events.append(None, eventDateTime, "{0} event {1} pid={2}".format(logName, i, generator.randint(1, 50)))
+            with quiet():
+                logID = self.db.createParentRecord(logName, "/var/log/" + logName, logName, host)
+                self.db.createPartitionsFor(events)
+                self.db.saveEvents(events, logID)
+        rows = []
+        for name in self.db.partitions():
+            queryStr = "SELECT E.event_datetime, E.id, E.fk_logid, L.host, L.log_name, " +\
+                       "DESCRIPTION(E.template_id, E.params, E.event_description) FROM {0} E, LOGS L WHERE L.id = E.fk_logid;"
+            rows += self.db.connection.execute(queryStr.format(name)).fetchall()
+        self.assertEqual(len(self.db.partitions()), 3)
+        self.events = {}
+        for row in sorted(rows, key=lambda row: (row[2], row[0], row[1])):
+            self.events.setdefault(row[2], []).append(row)
+
+
+    def tearDown(self):
+        self.db.close()
+
+
+    def expectedBlocks(self, hits, context):
+        """The blocks of a full scan: the ranges of events around the hits, merged when they overlap or touch"""
+        blocks = []
+        for logID, events in self.events.items():
+            positions = sorted(set(events.index(hit) for hit in hits if hit[2] == logID))
+            ranges = []
+            for position in positions:
+                start, end = max(0, position - context), min(len(events) - 1, position + context)
+                if ranges and start <= ranges[-1][1] + 1:
+                    ranges[-1][1] = max(ranges[-1][1], end)
+                else:
+                    ranges.append([start, end])
+            for start, end in ranges:
+                blocks.append([list(events[i]) + [i in positions] for i in range(start, end + 1)])
+        return blocks
+
+
+    def testAgainstFullScan(self):
+        generator = random.Random(5)
+        allEvents = [event for events in self.events.values() for event in events]
+        for context in (0, 1, 2, 5, 40):
+            for trial in range(20):
+                hits = generator.sample(allEvents, generator.choice([1, 3, 10, 60]))
+                key = lambda block: (block[0][0], block[0][1], block[0][2])
+                self.assertEqual(sorted(self.db.contextBlocks(hits, context), key=key), sorted(self.expectedBlocks(hits, context), key=key))
+
+
+    def testFirstAndLastEvents(self):
+        """Contexts stop at both ends of a log"""
+        events = self.events[1]
+        blocks = self.db.contextBlocks([events[0], events[-1]], 3)
+        self.assertEqual([[row[1] for row in block] for block in blocks], [[row[1] for row in events[:4]], [row[1] for row in events[-4:]]])
+
+
+class DirectQueryTest(unittest.TestCase):
+    """A dpkg.log like file of about 600 KB, in time order with runs of lines sharing their second and lines without date"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "dpkg.log")
+        generator = random.Random(9)
+        eventDateTime = datetime.datetime(2026, 3, 30, 22, 0, 0)
+        lines = []
+        for i in range(12000):
+            eventDateTime += datetime.timedelta(seconds=generator.choice([0, 0, 0, 1, 2, 90]))
+            lines.append("{0} status installed libfoo{1}:amd64 1.{2}-1".format(eventDateTime, i, generator.randint(0, 99)))
+            if i % 97 == 0:
+                lines.append("  continuation line without a date")
+            if i == 6000:
+                # a burst of lines within one second, longer than the blocks a file is bisected down to
+                self.burst = eventDateTime
+                lines += ["{0} status half-configured libbar{1}:amd64 2.0-1".format(eventDateTime, j) for j in range(300)]
+        with open(self.path, "wb") as file_object:
+            file_object.write("\n".join(lines) + "\n")
+        with open(self.path, "rb") as file_object, gzip.open(self.path + ".1.gz", "wb") as archive:
+            archive.write(file_object.read())
+        self.reader = LinuxLogs.LogReaderParserYYYYMMDD("dpkg", self.path, "dpkg log")
+        self.first = datetime.datetime(2026, 3, 30, 22, 0, 0)
+        self.last = eventDateTime
+        self.db = memoryDatabase()
+        # the events of a full scan
+        self.events = filter(None, [self.reader.decodeLine(line) for line in lines])
+
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory)
+
+
+    def fullScan(self, startDateTime, endDateTime):
+        return [event for event in self.events if startDateTime <= event[0] <= endDateTime]
+
+
+    def windows(self):
+        """Random windows, windows starting and ending within a run of lines of the same second, and windows outside the file"""
+        generator = random.Random(13)
+        span = int((self.last - self.first).total_seconds())
+        windows = []
+        for i in range(25):
+            start = self.first + datetime.timedelta(seconds=generator.randint(-100, span + 100))
+            windows.append((start, start + datetime.timedelta(seconds=generator.choice([0, 1, 60, 3600, span]))))
+        windows.append((self.burst, self.burst))
+        windows.append((self.burst, self.last))
+        windows.append((self.first, self.burst))
+        windows.append((self.first, self.first))
+        windows.append((self.last, self.last))
+        windows.append((self.first - datetime.timedelta(days=1), self.first - datetime.timedelta(seconds=1)))
+        windows.append((self.last + datetime.timedelta(seconds=1), self.last + datetime.timedelta(days=1)))
+        windows.append((self.first - datetime.timedelta(days=1), self.last + datetime.timedelta(days=1)))
+        return windows
+
+
+    def testBisectFile(self):
+        for blockSize in (65536, 512):
+            for startDateTime, endDateTime in self.windows():
+                self.assertEqual(list(LinuxLogs.bisectFile(self.reader, self.path, startDateTime, endDateTime, self.db, blockSize)),
+                                 self.fullScan(startDateTime, endDateTime))
+
+
+    def testScanGzipFile(self):
+        """The first scan of an archive reads all of it and indexes it, the next ones start at the indexed line before the window"""
+        archive = self.path + ".1.gz"
+        windows = self.windows()
+        for startDateTime, endDateTime in [windows[0]] + windows:
+            self.assertEqual(list(LinuxLogs.scanGzipFile(self.reader, archive, startDateTime, endDateTime, self.db, pointEvery=4096)),
+                             self.fullScan(startDateTime, endDateTime))
+        self.assertTrue(self.db.connection.execute("SELECT COUNT(*) FROM FILEINDEX_POINTS;").fetchone()[0] > 100)
+
+
+    def testScanGzipFileNotIndexedYet(self):
+        """Every window is answered by the scan that indexes the archive, and the next file of the log only prunes the
+        archive when its first line is after the first line of the archive"""
+        archive = self.path + ".1.gz"
+        for startDateTime, endDateTime in self.windows():
+            for nextDateTime in (None, self.first - datetime.timedelta(days=1), self.last + datetime.timedelta(seconds=1)):
+                self.db.connection.execute("DELETE FROM FILEINDEX;")
+                self.assertEqual(list(LinuxLogs.scanGzipFile(self.reader, archive, startDateTime, endDateTime, self.db, nextDateTime, 4096)),
+                                 self.fullScan(startDateTime, endDateTime))
+
+
+if __name__ == "__main__":
+    unittest.main()
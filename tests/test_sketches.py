@@ -0,0 +1,110 @@
+"""Tests of the summaries kept per field: CountMinSketch, SpaceSaving and HyperLogLog stay within their bounds"""
+
+import bisect
+import collections
+import random
+import unittest
+
+import support
+import LinuxLogs
+
+
+def zipfValues(count, distinct, seed=11):
+    """Values drawn with a skewed (Zipf like) distribution, as the users or addresses of a log are"""
+    generator = random.Random(seed)
+    weights = [1.0 / rank for rank in range(1, distinct + 1)]
+    total = sum(weights)
+    cumulative = []
+    running = 0.0
+    for weight in weights:
+        running += weight / total
+        cumulative.append(running)
+    return ["value-{0}".format(min(bisect.bisect_left(cumulative, generator.random()), distinct - 1)) for i in range(count)]
+
+
+class CountMinSketchTest(unittest.TestCase):
+
+    def testBounds(self):
+        values = zipfValues(50000, 5000)
+        counts = collections.Counter(values)
+        sketch = LinuxLogs.CountMinSketch()
+        for value in values:
+            sketch.add(value)
+        bound = sketch.errorBound(len(values))
+        exceeding = 0
+        for value, count in counts.items():
+            estimate = sketch.estimate(value)
+            self.assertTrue(estimate >= count)
+            if estimate - count > bound:
+                exceeding += 1
+        # the bound holds with probability 1 - e^-depth for every value
+        self.assertTrue(exceeding <= 0.02 * len(counts), exceeding)
+        # values never added are bounded the same way
+        self.assertTrue(sketch.estimate("never-added") <= bound)
+
+
+    def testMergeAndSerialize(self):
+        values = zipfValues(20000, 1000)
+        whole, first, second = LinuxLogs.CountMinSketch(), LinuxLogs.CountMinSketch(), LinuxLogs.CountMinSketch()
+        for i, value in enumerate(values):
+            whole.add(value)
+            (first if i % 2 else second).add(value)
+        first.merge(second)
+        self.assertEqual(first.counts, whole.counts)
+        self.assertEqual(LinuxLogs.CountMinSketch.deserialize(whole.serialize()).counts, whole.counts)
+
+
+class SpaceSavingTest(unittest.TestCase):
+
+    def testMergedBounds(self):
+        """Summaries of the hours of a log merge into one whose bounds hold the true counts of the whole log"""
+        values = zipfValues(60000, 3000)
+        hours = [values[start:start + 5000] for start in range(0, len(values), 5000)]
+        summary = None
+        for hour in hours:
+            hourSummary = LinuxLogs.SpaceSaving.fromCounts(collections.Counter(hour))
+            if summary is None:
+                summary = hourSummary
+            else:
+                summary.merge(hourSummary)
+        counts = collections.Counter(values)
+        self.assertTrue(len(summary.counters) <= summary.capacity)
+        for value, (low, high) in summary.counters.items():
+            self.assertTrue(low <= counts[value] <= high, (value, low, counts[value], high))
+        # a value counted more than the floor is never missed
+        for value, count in counts.items():
+            if count > summary.floor:
+                self.assertIn(value, summary.counters)
+        top = summary.top(5)
+        self.assertEqual([value for value, low, high in top], [value for value, count in counts.most_common(5)])
+        self.assertEqual([high for value, low, high in top], sorted([high for value, low, high in top], reverse=True))
+        restored = LinuxLogs.SpaceSaving.deserialize(summary.serialize())
+        self.assertEqual((restored.counters, restored.floor), (summary.counters, summary.floor))
+
+
+class HyperLogLogTest(unittest.TestCase):
+
+    def testEstimates(self):
+        for distinct in (10, 1000, 20000, 200000):
+            counter = LinuxLogs.HyperLogLog()
+            for i in range(distinct):
+                counter.add("host-{0}".format(i))
+                # duplicates do not count
+                counter.add("host-{0}".format(i // 2))
+            error = abs(counter.estimate() - distinct) / distinct
+            self.assertTrue(error <= 3 * counter.standardError(), (distinct, counter.estimate()))
+
+
+    def testMergeAndSerialize(self):
+        whole, first, second = LinuxLogs.HyperLogLog(), LinuxLogs.HyperLogLog(), LinuxLogs.HyperLogLog()
+        for i in range(30000):
+            value = "user-{0}".format(i)
+            whole.add(value)
+            (first if i < 20000 else second).add(value)
+        first.merge(second)
+        self.assertEqual(first.registers, whole.registers)
+        self.assertEqual(LinuxLogs.HyperLogLog.deserialize(whole.serialize()).registers, whole.registers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""Tests of TemplateMiner: every description is rebuilt exactly from its template and parameters"""
+
+import random
+import unittest
+
+import support
+import LinuxLogs
+
+
+def descriptions(count, seed=7):
+    """Syslog-like descriptions of a few kinds, with varying PIDs, users, addresses and paths"""
+    generator = random.Random(seed)
+    users = ["root", "alice", "bob", "carlos", "www-data"]
+    kinds = [
+        lambda: "sshd[{0}]: Failed password for {1} from 10.0.{2}.{3} port {4} ssh2".format(
+            generator.randint(100, 9999), generator.choice(users), generator.randint(0, 255), generator.randint(1, 254), generator.randint(1024, 65535)),
+        lambda: "sshd[{0}]: Accepted publickey for {1} from 192.168.1.{2} port 22 ssh2: RSA SHA256:{3:x}".format(
+            generator.randint(100, 9999), generator.choice(users), generator.randint(1, 254), generator.getrandbits(64)),
+        lambda: "CRON[{0}]: ({1}) CMD (   cd / && run-parts --report /etc/cron.{2})".format(
+            generator.randint(100, 9999), generator.choice(users), generator.choice(["hourly", "daily", "weekly"])),
+        lambda: "kernel: [{0:.6f}] usb {1}-{2}: new high-speed USB device number {3} using ehci-pci".format(
+            generator.uniform(0, 100000), generator.randint(1, 4), generator.randint(1, 8), generator.randint(1, 127)),
+        lambda: "systemd[1]: Started Session {0} of user {1}.".format(generator.randint(1, 5000), generator.choice(users)),
+        # spaces at both ends and in a row make empty tokens
+        lambda: " sudo:   {0} : TTY=pts/{1} ; PWD=/home/{0} ; USER=root ; COMMAND=/bin/ls ".format(generator.choice(users), generator.randint(0, 9)),
+        lambda: "dhclient: bound to 10.0.2.{0} -- renewal in {1} seconds.".format(generator.randint(1, 254), generator.randint(60, 3600)),
+    ]
+    return [generator.choice(kinds)() for i in range(count)]
+
+
+class TemplateMinerTest(unittest.TestCase):
+
+    def testRoundTrip(self):
+        miner = LinuxLogs.TemplateMiner()
+        templates = {}
+        stored = []
+        for description in descriptions(5000):
+            templateID, params = miner.addMessage(description)
+            for newID, clusterID, template in miner.newTemplates:
+                # a template never changes once it has an ID
+                self.assertNotIn(newID, templates)
+                templates[newID] = template
+            del miner.newTemplates[:]
+            stored.append((description, templateID, params))
+        for description, templateID, params in stored:
+            self.assertEqual(templates[templateID].count(LinuxLogs.TemplateMiner.WILDCARD), len(params))
+            self.assertEqual(LinuxLogs.TemplateMiner.render(templates[templateID], params), description)
+        # a handful of templates describe the seven kinds of descriptions
+        self.assertTrue(len(set(templateID for description, templateID, params in stored)) < 60)
+
+
+    def testLoadedTemplates(self):
+        """A miner rebuilt from the stored templates keeps assigning the same templates to the descriptions it knows"""
+        miner = LinuxLogs.TemplateMiner()
+        sample = descriptions(2000)
+        for description in sample:
+            miner.addMessage(description)
+        rows = list(miner.newTemplates)
+        templates = dict((templateID, template) for templateID, clusterID, template in rows)
+        loaded = LinuxLogs.TemplateMiner()
+        loaded.loadTemplates(rows)
+        for description in sample:
+            templateID, params = loaded.addMessage(description)
+            templates.update((newID, template) for newID, clusterID, template in loaded.newTemplates)
+            self.assertEqual(LinuxLogs.TemplateMiner.render(templates[templateID], params), description)
+        self.assertEqual(loaded.newTemplates, [])
+
+
+if __name__ == "__main__":
+    unittest.main()